@@ -5,13 +5,16 @@ from autogen_agentchat.teams import SelectorGroupChat
 
 from agents.tools.bing_search import bing_search_tool
 from agents.tools.fetch_webpage import fetch_webpage_tool
+from agents.tools.uploaded_section import read_uploaded_section_tool
 from agents.tools.url_accessiable import url_accessible_valid_tool
 from config import (
+    LESSON_FORMATTER_AGENT,
     get_advance_model_client,
     get_low_model_client,
     get_model_client,
     get_moderate_model_client,
 )
+from lessonOutput import LESSON_FORMATTER_MODE, MEDIA_CHECK_TOOLS, PROMPT_MEDIA_CHECK, LessonFormatterAgent
 
 model_client = get_model_client()
 advance_model_client = get_advance_model_client()
@@ -26,7 +29,7 @@ PROMPT_RESERACH = """
 You are a personalized teaching assistant responsible for creating customized teaching content based on specific students' learning records.
 
 Your primary tasks are to analyze the student's learning records and create a personalized teaching plan:
-1. Carefully analyze the student's performance records in the courseware to identify their knowledge gaps and misunderstood concepts.
+1. Carefully analyze the student's performance records in the courseware to identify their knowledge gaps and misunderstood concepts. Large uploads are given as a digest of section summaries with an index; when you need the exact original text of a section, use the read_uploaded_section tool with the digest_id and the section id.
 2. Pay attention to topics and areas the student shows interest in.
 3. Use the bing_search tool to find relevant materials. If more complete content from a webpage is needed, use the fetch_webpage tool to retrieve the full content to supplement the student's knowledge gaps.
 4. Use the bing_search tool to find relevant images and videos to enhance the learning experience. Set `response_filter` to `images` for images and `videos` for videos. Validate the URLs to ensure they are correct, accessible, and point to actual content (not empty or placeholder URLs like https://example.com) before embedding them.
@@ -65,7 +68,6 @@ Your tasks are:
 7. Ensure all embedded images use the correct markdown syntax: ![description](image_url), and the URLs are accessible and unique, not duplicated in the content.
 8. Ensure all embedded videos use the correct markdown syntax: [video description](video_url), and the URLs are accessible and unique, not duplicated in the content.
 9. Ensure all the the content of the images and videos are in Simplified Chinese and relevant to the content. Don't include any English or Japanese content in the images and videos.
-10. Use the url_accessible_valid_tool to verify that the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
 
 Your response should include:
 - Targeted assessment (whether the content directly addresses the student's knowledge gaps)
@@ -92,7 +94,6 @@ Please create a well-structured lesson plan tailored to the student's learning s
    - Use the format: [video description](video_url) for videos
    - Ensure all images and videos are directly viewable in markdown
    - Ensure all the the content of the images and videos are in Simplified Chinese and relevant to the content. Don't include any English or Japanese content in the images and videos.
-   - Use the url_accessible_valid_tool to verify that the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
 3. Part 2: Interest point expansion
    - Expanded knowledge content related to topics or questions the student showed interest in during learning
    - Relevant examples or applications of these interest points and questions
@@ -101,8 +102,6 @@ Please create a well-structured lesson plan tailored to the student's learning s
    - Use the format: [video description](video_url) for videos
    - Ensure all images and videos are directly viewable in markdown
    - Ensure all the the content of the images and videos are in Simplified Chinese and relevant to the content. Don't include any English or Japanese content in the images and videos.
-   - Use the url_accessible_valid_tool to verify that the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
-   - Use the url_accessible_valid_tool to verify that the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
 4. Interactive session design (interspersed in both parts)
    - 3-5 short-answer questions to validate whether the interest points are understood in depth
    - Expected answers and evaluation criteria for each question
@@ -205,34 +204,41 @@ def create_catch_up_team()->SelectorGroupChat:
         model_client=advance_model_client,
         model_client_stream=True,
         system_message=PROMPT_RESERACH,
-        tools=[fetch_webpage_tool, bing_search_tool, url_accessible_valid_tool])
+        tools=[fetch_webpage_tool, bing_search_tool, url_accessible_valid_tool, read_uploaded_section_tool])
 
     verifier = AssistantAgent(
         "content_reviewer",
         description="Review the targetedness, completeness, and time arrangement of personalized teaching content.",
         model_client=advance_model_client,
         model_client_stream=True,
-        tools=[url_accessible_valid_tool],
-        system_message=PROMPT_VERIFIER)
+        tools=MEDIA_CHECK_TOOLS,
+        system_message=PROMPT_VERIFIER + PROMPT_MEDIA_CHECK)
 
     summary_agent = AssistantAgent(
         name="materials_compiler",
         description="Integrate all teaching content into a complete 40-minute lesson plan.",
         model_client=moderate_model_client,
         model_client_stream=True,
-        tools=[url_accessible_valid_tool],
-        system_message=PROMPT_SUMMARY)
+        tools=MEDIA_CHECK_TOOLS,
+        system_message=PROMPT_SUMMARY + PROMPT_MEDIA_CHECK)
     
-    markdown_content_formator = AssistantAgent(
-        "markdown_content_formator",
-        description="An agent that formats markdown content by removing query parameters from image and video URLs.",
-        model_client=low_model_client,
-        model_client_stream=True,
-        system_message=PROMPT_MARKDOWN_CONTENT_FORMAT)
+    if LESSON_FORMATTER_MODE == "llm":
+        markdown_content_formator = AssistantAgent(
+            "markdown_content_formator",
+            description="An agent that formats markdown content by removing query parameters from image and video URLs.",
+            model_client=low_model_client,
+            model_client_stream=True,
+            system_message=PROMPT_MARKDOWN_CONTENT_FORMAT)
+    else:
+        markdown_content_formator = LessonFormatterAgent(
+            LESSON_FORMATTER_AGENT,
+            description="An agent that formats markdown content by removing query parameters from image and video URLs.",
+            content_source=summary_agent.name)
     
     return SelectorGroupChat(
         [research_assistant, verifier, summary_agent,markdown_content_formator],
         termination_condition=termination,
         model_client=moderate_model_client,
         selector_prompt=PROMPT_SELECTOR,
-        allow_repeated_speaker=True)
+        allow_repeated_speaker=True,
+        emit_team_events=True)
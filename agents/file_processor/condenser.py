@@ -0,0 +1,382 @@
+"""
+Map-reduce condensation of large uploads.
+
+The markdown converted from uploaded files can be far larger than the context of the
+catch-up team. Instead of concatenating it into a single message, every document is
+split into chunks along its headings and a token budget, the chunks are summarized
+in parallel on the low model tier (map), and the summaries are merged per document
+when the digest still exceeds its budget (reduce). The team receives the compact
+digest plus an index of the chunks; the full text is kept on disk and individual
+chunks can be read back with the `read_uploaded_section` tool.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from autogen_core.models import SystemMessage, UserMessage
+from dotenv import load_dotenv
+
+from config import get_low_model_client
+
+load_dotenv()
+
+logger = logging.getLogger("upload_condenser")
+
+# Uploads below this size are passed to the team unchanged
+CONDENSE_THRESHOLD_TOKENS = int(os.environ.get("CONDENSE_THRESHOLD_TOKENS", "12000"))
+# Maximum size of a chunk sent to the summarizer
+CONDENSE_CHUNK_TOKENS = int(os.environ.get("CONDENSE_CHUNK_TOKENS", "3000"))
+# Target size of the summary of a single chunk
+CONDENSE_SUMMARY_TOKENS = int(os.environ.get("CONDENSE_SUMMARY_TOKENS", "300"))
+# Budget of the whole digest before the summaries of a document are merged
+CONDENSE_DIGEST_TOKENS = int(os.environ.get("CONDENSE_DIGEST_TOKENS", "8000"))
+# Maximum number of summarization requests in flight
+CONDENSE_MAX_CONCURRENCY = int(os.environ.get("CONDENSE_MAX_CONCURRENCY", "8"))
+# Where the full text and chunk index of condensed uploads are kept
+CONDENSE_STORE_DIR = os.environ.get("CONDENSE_STORE_DIR", ".cache/uploads")
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+CJK_PATTERN = re.compile(r"[\u3000-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+PROMPT_CHUNK_SUMMARY = """
+You condense one section of a document uploaded by a teacher, usually a student's learning records or course material.
+Summarize the section in Simplified Chinese as a concise markdown bullet list of at most {budget} tokens.
+Keep everything needed to plan personalized teaching: knowledge points, mistakes and misunderstood concepts,
+scores and assessment results, topics the student is interested in, key vocabulary, poems, stories and teaching requirements.
+Keep names, numbers and quotations exact. Do not add information that is not in the section. Output only the bullet list.
+"""
+
+PROMPT_DOCUMENT_MERGE = """
+You merge the section summaries of one uploaded document into a single structured digest in Simplified Chinese
+of at most {budget} tokens. Group related points under short markdown headings, remove repetition and keep names,
+numbers and quotations exact. After each point, keep the section ids it comes from in square brackets, e.g. [D1-C3],
+so that the original text can be looked up. Output only the digest.
+"""
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text.
+
+    Uses tiktoken when it is available, otherwise counts one token per CJK
+    character and one per four other characters.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+class UploadChunk:
+    """A chunk of an uploaded document, located by line range in the document."""
+
+    def __init__(self, chunk_id: str, file_name: str, heading: str, start_line: int, end_line: int, text: str):
+        self.chunk_id = chunk_id
+        self.file_name = file_name
+        self.heading = heading
+        self.start_line = start_line
+        self.end_line = end_line
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.summary: Optional[str] = None
+
+    def to_index_entry(self, offset: int) -> Dict:
+        """Describe the chunk for the index, with its position in the stored full text."""
+        return {
+            "id": self.chunk_id,
+            "file": self.file_name,
+            "heading": self.heading,
+            "start_line": offset + self.start_line,
+            "end_line": offset + self.end_line,
+            "tokens": self.tokens,
+        }
+
+
+class CondensedUpload:
+    """The content handed to the team for a set of uploaded documents."""
+
+    def __init__(self, content: str, digest_id: Optional[str] = None, source_tokens: int = 0, chunk_count: int = 0):
+        self.content = content
+        self.digest_id = digest_id
+        self.source_tokens = source_tokens
+        self.chunk_count = chunk_count
+
+    @property
+    def condensed(self) -> bool:
+        """Return whether the uploads were condensed rather than passed through."""
+        return self.digest_id is not None
+
+
+def _split_sections(markdown: str) -> List[Tuple[str, int, int]]:
+    """Split a document into (heading path, start line, end line) sections; lines are 1-based, inclusive."""
+    lines = markdown.splitlines()
+    sections = []
+    path: List[Tuple[int, str]] = []
+    start = 1
+    heading = ""
+    in_code = False
+    for number, line in enumerate(lines, start=1):
+        if line.lstrip().startswith("```"):
+            in_code = not in_code
+        match = None if in_code else HEADING_PATTERN.match(line)
+        if match is None:
+            continue
+        if number > start:
+            sections.append((heading, start, number - 1))
+        level = len(match.group(1))
+        path = [item for item in path if item[0] < level] + [(level, match.group(2))]
+        heading = " > ".join(title for _, title in path)
+        start = number
+    if lines and start <= len(lines):
+        sections.append((heading, start, len(lines)))
+    return sections
+
+
+def _split_oversized(lines: List[str], start: int, end: int, budget: int) -> List[Tuple[int, int]]:
+    """Split a line range exceeding the budget at paragraph boundaries, or at line boundaries if needed."""
+    ranges = []
+    range_start = start
+    tokens = 0
+    last_break = None
+    for number in range(start, end + 1):
+        line = lines[number - 1]
+        tokens += estimate_tokens(line) + 1
+        if not line.strip():
+            last_break = number
+        if tokens > budget and number > range_start:
+            cut = last_break if last_break and last_break > range_start else number - 1
+            ranges.append((range_start, cut))
+            range_start = cut + 1
+            tokens = sum(estimate_tokens(lines[n - 1]) + 1 for n in range(range_start, number + 1))
+            last_break = None
+    if range_start <= end:
+        ranges.append((range_start, end))
+    return ranges
+
+
+def _wrap_long_lines(markdown: str, max_length: int) -> str:
+    """Break lines longer than `max_length` characters, e.g. PDFs converted without line breaks."""
+    if all(len(line) <= max_length for line in markdown.splitlines()):
+        return markdown
+    wrapped = []
+    for line in markdown.splitlines():
+        if len(line) <= max_length:
+            wrapped.append(line)
+        else:
+            wrapped.extend(line[i:i + max_length] for i in range(0, len(line), max_length))
+    return "\n".join(wrapped)
+
+
+def chunk_document(file_name: str, markdown: str, document_index: int, budget: Optional[int] = None) -> List[UploadChunk]:
+    """
+    Chunk a markdown document along its headings within a token budget.
+
+    Consecutive small sections are merged and sections larger than the budget are
+    split at paragraph boundaries.
+
+    Args:
+        file_name: Name of the uploaded file
+        markdown: Markdown converted from the file
+        document_index: 1-based position of the document in the upload, used in chunk ids
+        budget: Maximum number of tokens of a chunk, defaults to CONDENSE_CHUNK_TOKENS
+
+    Returns:
+        The chunks, in document order
+    """
+    budget = budget or CONDENSE_CHUNK_TOKENS
+    lines = markdown.splitlines()
+    pieces: List[Tuple[str, int, int, int]] = []
+    for heading, start, end in _split_sections(markdown):
+        for piece_start, piece_end in _split_oversized(lines, start, end, budget):
+            tokens = sum(estimate_tokens(lines[n - 1]) + 1 for n in range(piece_start, piece_end + 1))
+            pieces.append((heading, piece_start, piece_end, tokens))
+
+    merged: List[List] = []
+    for heading, start, end, tokens in pieces:
+        if merged and merged[-1][3] + tokens <= budget:
+            merged[-1][2] = end
+            merged[-1][3] += tokens
+        else:
+            merged.append([heading, start, end, tokens])
+
+    chunks = []
+    for index, (heading, start, end, _) in enumerate(merged, start=1):
+        text = "\n".join(lines[start - 1:end])
+        if text.strip():
+            chunks.append(UploadChunk(f"D{document_index}-C{index}", file_name, heading, start, end, text))
+    return chunks
+
+
+async def _complete(system_prompt: str, content: str, semaphore: asyncio.Semaphore) -> str:
+    async with semaphore:
+        result = await _get_summary_client().create([
+            SystemMessage(content=system_prompt),
+            UserMessage(content=content, source="user"),
+        ])
+    return result.content if isinstance(result.content, str) else str(result.content)
+
+
+_summary_client = None
+
+
+def _get_summary_client():
+    global _summary_client
+    if _summary_client is None:
+        _summary_client = get_low_model_client()
+    return _summary_client
+
+
+async def _summarize_chunk(chunk: UploadChunk, semaphore: asyncio.Semaphore) -> None:
+    prompt = PROMPT_CHUNK_SUMMARY.format(budget=CONDENSE_SUMMARY_TOKENS)
+    header = f"File: {chunk.file_name}\nSection: {chunk.heading or '(no heading)'}\n\n"
+    try:
+        chunk.summary = (await _complete(prompt, header + chunk.text, semaphore)).strip()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # Keep the start of the chunk rather than losing it from the digest
+        logger.warning(f"Could not summarize {chunk.chunk_id} of {chunk.file_name}: {str(e)}")
+        chunk.summary = chunk.text[:CONDENSE_SUMMARY_TOKENS * 2].strip() + " …"
+
+
+async def _merge_document(file_name: str, chunks: List[UploadChunk], budget: int, semaphore: asyncio.Semaphore) -> str:
+    sections = "\n\n".join(f"[{chunk.chunk_id}] {chunk.heading}\n{chunk.summary}" for chunk in chunks)
+    try:
+        return (await _complete(PROMPT_DOCUMENT_MERGE.format(budget=budget), f"File: {file_name}\n\n{sections}", semaphore)).strip()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning(f"Could not merge the summaries of {file_name}: {str(e)}")
+        return sections
+
+
+def _store(digest_id: str, documents: Sequence[Tuple[str, str]], chunks_by_document: List[List[UploadChunk]]) -> None:
+    directory = os.path.join(CONDENSE_STORE_DIR, digest_id)
+    os.makedirs(directory, exist_ok=True)
+    full_text_lines: List[str] = []
+    index = []
+    for (file_name, markdown), chunks in zip(documents, chunks_by_document):
+        full_text_lines.append(f"## Content from {file_name}")
+        offset = len(full_text_lines)
+        full_text_lines.extend(markdown.splitlines())
+        full_text_lines.append("")
+        index.extend(chunk.to_index_entry(offset) for chunk in chunks)
+    with open(os.path.join(directory, "full.md"), "w", encoding="utf-8") as f:
+        f.write("\n".join(full_text_lines))
+    with open(os.path.join(directory, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+
+
+def combine_documents(documents: Sequence[Tuple[str, str]]) -> str:
+    """Concatenate converted documents the way uploads are presented to the team."""
+    return "".join(f"\n\n## Content from {file_name}\n\n{markdown}" for file_name, markdown in documents)
+
+
+async def condense_documents(
+    documents: Sequence[Tuple[str, str]],
+    threshold_tokens: int = CONDENSE_THRESHOLD_TOKENS,
+) -> CondensedUpload:
+    """
+    Build the content handed to the catch-up team for a set of uploaded documents.
+
+    Uploads below `threshold_tokens` are concatenated unchanged. Larger uploads are
+    chunked, summarized in parallel and returned as a structured digest with an
+    index into the stored full text.
+
+    Args:
+        documents: (file name, markdown) pairs of the converted uploads
+        threshold_tokens: Size above which the uploads are condensed
+
+    Returns:
+        The content for the team, with details of the condensation
+    """
+    combined = combine_documents(documents)
+    # Tokenizing uploads of several MB takes a while, keep it off the event loop
+    source_tokens = await asyncio.to_thread(estimate_tokens, combined)
+    if source_tokens <= threshold_tokens:
+        return CondensedUpload(combined, source_tokens=source_tokens)
+
+    digest_id = hashlib.sha256(combined.encode("utf-8")).hexdigest()[:16]
+    documents = [(file_name, _wrap_long_lines(markdown, CONDENSE_CHUNK_TOKENS)) for file_name, markdown in documents]
+    chunks_by_document = await asyncio.to_thread(lambda: [
+        chunk_document(file_name, markdown, index)
+        for index, (file_name, markdown) in enumerate(documents, start=1)
+    ])
+    all_chunks = [chunk for chunks in chunks_by_document for chunk in chunks]
+    await asyncio.to_thread(_store, digest_id, documents, chunks_by_document)
+
+    # Map: summarize every chunk in parallel on the low tier
+    semaphore = asyncio.Semaphore(CONDENSE_MAX_CONCURRENCY)
+    await asyncio.gather(*(_summarize_chunk(chunk, semaphore) for chunk in all_chunks))
+
+    # Reduce: merge the summaries of the documents that take more than their share of the budget
+    document_sections: List[str] = [
+        "\n\n".join(f"#### [{chunk.chunk_id}] {chunk.heading or file_name}\n{chunk.summary}" for chunk in chunks)
+        for (file_name, _), chunks in zip(documents, chunks_by_document)
+    ]
+    total_tokens = sum(estimate_tokens(section) for section in document_sections)
+    if total_tokens > CONDENSE_DIGEST_TOKENS:
+        share = max(CONDENSE_SUMMARY_TOKENS, CONDENSE_DIGEST_TOKENS // max(1, len(documents)))
+        merges: Dict[int, asyncio.Future] = {}
+        for position, ((file_name, _), chunks) in enumerate(zip(documents, chunks_by_document)):
+            if len(chunks) > 1 and estimate_tokens(document_sections[position]) > share:
+                merges[position] = asyncio.ensure_future(_merge_document(file_name, chunks, share, semaphore))
+        for position, merge in merges.items():
+            document_sections[position] = await merge
+
+    lines = [
+        "# 上传资料摘要",
+        "",
+        f"> 上传的 {len(documents)} 个文件共约 {source_tokens} tokens，已按章节拆分为 {len(all_chunks)} 个片段并生成摘要。",
+        f"> 需要某个片段的原文细节时，使用 read_uploaded_section 工具，传入 digest_id `{digest_id}` 和片段编号（如 D1-C1）。",
+        "",
+    ]
+    for index, ((file_name, _), section) in enumerate(zip(documents, document_sections), start=1):
+        lines += [f"## 文件 {index}: {file_name}", "", section, ""]
+
+    lines += ["## 原文索引", "", "| 编号 | 文件 | 章节 | 行 | Tokens |", "|---|---|---|---|---|"]
+    for chunk in all_chunks:
+        heading = (chunk.heading or "-").replace("|", "\\|")
+        lines.append(f"| {chunk.chunk_id} | {chunk.file_name} | {heading} | {chunk.start_line}-{chunk.end_line} | {chunk.tokens} |")
+
+    logger.info(f"Condensed {len(documents)} uploads from {source_tokens} tokens into {len(all_chunks)} chunk summaries")
+    return CondensedUpload("\n".join(lines), digest_id=digest_id, source_tokens=source_tokens, chunk_count=len(all_chunks))
+
+
+def read_section(digest_id: str, section_id: str) -> Optional[str]:
+    """
+    Read the full text of a chunk of a condensed upload.
+
+    Args:
+        digest_id: Id of the condensed upload
+        section_id: Id of the chunk, e.g. D1-C3
+
+    Returns:
+        The text of the chunk, or None if the upload or the chunk is unknown
+    """
+    if not re.fullmatch(r"[0-9a-f]{16}", digest_id or ""):
+        return None
+    directory = os.path.join(CONDENSE_STORE_DIR, digest_id)
+    try:
+        with open(os.path.join(directory, "index.json"), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        entry = next((item for item in index if item["id"].upper() == section_id.strip().upper()), None)
+        if entry is None:
+            return None
+        with open(os.path.join(directory, "full.md"), "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return None
+    return "\n".join(lines[entry["start_line"] - 1:entry["end_line"]])
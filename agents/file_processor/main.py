@@ -1,5 +1,8 @@
+import hashlib
+import io
 import os
 import tempfile
+import time
 import traceback
 from pathlib import Path
 
@@ -8,93 +11,141 @@ from markitdown import MarkItDown
 
 from config import get_model_client
 
+# Markdown converted from uploads is cached here, keyed by the SHA-256 of the file content
+MARKDOWN_CACHE_DIR = os.environ.get("MARKDOWN_CACHE_DIR", ".cache/markdown")
+MARKDOWN_CACHE_MAX_MB = float(os.environ.get("MARKDOWN_CACHE_MAX_MB", "500"))
 
-def process_file(file_path, original_file_path=None):
-    """Convert various file formats to markdown and save alongside original files"""
+
+class MarkdownResult:
+    """A simple object that mimics the markitdown result structure."""
+
+    def __init__(self, content):
+        self.text_content = content
+        self.markdown = content
+
+
+def _read_file(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+
+def _read_text_file(file_path):
+    data = _read_file(file_path)
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        # Try with a different encoding if utf-8 fails
+        return data.decode('latin-1')
+
+
+def _cached_markdown_path(content_hash):
+    return os.path.join(MARKDOWN_CACHE_DIR, f"{content_hash}.md")
+
+
+def _read_cached_markdown(content_hash):
+    path = _cached_markdown_path(content_hash)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return None
+    # Refresh the modification time so that pruning evicts the least recently used entries
+    os.utime(path)
+    return MarkdownResult(content)
+
+
+def _write_cached_markdown(content_hash, content):
+    os.makedirs(MARKDOWN_CACHE_DIR, exist_ok=True)
+    path = _cached_markdown_path(content_hash)
+    # A unique temporary file per writer, so concurrent conversions never share one
+    fd, temp_path = tempfile.mkstemp(dir=MARKDOWN_CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as md_file:
+            md_file.write(content)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    _prune_markdown_cache()
+
+
+def _prune_markdown_cache():
+    """Evict the least recently used markdown files once the cache exceeds its size limit."""
+    entries = []
+    total_size = 0
+    for entry in os.scandir(MARKDOWN_CACHE_DIR):
+        if entry.is_file() and entry.name.endswith('.md'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+
+    limit = MARKDOWN_CACHE_MAX_MB * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total_size <= limit:
+            break
+        try:
+            os.remove(path)
+            total_size -= size
+        except OSError:
+            pass
+
+
+def process_file(file_path, file_name=None):
+    """Convert various file formats to markdown, reading the uploaded file in place.
+
+    The converted markdown is cached by content hash in MARKDOWN_CACHE_DIR, so the
+    same document uploaded again is not converted twice and nothing is written next
+    to the upload.
+
+    Args:
+        file_path: Path of the file to convert, e.g. the path chainlit stored the upload at
+        file_name: Original name of the file, used for its extension when the path has none
+    """
     # Check if file exists and is readable
     if not os.path.isfile(file_path):
         return f"Error: File does not exist at path: {file_path}", None
     
-    file_extension = Path(file_path).suffix.lower()
-    file_name = Path(file_path).name
-    file_stem = Path(file_path).stem
-
-    markitdown = MarkItDown()
+    file_extension = Path(file_name or file_path).suffix.lower() or Path(file_path).suffix.lower()
 
     try:
-        # Use markitdown to convert different formats to markdown
-        if file_extension in ['.docx', '.doc']:
-            try:
-                result = markitdown.convert(file_path)
-                if result is None:
-                    return f"Failed to convert DOCX file: {file_path}. Empty result returned.", None
-            except Exception as docx_err:
-                print(f"DOCX conversion error: {str(docx_err)}")
-                print(traceback.format_exc())
-                return f"Error converting DOCX file: {str(docx_err)}", None
-        elif file_extension in ['.pptx', '.ppt']:
+        if file_extension in ['.md', '.markdown']:
+            # If already markdown, just read the file; there is nothing to convert or cache
             try:
-                result = markitdown.convert(file_path)
-                if result is None:
-                    return f"Failed to convert PPTX file: {file_path}. Empty result returned.", None
-            except Exception as pptx_err:
-                print(f"PPTX conversion error: {str(pptx_err)}")
-                print(traceback.format_exc())
-                return f"Error converting PPTX file: {str(pptx_err)}", None
-        elif file_extension == '.pdf':
+                return None, MarkdownResult(_read_text_file(file_path))
+            except Exception as encoding_err:
+                return f"Error reading file with alternative encoding: {str(encoding_err)}", None
+        elif file_extension in ['.docx', '.doc', '.pptx', '.ppt', '.pdf']:
+            # Read the upload once: the same bytes are hashed and converted
+            data = _read_file(file_path)
+            content_hash = hashlib.sha256(data).hexdigest()
+            cached = _read_cached_markdown(content_hash)
+            if cached is not None:
+                print(f"Using cached markdown for {file_name or file_path}")
+                return None, cached
+
+            kind = {'.docx': 'DOCX', '.doc': 'DOCX', '.pptx': 'PPTX', '.ppt': 'PPTX', '.pdf': 'PDF'}[file_extension]
+            markitdown = MarkItDown()
             try:
-                result = markitdown.convert(file_path)
+                # Use markitdown to convert different formats to markdown
+                start = time.perf_counter()
+                result = markitdown.convert_stream(io.BytesIO(data), file_extension=file_extension)
                 if result is None:
-                    return f"Failed to convert PDF file: {file_path}. Empty result returned.", None
-            except Exception as pdf_err:
-                print(f"PDF conversion error: {str(pdf_err)}")
+                    return f"Failed to convert {kind} file: {file_path}. Empty result returned.", None
+                print(f"Converted {file_name or file_path} to markdown in {time.perf_counter() - start:.1f}s")
+            except Exception as convert_err:
+                print(f"{kind} conversion error: {str(convert_err)}")
                 print(traceback.format_exc())
-                return f"Error converting PDF file: {str(pdf_err)}", None
-        elif file_extension in ['.md', '.markdown']:
-            # If already markdown, just read the file
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                # Create a simple object that mimics markitdown result structure
-                class MarkdownResult:
-                    def __init__(self, content):
-                        self.text_content = content
-                        self.markdown = content
-                result = MarkdownResult(content)
-            except UnicodeDecodeError:
-                # Try with a different encoding if utf-8 fails
-                try:
-                    with open(file_path, 'r', encoding='latin-1') as f:
-                        content = f.read()
-                    class MarkdownResult:
-                        def __init__(self, content):
-                            self.text_content = content
-                            self.markdown = content
-                    result = MarkdownResult(content)
-                except Exception as encoding_err:
-                    return f"Error reading file with alternative encoding: {str(encoding_err)}", None
+                return f"Error converting {kind} file: {str(convert_err)}", None
         else:
             return f"Unsupported file format: {file_extension}", None
             
-        # Save markdown content alongside the original file if path is provided
-        if original_file_path and hasattr(result, 'text_content'):
-            try:
-                # Get the directory of the original file
-                original_dir = os.path.dirname(original_file_path)
-                
-                # Create filename with .md extension
-                markdown_filename = f"{file_stem}.md"
-                markdown_path = os.path.join(original_dir, markdown_filename)
-                
-                # Write the markdown content to file
-                with open(markdown_path, 'w', encoding='utf-8') as md_file:
-                    md_file.write(result.text_content)
-                    
-                print(f"Saved markdown file to: {markdown_path}")
-            except Exception as save_err:
-                print(f"Error saving markdown file: {str(save_err)}")
-                print(traceback.format_exc())
-                # Continue even if saving fails - we'll still return the result
+        # Cache the markdown content instead of writing it next to the upload
+        try:
+            _write_cached_markdown(content_hash, result.text_content)
+        except Exception as save_err:
+            print(f"Error caching markdown file: {str(save_err)}")
+            print(traceback.format_exc())
+            # Continue even if caching fails - we'll still return the result
             
         return None, result
     except Exception as e:
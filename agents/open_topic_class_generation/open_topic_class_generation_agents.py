@@ -4,13 +4,14 @@ from autogen_agentchat.teams import SelectorGroupChat
 
 from agents.tools.bing_search import bing_search_tool
 from agents.tools.fetch_webpage import fetch_webpage_tool
-from agents.tools.url_accessiable import url_accessible_valid_tool
 from config import (
+    LESSON_FORMATTER_AGENT,
     get_advance_model_client,
     get_low_model_client,
     get_model_client,
     get_moderate_model_client,
 )
+from lessonOutput import LESSON_FORMATTER_MODE, MEDIA_CHECK_TOOLS, PROMPT_MEDIA_CHECK, LessonFormatterAgent
 
 model_client = get_model_client()
 advance_model_client = get_advance_model_client()
@@ -185,27 +186,34 @@ def create_team()->SelectorGroupChat:
         description="An agent that reviews educational content for accuracy, effectiveness, and alignment with learning goals in Chinese.",
         model_client=advance_model_client,
         model_client_stream=True,
-        tools=[url_accessible_valid_tool],
-        system_message=PROMPT_VERIFIER)
+        tools=MEDIA_CHECK_TOOLS,
+        system_message=PROMPT_VERIFIER + PROMPT_MEDIA_CHECK)
 
     summary_agent = AssistantAgent(
         name="materials_compiler",
         description="Compile and format all educational materials into a comprehensive course package in Chinese.",
         model_client=moderate_model_client,
         model_client_stream=True,
-        tools=[url_accessible_valid_tool],
-        system_message=PROMPT_SUMMARY)
+        tools=MEDIA_CHECK_TOOLS,
+        system_message=PROMPT_SUMMARY + PROMPT_MEDIA_CHECK)
     
-    markdown_content_formator = AssistantAgent(
-            "markdwon_content_formator",
+    if LESSON_FORMATTER_MODE == "llm":
+        markdown_content_formator = AssistantAgent(
+            "markdown_content_formator",
             description="An agent that formats markdown content by removing query parameters from image and video URLs.",
             model_client=low_model_client,
             model_client_stream=True,
             system_message=PROMPT_MARKDOWN_CONTENT_FORMAT)
+    else:
+        markdown_content_formator = LessonFormatterAgent(
+            LESSON_FORMATTER_AGENT,
+            description="An agent that formats markdown content by removing query parameters from image and video URLs.",
+            content_source=summary_agent.name)
     
     return SelectorGroupChat(
         [research_assistant, markdown_content_formator,verifier, summary_agent],
         termination_condition=termination,
         model_client=moderate_model_client,
         selector_prompt=PROMPT_SELECTOR,
-        allow_repeated_speaker=True)
+        allow_repeated_speaker=True,
+        emit_team_events=True)
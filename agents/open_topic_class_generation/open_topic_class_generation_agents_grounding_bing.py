@@ -2,16 +2,17 @@ from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.conditions import MaxMessageTermination, TextMentionTermination
 from autogen_agentchat.teams import SelectorGroupChat
 
-from agents.tools.grounding_bing_search import grounding_bing_search_tool
+from agents.tools.grounding_bing_search import grounding_bing_multi_search_tool, grounding_bing_search_tool
 from agents.tools.fetch_webpage import fetch_webpage_tool
-from agents.tools.url_accessiable import url_accessible_valid_tool
-from agents.tools.image_generate import image_generation_tool
+from agents.tools.image_generate import image_batch_generation_tool, image_generation_tool, image_review_tool
 from config import (
+    LESSON_FORMATTER_AGENT,
     get_advance_model_client,
     get_low_model_client,
     get_model_client,
     get_moderate_model_client,
 )
+from lessonOutput import LESSON_FORMATTER_MODE, MEDIA_CHECK_TOOLS, PROMPT_MEDIA_CHECK, LessonFormatterAgent
 
 model_client = get_model_client()
 advance_model_client = get_advance_model_client()
@@ -24,7 +25,7 @@ PROMPT_RESERACH = """You are an educational content creation assistant focused o
 
 Your primary role is to create high-quality course materials based on the outline provided by the teacher.
 For each topic in the outline:
-1. Use the grounding_bing_search_tool tool to find more informations about this topic. 
+1. Gather the background of the whole outline in ONE call to the grounding_bing_multi_search_tool tool, with one query per topic, then use the grounding_bing_search_tool tool only for a follow-up question on a single topic.
 2. Search for relevant examples, case studies and references that can be included.
 3. Use the generate_image tool to create relevant images for key concepts when appropriate.
 4. When embedding images or videos in markdown, remove unnecessary URL parameters to ensure they can be successfully previewed in markdown. For image URLs with query parameters (like https://example.com/image.jpg?width=800&height=600), remove everything after the question mark by using only the base URL (https://example.com/image.jpg).
@@ -137,7 +138,7 @@ PROMPT_IMAGE_CREATOR = """You are an educational image creator specialized in ge
 
 Your role is to:
 1. Listen carefully to the educational content being developed
-2. When requested or when you identify an opportunity for visual explanation, create images using the generate_image tool
+2. When requested or when you identify an opportunity for visual explanation, create images using the generate_images tool
 3. Focus on creating images that are pedagogically effective, visually clear, and culturally appropriate
 4. Ensure all text in images is in Simplified Chinese
 5. Create images that are age-appropriate for the specified student level
@@ -149,13 +150,16 @@ Your role is to:
    - Cultural elements relevant to the lesson
 
 When generating images:
-1. Provide a clear, detailed prompt to the generate_image tool
+1. Plan all the illustrations the lesson needs first, then create them in ONE call to the generate_images tool with one clear, detailed prompt per image. Only use the generate_image tool for a single additional or replacement image
 2. Describe what the image should contain specifically
 3. Specify any text to include (in Simplified Chinese only)
 4. Note the style appropriate for the educational context and student age
+5. When an image is central to the lesson (e.g. a diagram students must read), check it with the review_image tool and regenerate it with the generate_image tool if the feedback shows it does not match
 
-After receiving the generated image URL, embed it properly in the markdown using:
+After receiving the generated image URLs, embed each one properly in the markdown using (skip the prompts whose url is null):
 ![描述](image_url)
+When several images are shown together (e.g. a gallery or an overview), embed the thumbnail linking to the full image instead:
+[![描述](thumbnail_url)](image_url)
 
 All content must be in Simplified Chinese (Mandarin). Do not include any content in Japanese or other languages.
 回答所有的内容必须是中文。不要包含任何日语或其他语言的内容。
@@ -225,7 +229,7 @@ def create_team_grounding_with_bing()->SelectorGroupChat:
         model_client=advance_model_client,
         model_client_stream=True,
         system_message=PROMPT_RESERACH,
-        tools=[fetch_webpage_tool, grounding_bing_search_tool, image_generation_tool])
+        tools=[fetch_webpage_tool, grounding_bing_multi_search_tool, grounding_bing_search_tool, image_generation_tool])
 
     image_creator_agent = AssistantAgent(
         "image_creator",
@@ -233,34 +237,41 @@ def create_team_grounding_with_bing()->SelectorGroupChat:
         model_client=advance_model_client,
         model_client_stream=True,
         system_message=PROMPT_IMAGE_CREATOR,
-        tools=[image_generation_tool])
+        tools=[image_batch_generation_tool, image_generation_tool, image_review_tool])
 
     verifier = AssistantAgent(
         "content_reviewer",
         description="An agent that reviews educational content for accuracy, effectiveness, and alignment with learning goals in Chinese.",
         model_client=advance_model_client,
         model_client_stream=True,
-        tools=[url_accessible_valid_tool],
-        system_message=PROMPT_VERIFIER)
+        tools=MEDIA_CHECK_TOOLS,
+        system_message=PROMPT_VERIFIER + PROMPT_MEDIA_CHECK)
 
     summary_agent = AssistantAgent(
         name="materials_compiler",
         description="Compile and format all educational materials into a comprehensive course package in Chinese.",
         model_client=moderate_model_client,
         model_client_stream=True,
-        tools=[url_accessible_valid_tool],
-        system_message=PROMPT_SUMMARY)
+        tools=MEDIA_CHECK_TOOLS,
+        system_message=PROMPT_SUMMARY + PROMPT_MEDIA_CHECK)
     
-    markdown_content_formator = AssistantAgent(
-            "markdwon_content_formator",
+    if LESSON_FORMATTER_MODE == "llm":
+        markdown_content_formator = AssistantAgent(
+            "markdown_content_formator",
             description="An agent that formats markdown content by removing query parameters from image and video URLs.",
             model_client=low_model_client,
             model_client_stream=True,
             system_message=PROMPT_MARKDOWN_CONTENT_FORMAT)
+    else:
+        markdown_content_formator = LessonFormatterAgent(
+            LESSON_FORMATTER_AGENT,
+            description="An agent that formats markdown content by removing query parameters from image and video URLs.",
+            content_source=summary_agent.name)
     
     return SelectorGroupChat(
         [research_assistant, image_creator_agent, markdown_content_formator, verifier, summary_agent],
         termination_condition=termination,
         model_client=moderate_model_client,
         selector_prompt=PROMPT_SELECTOR,
-        allow_repeated_speaker=True)
+        allow_repeated_speaker=True,
+        emit_team_events=True)
@@ -0,0 +1,122 @@
+"""
+Benchmark of the HTML to markdown engines on a corpus of saved pages.
+
+Compares the legacy BeautifulSoup + html2text path with the lxml engine on CPU time
+and on the number of tokens of the markdown handed to the agents. The corpus is a
+directory of saved `.html` files, or the page cache of `fetch_webpage` (the default),
+which accumulates the Chinese educational pages the agents actually read.
+
+Usage:
+    python -m agents.tools.benchmark_html_to_markdown [corpus directory] [--repeat N] [--verbose]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+
+from agents.file_processor.condenser import estimate_tokens
+from agents.tools.html_to_markdown import fast_html_to_markdown, legacy_html_to_markdown, lxml_html
+from httpClientPool.pageCache import BODY_FILE, META_FILE, PAGE_CACHE_DIR, detect_charset
+
+
+def load_corpus(directory: str) -> List[Tuple[str, str, str]]:
+    """
+    Load the pages of a corpus directory.
+
+    Args:
+        directory: Directory of `.html`/`.htm` files, or a page cache directory
+
+    Returns:
+        The pages as (name, base URL, HTML) tuples
+    """
+    pages = []
+    for root, _, files in os.walk(directory):
+        if META_FILE in files and BODY_FILE in files:
+            with open(os.path.join(root, META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if "html" not in meta.get("content_type", "html"):
+                continue
+            with gzip.open(os.path.join(root, BODY_FILE), "rb") as f:
+                body = f.read()
+            encoding = meta.get("encoding") or detect_charset(meta.get("content_type", ""), body)
+            html = body.decode(encoding, errors="replace")
+            pages.append((meta.get("url", root), meta.get("url", ""), html))
+            continue
+        for name in files:
+            if name.lower().endswith((".html", ".htm")):
+                path = os.path.join(root, name)
+                with open(path, "rb") as f:
+                    body = f.read()
+                # Saved pages keep their original charset, often GBK/GB18030
+                html = body.decode(detect_charset("", body), errors="replace")
+                pages.append((path, "", html))
+    return sorted(pages)
+
+
+def measure(convert: Callable[[str, str], str], pages: List[Tuple[str, str, str]], repeat: int) -> Dict:
+    """Convert every page `repeat` times and return the CPU time and output tokens per page."""
+    results = {}
+    for name, base_url, html in pages:
+        best = None
+        markdown = ""
+        for _ in range(repeat):
+            start = time.process_time()
+            markdown = convert(html, base_url)
+            elapsed = time.process_time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = {"cpu_seconds": best, "tokens": estimate_tokens(markdown), "chars": len(markdown)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the HTML to markdown engines on saved pages.")
+    parser.add_argument("corpus", nargs="?", default=PAGE_CACHE_DIR,
+                        help=f"Directory of saved .html pages or a page cache (default: {PAGE_CACHE_DIR})")
+    parser.add_argument("--repeat", type=int, default=3, help="Conversions per page; the fastest is kept")
+    parser.add_argument("--verbose", action="store_true", help="Print the results of every page")
+    args = parser.parse_args()
+
+    if lxml_html is None:
+        parser.error("lxml is not installed; the fast engine cannot be benchmarked")
+
+    pages = load_corpus(args.corpus)
+    if not pages:
+        parser.error(f"No saved pages found in {args.corpus}")
+
+    engines = {
+        "legacy": lambda html, base_url: legacy_html_to_markdown(html, base_url),
+        "fast": lambda html, base_url: fast_html_to_markdown(html, base_url),
+    }
+    results = {engine: measure(convert, pages, max(1, args.repeat)) for engine, convert in engines.items()}
+
+    if args.verbose:
+        print(f"{'page':<60} {'legacy ms':>10} {'fast ms':>10} {'legacy tok':>11} {'fast tok':>10}")
+        for name, _, _ in pages:
+            legacy, fast = results["legacy"][name], results["fast"][name]
+            print(f"{name[-60:]:<60} {legacy['cpu_seconds'] * 1000:>10.1f} {fast['cpu_seconds'] * 1000:>10.1f} "
+                  f"{legacy['tokens']:>11} {fast['tokens']:>10}")
+        print()
+
+    totals = {
+        engine: {
+            "cpu_seconds": sum(page["cpu_seconds"] for page in pages_results.values()),
+            "tokens": sum(page["tokens"] for page in pages_results.values()),
+        }
+        for engine, pages_results in results.items()
+    }
+    legacy, fast = totals["legacy"], totals["fast"]
+    print(f"Pages: {len(pages)}")
+    for engine, total in totals.items():
+        print(f"{engine:>6}: {total['cpu_seconds']:.3f}s CPU ({total['cpu_seconds'] / len(pages) * 1000:.1f} ms/page), "
+              f"{total['tokens']} output tokens ({total['tokens'] / len(pages):.0f}/page)")
+    if fast["cpu_seconds"] > 0:
+        print(f"Speed-up: {legacy['cpu_seconds'] / fast['cpu_seconds']:.1f}x")
+    if legacy["tokens"] > 0:
+        print(f"Output tokens: {(1 - fast['tokens'] / legacy['tokens']) * 100:.0f}% fewer")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,30 @@
 import asyncio
 import json
+import logging
 import os
+import time
 from typing import Dict, List, Optional
-from urllib.parse import urljoin
+from urllib.parse import urlparse
 
 import chainlit as cl
-import html2text
 import httpx
 from autogen_core.tools import FunctionTool
-from bs4 import BeautifulSoup
-from agents.tools.fetch_webpage import clean_image_url
+from agents.tools.bing_search_cache import bing_search_cache
+from agents.tools.html_to_markdown import clean_image_url
+from agents.tools.page_content import fetch_page_markdown
+from httpClientPool import http_client_manager
+from teamRun import timed_tool
+
+logger = logging.getLogger("bing_search")
+
+# Overall time budget of a search call, including fetching the result pages
+BING_SEARCH_DEADLINE_SECONDS = float(os.environ.get("BING_SEARCH_DEADLINE_SECONDS", "20"))
+# Result pages fetched at the same time from a single host
+BING_SEARCH_FETCH_PER_HOST = int(os.environ.get("BING_SEARCH_FETCH_PER_HOST", "2"))
 
 
 @cl.step(type="tool", name="bing_search")
+@timed_tool("bing_search")
 async def bing_search(
     query: str,
     num_results: int = 2,
@@ -44,6 +56,8 @@ async def bing_search(
     Raises:
         ValueError: If API credentials are invalid or request fails
     """
+    deadline = time.monotonic() + BING_SEARCH_DEADLINE_SECONDS
+
     # Get and validate API key
     api_key = os.getenv("BING_SEARCH_KEY", "").strip()
 
@@ -74,39 +88,39 @@ async def bing_search(
         }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
-
-                soup = BeautifulSoup(response.text, "html.parser")
-
-                # Remove script and style elements
-                for script in soup(["script", "style"]):
-                    script.decompose()
+            return await fetch_page_markdown(url, headers=headers, max_length=max_length)
 
-                # Convert relative URLs to absolute
-                for tag in soup.find_all(["a", "img"]):
-                    if tag.get("href"):
-                        tag["href"] = urljoin(url, tag["href"])
-                    if tag.get("src"):
-                        tag["src"] = urljoin(url, tag["src"])
-
-                h2t = html2text.HTML2Text()
-                h2t.body_width = 0
-                h2t.ignore_images = False
-                h2t.ignore_emphasis = False
-                h2t.ignore_links = False
-                h2t.ignore_tables = False
-
-                markdown = h2t.handle(str(soup))
+        except Exception as e:
+            return f"Error fetching content: {str(e)}"
 
-                if max_length and len(markdown) > max_length:
-                    markdown = markdown[:max_length] + "\n...(truncated)"
+    async def fetch_all_contents(pending: List[Dict[str, str]]) -> None:
+        """Fetch the pages of the results concurrently, until the deadline of the call"""
+        host_slots: Dict[str, asyncio.Semaphore] = {}
 
-                return markdown.strip()
+        async def fetch_one(result: Dict[str, str]) -> None:
+            host = urlparse(result["link"]).netloc.lower()
+            slot = host_slots.setdefault(host, asyncio.Semaphore(BING_SEARCH_FETCH_PER_HOST))
+            async with slot:
+                result["content"] = await fetch_page_content(
+                    result["link"], max_length=content_max_length
+                )
 
-        except Exception as e:
-            return f"Error fetching content: {str(e)}"
+        tasks = [asyncio.create_task(fetch_one(result)) for result in pending]
+        try:
+            _, late = await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic()))
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Pages that missed the deadline keep their title, link and snippet
+        for result in pending:
+            if "content" not in result:
+                result["content"] = (
+                    f"Error fetching content: not fetched within the {BING_SEARCH_DEADLINE_SECONDS:g}s search deadline"
+                )
+        if late:
+            print(f"bing_search: {len(late)} of {len(pending)} result pages missed the deadline")
 
     # Build request headers and parameters
     headers = {"Ocp-Apim-Subscription-Key": api_key, "Accept": "application/json"}
@@ -129,10 +143,13 @@ async def bing_search(
         "setLang": language.split("-")[0],  # Add explicit language parameter
     }
 
-    # Make the request
+    # Make the request, unless the same search is cached
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
+        items = await bing_search_cache.get(query, market, safe_search, response_filter, params["count"])
+        if items is not None:
+            logger.info(f"bing_search cache hit for '{query}': {bing_search_cache.metrics()}")
+        else:
+            response = await http_client_manager.get(
                 "https://api.bing.microsoft.com/v7.0/search",
                 headers=headers,
                 params=params,
@@ -157,23 +174,27 @@ async def bing_search(
             response.raise_for_status()
             data = response.json()
 
-        # Process results based on response_filter
+            # Process results based on response_filter
+            if response_filter == "webpages" and "webPages" in data:
+                items = data["webPages"]["value"]
+            elif response_filter == "news" and "news" in data:
+                items = data["news"]["value"]
+            elif response_filter == "images" and "images" in data:
+                items = data["images"]["value"]
+            elif response_filter == "videos" and "videos" in data:
+                items = data["videos"]["value"]
+            else:
+                if not any(key in data for key in ["webPages", "news", "images", "videos"]):
+                    return []  # No results found
+                raise ValueError(f"No {response_filter} results found in API response")
+
+            await bing_search_cache.set(items, query, market, safe_search, response_filter, params["count"])
+
         results = []
-        if response_filter == "webpages" and "webPages" in data:
-            items = data["webPages"]["value"]
-        elif response_filter == "news" and "news" in data:
-            items = data["news"]["value"]
-        elif response_filter == "images" and "images" in data:
-            items = data["images"]["value"]
-        elif response_filter == "videos" and "videos" in data:
-            items = data["videos"]["value"]
-        else:
-            if not any(key in data for key in ["webPages", "news", "images", "videos"]):
-                return []  # No results found
-            raise ValueError(f"No {response_filter} results found in API response")
 
         # Extract relevant information based on result type
-        for item in items:
+        pending_content = []
+        for item in items[:num_results]:
             result = {"title": item.get("name", "")}
 
             if response_filter == "webpages":
@@ -181,9 +202,7 @@ async def bing_search(
                 if include_snippets:
                     result["snippet"] = item.get("snippet", "")
                 if include_content:
-                    result["content"] = await fetch_page_content(
-                        result["link"], max_length=content_max_length
-                    )
+                    pending_content.append(result)
 
             elif response_filter == "news":
                 result["link"] = item.get("url", "")
@@ -191,9 +210,7 @@ async def bing_search(
                     result["snippet"] = item.get("description", "")
                 result["date"] = item.get("datePublished", "")
                 if include_content:
-                    result["content"] = await fetch_page_content(
-                        result["link"], max_length=content_max_length
-                    )
+                    pending_content.append(result)
 
             elif response_filter == "images":
                 result["link"] = clean_image_url(item.get("contentUrl", ""))
@@ -209,7 +226,10 @@ async def bing_search(
                 result["duration"] = item.get("duration", "")
 
             results.append(result)
-        
+
+        if pending_content:
+            await fetch_all_contents(pending_content)
+
         for result in results:
             print("bing_search***********\n")
             print("title:" + result["title"])
@@ -218,7 +238,7 @@ async def bing_search(
 
         return results[:num_results]
 
-    except httpx.RequestException as e:
+    except httpx.RequestError as e:
         error_msg = str(e)
         if "InvalidApiKey" in error_msg:
             raise ValueError(
@@ -0,0 +1,156 @@
+"""
+Persistent cache of Bing search API results.
+
+Agents search for the same poems, poets and landmarks across sessions, so the result
+items returned by the Bing API are cached under (query, market, safe_search,
+response_filter, count). A small in-process LRU sits in front of a sqlite store that
+survives restarts and is shared by the workers of one host. News results expire
+much sooner than web pages, images and videos.
+"""
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from sharedState import ResultCache, SqliteStateBackend
+
+load_dotenv()
+
+logger = logging.getLogger("bing_search_cache")
+
+BING_SEARCH_CACHE_PATH = os.environ.get("BING_SEARCH_CACHE_PATH", ".cache/bing_search.sqlite")
+BING_SEARCH_CACHE_MEMORY_ENTRIES = int(os.environ.get("BING_SEARCH_CACHE_MEMORY_ENTRIES", "512"))
+
+# Time to live of the cached results per response filter, in seconds (0 disables caching)
+BING_SEARCH_CACHE_TTLS = {
+    "webpages": float(os.environ.get("BING_SEARCH_CACHE_TTL_WEBPAGES", "604800")),
+    "news": float(os.environ.get("BING_SEARCH_CACHE_TTL_NEWS", "3600")),
+    "images": float(os.environ.get("BING_SEARCH_CACHE_TTL_IMAGES", "604800")),
+    "videos": float(os.environ.get("BING_SEARCH_CACHE_TTL_VIDEOS", "604800")),
+}
+
+
+class BingSearchCache:
+    """
+    Two-level cache of Bing result items: memory LRU first, then the sqlite store.
+
+    Entries keep their absolute expiry time, so an item promoted from disk to memory
+    never outlives the TTL it was stored with.
+    """
+
+    def __init__(
+        self,
+        path: str = BING_SEARCH_CACHE_PATH,
+        memory_entries: int = BING_SEARCH_CACHE_MEMORY_ENTRIES,
+        ttls: Optional[Dict[str, float]] = None,
+    ):
+        self._path = path
+        self._memory_entries = memory_entries
+        self._ttls = ttls or BING_SEARCH_CACHE_TTLS
+        self._memory: "OrderedDict[str, Tuple[List[Dict[str, Any]], float]]" = OrderedDict()
+        self._store: Optional[ResultCache] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @property
+    def store(self) -> ResultCache:
+        """Return the on-disk store, opening the sqlite file on first use."""
+        if self._store is None:
+            self._store = ResultCache("bing_search", backend=SqliteStateBackend(self._path))
+        return self._store
+
+    def ttl(self, response_filter: str) -> float:
+        """Return the time to live of the results of a response filter."""
+        return self._ttls.get(response_filter.lower(), 0.0)
+
+    def _remember(self, key: str, items: List[Dict[str, Any]], expires_at: float) -> None:
+        self._memory[key] = (items, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_entries:
+            self._memory.popitem(last=False)
+
+    async def get(
+        self, query: str, market: str, safe_search: str, response_filter: str, count: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Return the cached result items of a search, or None on a miss.
+
+        Args:
+            query: Search query string
+            market: Market code sent to the API (e.g. 'zh-CN')
+            safe_search: SafeSearch setting
+            response_filter: Type of results
+            count: Number of results requested from the API
+
+        Returns:
+            The cached result items, or None
+        """
+        if self.ttl(response_filter) <= 0:
+            return None
+        parts = (query.strip(), market.lower(), safe_search.lower(), response_filter.lower(), count)
+        key = self.store.make_key(*parts)
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[1] > time.time():
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+            del self._memory[key]
+
+        try:
+            cached = await self.store.get(*parts)
+        except Exception as e:
+            logger.warning(f"Bing search cache read failed: {e}")
+            cached = None
+        if cached is None:
+            self.misses += 1
+            return None
+
+        self.disk_hits += 1
+        self._remember(key, cached["items"], cached["expires_at"])
+        return cached["items"]
+
+    async def set(
+        self,
+        items: List[Dict[str, Any]],
+        query: str,
+        market: str,
+        safe_search: str,
+        response_filter: str,
+        count: int,
+    ) -> None:
+        """Store the result items of a search with the TTL of its response filter."""
+        ttl = self.ttl(response_filter)
+        if ttl <= 0:
+            return
+        parts = (query.strip(), market.lower(), safe_search.lower(), response_filter.lower(), count)
+        expires_at = time.time() + ttl
+        self._remember(self.store.make_key(*parts), items, expires_at)
+        try:
+            await self.store.set({"items": items, "expires_at": expires_at}, *parts, ttl=ttl)
+        except Exception as e:
+            logger.warning(f"Bing search cache write failed: {e}")
+        self.stores += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return the hit/miss counters of the cache since the process started."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+# Create a singleton instance of the cache shared by all searches of the process
+bing_search_cache = BingSearchCache()
@@ -1,28 +1,15 @@
 from typing import Dict, Optional
-from urllib.parse import urljoin, urlparse
 
 import chainlit as cl
-import html2text
 import httpx
 from autogen_core.tools import FunctionTool
-from bs4 import BeautifulSoup
 
-
-def clean_image_url(url: str) -> str:
-    """Remove query parameters from image URLs.
-    
-    Args:
-        url: The image URL that might contain query parameters
-        
-    Returns:
-        str: Clean URL without query parameters
-    """
-    parsed = urlparse(url)
-    clean = parsed.scheme + "://" + parsed.netloc + parsed.path
-    return clean
+from agents.tools.page_content import fetch_page_markdown
+from teamRun import timed_tool
 
 
 @cl.step(type="tool", name="fetch_webpage")
+@timed_tool("fetch_webpage")
 async def fetch_webpage(
     url: str,
     include_images: bool = True,
@@ -50,44 +37,15 @@ async def fetch_webpage(
         }
 
     try:
-        # Fetch the webpage
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-
-            # Parse HTML
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-
-            # Convert relative URLs to absolute and clean image URLs
-            for tag in soup.find_all(["a", "img"]):
-                if tag.get("href"):
-                    tag["href"] = urljoin(url, tag["href"])
-                if tag.get("src"):
-                    tag["src"] = urljoin(url, tag["src"])
-                    # Clean image URLs by removing query parameters
-                    if tag.name == "img":
-                        tag["src"] = clean_image_url(tag["src"])
-
-            # Configure HTML to Markdown converter
-            h2t = html2text.HTML2Text()
-            h2t.body_width = 0  # No line wrapping
-            h2t.ignore_images = not include_images
-            h2t.ignore_emphasis = False
-            h2t.ignore_links = False
-            h2t.ignore_tables = False
-
-            # Convert to markdown
-            markdown = h2t.handle(str(soup))
-
-            # Trim if max_length is specified
-            if max_length and len(markdown) > max_length:
-                markdown = markdown[:max_length] + "\n...(truncated)"
-
-            return markdown.strip()
+        # Stream the webpage within a byte budget derived from max_length, reusing the
+        # cached copy and its markdown when the page has not changed
+        return await fetch_page_markdown(
+            url,
+            headers=headers,
+            max_length=max_length,
+            include_images=include_images,
+            clean_image_urls=True,
+        )
 
     except httpx.RequestError as e:
         raise ValueError(f"Failed to fetch webpage: {str(e)}") from e
@@ -1,17 +1,21 @@
-from concurrent.futures import thread
-from azure.ai.projects import AIProjectClient
-from azure.identity import DefaultAzureCredential
 import asyncio
 import json
 import os
-from typing import Dict, List, Optional
-from urllib.parse import urljoin
-import chainlit as cl
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
 
-import html2text
-import httpx
 from autogen_core.tools import FunctionTool
-from bs4 import BeautifulSoup
+
+from agents.tools.grounding_clients import close_grounding_clients, grounding_client_manager, grounding_thread_pool
+from agents.tools.page_content import fetch_page_markdown
+from teamRun import timed_tool
+
+# Grounded agent runs executing at the same time in grounding_bing_multi_search
+GROUNDING_SEARCH_CONCURRENCY = int(os.environ.get("GROUNDING_SEARCH_CONCURRENCY", "4"))
+# Time budget of the cited page fetches of one call, in seconds
+GROUNDING_SEARCH_DEADLINE_SECONDS = float(os.environ.get("GROUNDING_SEARCH_DEADLINE_SECONDS", "20"))
+# Cited pages fetched at the same time from a single site
+GROUNDING_SEARCH_FETCH_PER_HOST = int(os.environ.get("GROUNDING_SEARCH_FETCH_PER_HOST", "2"))
 
 
 async def fetch_page_content(url: str, max_length: Optional[int] = 50000) -> str:
@@ -21,42 +25,115 @@ async def fetch_page_content(url: str, max_length: Optional[int] = 50000) -> str
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+        return await fetch_page_markdown(url, headers=headers, max_length=max_length)
 
-            soup = BeautifulSoup(response.text, "html.parser")
+    except Exception as e:
+        return f"Error fetching content: {str(e)}"
 
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
 
-            # Convert relative URLs to absolute
-            for tag in soup.find_all(["a", "img"]):
-                if tag.get("href"):
-                    tag["href"] = urljoin(url, tag["href"])
-                if tag.get("src"):
-                    tag["src"] = urljoin(url, tag["src"])
+async def grounded_citations(query: str) -> Dict[str, Dict[str, str]]:
+    """
+    Run the grounding agent on one query and collect the URLs it cites.
 
-            h2t = html2text.HTML2Text()
-            h2t.body_width = 0
-            h2t.ignore_images = False
-            h2t.ignore_emphasis = False
-            h2t.ignore_links = False
-            h2t.ignore_tables = False
+    Args:
+        query: Search query string
 
-            markdown = h2t.handle(str(soup))
+    Returns:
+        The title and summary of each cited URL, in citation order
+    """
+    # Reuse the credential, project client and agent of this event loop
+    agents_client = grounding_client_manager.agents_client
+    agent = await grounding_client_manager.get_agent()
 
-            if max_length and len(markdown) > max_length:
-                markdown = markdown[:max_length] + "\n...(truncated)"
+    # Each search gets a fresh thread, pre-created by the pool and deleted after use
+    thread_id = await grounding_thread_pool.acquire()
+    try:
+        # Create message with user's query
+        await agents_client.messages.create(
+            thread_id=thread_id,
+            role="user",
+            content=query
+        )
 
-            return markdown.strip()
+        # Process the query; the async client polls the run without blocking the loop
+        run = await agents_client.runs.create_and_process(
+            thread_id=thread_id,
+            agent_id=agent.id
+        )
+        print(f"Run finished with status: {run.status}")
 
-    except Exception as e:
-        return f"Error fetching content: {str(e)}"
+        if run.status == "failed":
+            print(f"Run failed: {run.last_error}")
+
+
+        # Get all messages in the thread
+        messages = [text_message async for text_message in agents_client.messages.list(thread_id=thread_id)]
+    finally:
+        grounding_thread_pool.release(thread_id)
+    
+    # Process citations from AI response
+    url_citations = {}
+    for text_message in messages:
+        message_datas = text_message.content
+        for message_data in message_datas:
+            if message_data['type'] == 'text' and 'annotations' in message_data['text']:
+                annotations = message_data['text'].get('annotations', [])
+                # Extract URL citations
+                for annotation in annotations:
+                    if annotation['type'] == 'url_citation' and 'url_citation' in annotation:
+                        summary = message_data['text'].get("value")
+                        url = annotation['url_citation']['url']
+                        title = annotation['url_citation']['title']
+                        
+                        # Store unique citations
+                        if url not in url_citations:
+                            url_citations[url] = {
+                                "title": title,
+                                "summary": summary
+                            }
+
+    return url_citations
+
+
+async def fetch_citation_contents(results: List[Dict[str, str]], max_length: Optional[int]) -> None:
+    """
+    Fetch the pages of cited results concurrently, until the deadline.
+
+    At most GROUNDING_SEARCH_FETCH_PER_HOST pages are fetched from the same site at
+    once. Pages that miss the GROUNDING_SEARCH_DEADLINE_SECONDS deadline keep their
+    title, link and summary, with an error as content.
+
+    Args:
+        results: The results, whose 'content' is set in place
+        max_length: Maximum length of the content of each page
+    """
+    host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    async def fetch_one(result: Dict[str, str]) -> None:
+        host = urlparse(result["link"]).netloc.lower()
+        slot = host_slots.setdefault(host, asyncio.Semaphore(GROUNDING_SEARCH_FETCH_PER_HOST))
+        async with slot:
+            result["content"] = await fetch_page_content(result["link"], max_length=max_length)
+
+    tasks = [asyncio.create_task(fetch_one(result)) for result in results]
+    try:
+        _, late = await asyncio.wait(tasks, timeout=GROUNDING_SEARCH_DEADLINE_SECONDS) if tasks else (set(), set())
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    for result in results:
+        if "content" not in result:
+            result["content"] = (
+                f"Error fetching content: not fetched within the {GROUNDING_SEARCH_DEADLINE_SECONDS:g}s search deadline"
+            )
+    if late:
+        print(f"grounding_bing_search: {len(late)} of {len(results)} cited pages missed the deadline")
 
 
 #@cl.step(type="tool", name="grounding_bing_search")
+@timed_tool("grounding_bing_search")
 async def grounding_bing_search(
     query: str,
     include_content: bool = True,
@@ -77,75 +154,7 @@ async def grounding_bing_search(
         ValueError: If API credentials are invalid or request fails
     """
     try:
-        # Set up Azure credential and client
-        credential = DefaultAzureCredential(
-            exclude_workload_identity_credential=True,
-            exclude_environment_credential=True,
-            exclude_managed_identity_credential=True,
-            exclude_shared_token_cache_credential=True,
-            exclude_visual_studio_code_credential=True,
-            exclude_developer_cli_credential=True,
-            exclude_cli_credential=False,
-            exclude_interactive_browser_credential=True,
-            exclude_powershell_credential=True
-        )
-
-        project_client = AIProjectClient(
-            credential=credential,
-            endpoint="https://ai-foundary-qiah-east-us2.services.ai.azure.com/api/projects/deep-research-prj"
-        )
-
-        agents_client = project_client.agents
-        agent = agents_client.get_agent("asst_mSmcy0phSs4vL9MawO1olApb")
-        
-        # Create a new thread for each search request
-        # thread = project_client.agents.create_thread()
-        # print(f"Created new thread: {thread.id} for query: {query}")
-        thread = agents_client.threads.create()
-        print(f"Created thread, ID: {thread.id}")
-
-
-        # Create message with user's query
-        message = agents_client.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=query
-        )
-
-        # Process the query
-        run = agents_client.runs.create_and_process(
-            thread_id=thread.id,
-            agent_id=agent.id
-        )
-        print(f"Run finished with status: {run.status}")
-
-        if run.status == "failed":
-            print(f"Run failed: {run.last_error}")
-
-
-        # Get all messages in the thread
-        messages = agents_client.messages.list(thread_id=thread.id)
-        
-        # Process citations from AI response
-        url_citations = {}
-        for text_message in messages:
-            message_datas = text_message.content
-            for message_data in message_datas:
-                if message_data['type'] == 'text' and 'annotations' in message_data['text']:
-                    annotations = message_data['text'].get('annotations', [])
-                    # Extract URL citations
-                    for annotation in annotations:
-                        if annotation['type'] == 'url_citation' and 'url_citation' in annotation:
-                            summary = message_data['text'].get("value")
-                            url = annotation['url_citation']['url']
-                            title = annotation['url_citation']['title']
-                            
-                            # Store unique citations
-                            if url not in url_citations:
-                                url_citations[url] = {
-                                    "title": title,
-                                    "summary": summary
-                                }
+        url_citations = await grounded_citations(query)
 
         # Format results similar to bing_search
         results = []
@@ -155,26 +164,14 @@ async def grounding_bing_search(
             print("summary:" + data["summary"])
             print("title:" + data["title"])
 
-            result = {
+            results.append({
                 "summary": data["summary"],
                 "title": data["title"],
                 "link": url
-            }
-            
-            if include_content:
-                result["content"] = await fetch_page_content(
-                    url, max_length=content_max_length
-                )
-                
-            results.append(result)
-            
-        # Optional: Delete the thread to clean up resources
-        # Uncomment if you want to delete threads after use
-        # try:
-        #     project_client.agents.delete_thread(thread_id=thread.id)
-        #     print(f"Deleted thread: {thread.id}")
-        # except Exception as del_err:
-        #     print(f"Could not delete thread {thread.id}: {str(del_err)}")
+            })
+
+        if include_content:
+            await fetch_citation_contents(results, content_max_length)
 
         return results
 
@@ -182,6 +179,66 @@ async def grounding_bing_search(
         raise ValueError(f"Grounding search request failed: {str(e)}")
 
 
+#@cl.step(type="tool", name="grounding_bing_multi_search")
+@timed_tool("grounding_bing_multi_search")
+async def grounding_bing_multi_search(
+    queries: List[str],
+    include_content: bool = True,
+    content_max_length: Optional[int] = 10000,
+) -> List[Dict[str, Any]]:
+    """
+    Perform several grounded searches at once, e.g. all the background of a lesson.
+
+    The grounded runs execute concurrently, at most GROUNDING_SEARCH_CONCURRENCY at a
+    time. A URL cited by several queries is returned once, with every query that
+    cited it, and the cited pages are fetched concurrently under a deadline.
+
+    Args:
+        queries: Search query strings
+        include_content: Include full webpage content in markdown format
+        content_max_length: Maximum length of webpage content (if included)
+
+    Returns:
+        List[Dict[str, Any]]: The search results with citations, each with the queries
+        that cited it, followed by an entry with the error of each failed query
+
+    Raises:
+        ValueError: If every query fails
+    """
+    queries = list(dict.fromkeys(query.strip() for query in queries if query and query.strip()))
+    slots = asyncio.Semaphore(GROUNDING_SEARCH_CONCURRENCY)
+
+    async def search(query: str) -> Dict[str, Dict[str, str]]:
+        async with slots:
+            return await grounded_citations(query)
+
+    outcomes = await asyncio.gather(*(search(query) for query in queries), return_exceptions=True)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    errors = []
+    for query, outcome in zip(queries, outcomes):
+        if isinstance(outcome, asyncio.CancelledError):
+            raise outcome
+        if isinstance(outcome, BaseException):
+            errors.append({"query": query, "error": f"Grounding search request failed: {str(outcome)}"})
+            continue
+        for url, data in outcome.items():
+            result = results.get(url)
+            if result is None:
+                results[url] = {"summary": data["summary"], "title": data["title"], "link": url, "queries": [query]}
+            else:
+                result["queries"].append(query)
+
+    if queries and len(errors) == len(queries):
+        raise ValueError("; ".join(error["error"] for error in errors))
+
+    merged = list(results.values())
+    if include_content:
+        await fetch_citation_contents(merged, content_max_length)
+    print(f"grounding_bing_multi_search: {len(queries)} queries, {len(merged)} distinct citations")
+    return merged + errors
+
+
 grounding_bing_search_tool = FunctionTool(
     grounding_bing_search,
     name="grounding_bing_search",
@@ -193,16 +250,26 @@ grounding_bing_search_tool = FunctionTool(
         "html2text",
         {"module": "bs4", "imports": ["BeautifulSoup"]},
         {"module": "urllib.parse", "imports": ["urljoin"]},
-        {"module": "azure.ai.projects", "imports": ["AIProjectClient"]},
-        {"module": "azure.identity", "imports": ["DefaultAzureCredential"]},
+        {"module": "azure.ai.projects.aio", "imports": ["AIProjectClient"]},
+        {"module": "azure.identity.aio", "imports": ["DefaultAzureCredential"]},
         "functools",
     ],
 )
 
 
+grounding_bing_multi_search_tool = FunctionTool(
+    grounding_bing_multi_search,
+    name="grounding_bing_multi_search",
+    description="\n    Perform several grounded searches at once using Azure AI Project Client, one per query.\n    Retrieves the deduplicated search results with citations of all the queries in a single call.\n    Requires Azure authentication.\n    ",
+)
+
+
 async def main():
-    result = await grounding_bing_search("2025年NBA季后赛，掘金和森林狼G4的比赛情况？")
-    print(json.dumps(result, ensure_ascii=False, indent=2))
+    try:
+        result = await grounding_bing_search("2025年NBA季后赛，掘金和森林狼G4的比赛情况？")
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    finally:
+        await close_grounding_clients()
 
 
 if __name__ == "__main__":
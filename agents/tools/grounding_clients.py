@@ -0,0 +1,287 @@
+"""
+Long-lived async clients of the grounded search tool.
+
+`grounding_bing_search` used to build a new Azure credential and project client and
+look the agent up on every call, then ran the synchronous SDK calls inside the async
+tool, blocking every session for the whole grounded run. The manager keeps one async
+credential, project client and agent handle per event loop, so the access token is
+fetched once and refreshed by the client's pipeline, and every SDK call awaits.
+
+Agent threads are taken from a small pool created ahead of the searches, and every
+used thread is deleted by a background collector in batches, so that neither the
+creation nor the deletion of threads is on the path of a search and server-side
+threads no longer pile up.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from azure.ai.projects.aio import AIProjectClient
+from azure.identity.aio import DefaultAzureCredential
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("grounding_clients")
+
+GROUNDING_PROJECT_ENDPOINT = os.getenv(
+    "GROUNDING_PROJECT_ENDPOINT",
+    "https://ai-foundary-qiah-east-us2.services.ai.azure.com/api/projects/deep-research-prj",
+)
+GROUNDING_AGENT_ID = os.getenv("GROUNDING_AGENT_ID", "asst_mSmcy0phSs4vL9MawO1olApb")
+
+# Agent threads kept created ahead of the searches (0 creates them on demand)
+GROUNDING_THREAD_POOL_SIZE = int(os.getenv("GROUNDING_THREAD_POOL_SIZE", "4"))
+# Pre-created threads unused for longer than this are deleted and replaced, in seconds
+GROUNDING_THREAD_MAX_IDLE_SECONDS = float(os.getenv("GROUNDING_THREAD_MAX_IDLE_SECONDS", "1800"))
+# Interval of the thread collector and number of threads it deletes concurrently
+GROUNDING_THREAD_GC_INTERVAL = float(os.getenv("GROUNDING_THREAD_GC_INTERVAL", "30"))
+GROUNDING_THREAD_GC_BATCH = int(os.getenv("GROUNDING_THREAD_GC_BATCH", "10"))
+
+
+def _create_credential() -> DefaultAzureCredential:
+    # Only the Azure CLI login is used, as before
+    return DefaultAzureCredential(
+        exclude_workload_identity_credential=True,
+        exclude_environment_credential=True,
+        exclude_managed_identity_credential=True,
+        exclude_shared_token_cache_credential=True,
+        exclude_visual_studio_code_credential=True,
+        exclude_developer_cli_credential=True,
+        exclude_cli_credential=False,
+        exclude_interactive_browser_credential=True,
+        exclude_powershell_credential=True
+    )
+
+
+class GroundingClientManager:
+    """
+    Per event loop async credential, project client and agent of the grounded search.
+
+    Async clients are bound to the loop that created them, so the chainlit app and
+    each `asyncio.run` of the bulk runner get their own.
+    """
+
+    def __init__(self, endpoint: str = GROUNDING_PROJECT_ENDPOINT, agent_id: str = GROUNDING_AGENT_ID):
+        self._endpoint = endpoint
+        self._agent_id = agent_id
+        self._clients: Dict[asyncio.AbstractEventLoop, Tuple[DefaultAzureCredential, AIProjectClient]] = {}
+        self._agents: Dict[asyncio.AbstractEventLoop, Any] = {}
+        self._agent_locks: Dict[asyncio.AbstractEventLoop, asyncio.Lock] = {}
+
+    def _drop_stale(self) -> None:
+        # Forget the clients of loops that have been closed, e.g. by asyncio.run
+        for clients in (self._clients, self._agents, self._agent_locks):
+            for stale_loop in [loop for loop in clients if loop.is_closed()]:
+                clients.pop(stale_loop, None)
+
+    def get_project_client(self) -> AIProjectClient:
+        """Return the project client of the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        clients = self._clients.get(loop)
+        if clients is None:
+            self._drop_stale()
+            credential = _create_credential()
+            clients = (credential, AIProjectClient(credential=credential, endpoint=self._endpoint))
+            self._clients[loop] = clients
+        return clients[1]
+
+    @property
+    def agents_client(self) -> Any:
+        """Return the agents client of the running event loop's project client."""
+        return self.get_project_client().agents
+
+    async def get_agent(self) -> Any:
+        """Return the grounding agent, looking it up once per event loop."""
+        loop = asyncio.get_running_loop()
+        agent = self._agents.get(loop)
+        if agent is not None:
+            return agent
+        lock = self._agent_locks.setdefault(loop, asyncio.Lock())
+        async with lock:
+            agent = self._agents.get(loop)
+            if agent is None:
+                agent = await self.agents_client.get_agent(self._agent_id)
+                self._agents[loop] = agent
+        return agent
+
+    async def close(self) -> None:
+        """Close the clients and credentials of the process."""
+        clients = list(self._clients.items())
+        self._clients.clear()
+        self._agents.clear()
+        self._agent_locks.clear()
+        current_loop = asyncio.get_running_loop()
+        closers: List[Tuple[asyncio.AbstractEventLoop, Any]] = []
+        for loop, (credential, project_client) in clients:
+            closers.append((loop, project_client.close()))
+            closers.append((loop, credential.close()))
+        for loop, closer in closers:
+            if loop is current_loop:
+                try:
+                    await closer
+                except Exception as e:
+                    logger.warning(f"Error closing a grounding client: {e}")
+            elif not loop.is_closed() and loop.is_running():
+                asyncio.run_coroutine_threadsafe(closer, loop)
+            else:
+                closer.close()
+
+
+# Create a singleton instance of the manager shared by all grounded searches
+grounding_client_manager = GroundingClientManager()
+
+
+class _LoopThreads:
+    """Thread pool state of one event loop."""
+
+    def __init__(self):
+        self.spare: Deque[Tuple[str, float]] = deque()
+        self.doomed: List[str] = []
+        self.refill: Optional[asyncio.Task] = None
+        self.collector: Optional[asyncio.Task] = None
+
+
+class GroundingThreadPool:
+    """
+    Pool of pre-created agent threads, each used by a single search.
+
+    A thread is not reused across searches: the grounding agent would otherwise
+    read the previous questions and answers with every new query. Instead spare
+    threads are created in the background after each acquisition, and the threads
+    released by finished searches are deleted by a periodic collector, in
+    concurrent batches.
+    """
+
+    def __init__(
+        self,
+        manager: GroundingClientManager = grounding_client_manager,
+        size: int = GROUNDING_THREAD_POOL_SIZE,
+        max_idle: float = GROUNDING_THREAD_MAX_IDLE_SECONDS,
+        gc_interval: float = GROUNDING_THREAD_GC_INTERVAL,
+        gc_batch: int = GROUNDING_THREAD_GC_BATCH,
+    ):
+        self._manager = manager
+        self._size = size
+        self._max_idle = max_idle
+        self._gc_interval = gc_interval
+        self._gc_batch = max(1, gc_batch)
+        self._loops: Dict[asyncio.AbstractEventLoop, _LoopThreads] = {}
+        self.created = 0
+        self.deleted = 0
+
+    def _state(self) -> _LoopThreads:
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            for stale_loop in [stale for stale in self._loops if stale.is_closed()]:
+                self._loops.pop(stale_loop, None)
+            state = _LoopThreads()
+            self._loops[loop] = state
+        if state.collector is None or state.collector.done():
+            state.collector = asyncio.create_task(self._collect_forever(state))
+        return state
+
+    async def _create(self) -> str:
+        thread = await self._manager.agents_client.threads.create()
+        self.created += 1
+        return thread.id
+
+    async def _refill(self, state: _LoopThreads) -> None:
+        try:
+            while len(state.spare) < self._size:
+                state.spare.append((await self._create(), time.monotonic()))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Searches create their thread themselves until the next refill
+            logger.warning(f"Could not pre-create a grounding thread: {e}")
+
+    def _schedule_refill(self, state: _LoopThreads) -> None:
+        if self._size > 0 and len(state.spare) < self._size and (state.refill is None or state.refill.done()):
+            state.refill = asyncio.create_task(self._refill(state))
+
+    async def acquire(self) -> str:
+        """Return the id of a fresh agent thread for one search."""
+        state = self._state()
+        thread_id = None
+        while state.spare:
+            candidate, created_at = state.spare.popleft()
+            if time.monotonic() - created_at <= self._max_idle:
+                thread_id = candidate
+                break
+            state.doomed.append(candidate)
+        if thread_id is None:
+            thread_id = await self._create()
+            print(f"Created thread, ID: {thread_id}")
+        self._schedule_refill(state)
+        return thread_id
+
+    def release(self, thread_id: str) -> None:
+        """Hand a used thread over to the collector."""
+        self._state().doomed.append(thread_id)
+
+    async def _delete(self, thread_ids: List[str]) -> None:
+        agents_client = self._manager.agents_client
+        outcomes = await asyncio.gather(
+            *(agents_client.threads.delete(thread_id) for thread_id in thread_ids), return_exceptions=True
+        )
+        for thread_id, outcome in zip(thread_ids, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.warning(f"Could not delete grounding thread {thread_id}: {outcome}")
+            else:
+                self.deleted += 1
+
+    async def collect(self, state: Optional[_LoopThreads] = None) -> None:
+        """Delete the released threads and the spare threads idle for too long."""
+        state = state or self._state()
+        now = time.monotonic()
+        while state.spare and now - state.spare[0][1] > self._max_idle:
+            state.doomed.append(state.spare.popleft()[0])
+        while state.doomed:
+            batch = state.doomed[:self._gc_batch]
+            del state.doomed[:self._gc_batch]
+            await self._delete(batch)
+
+    async def _collect_forever(self, state: _LoopThreads) -> None:
+        while True:
+            await asyncio.sleep(self._gc_interval)
+            try:
+                await self.collect(state)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Grounding thread collection failed: {e}")
+
+    async def close(self) -> None:
+        """Stop the background tasks and delete the spare and released threads of the running loop."""
+        loop = asyncio.get_running_loop()
+        states = list(self._loops.items())
+        self._loops.clear()
+        for state_loop, state in states:
+            tasks = [task for task in (state.refill, state.collector) if task is not None]
+            for task in tasks:
+                task.cancel()
+            if state_loop is not loop:
+                continue
+            await asyncio.gather(*tasks, return_exceptions=True)
+            state.doomed.extend(thread_id for thread_id, _ in state.spare)
+            state.spare.clear()
+            try:
+                await self.collect(state)
+            except Exception as e:
+                logger.warning(f"Could not delete the grounding threads on shutdown: {e}")
+
+
+# Create a singleton instance of the thread pool shared by all grounded searches
+grounding_thread_pool = GroundingThreadPool()
+
+
+async def close_grounding_clients() -> None:
+    """Delete the pooled agent threads and close the grounded search clients, e.g. on application shutdown."""
+    await grounding_thread_pool.close()
+    await grounding_client_manager.close()
@@ -0,0 +1,52 @@
+"""
+Process pool for the CPU-heavy HTML parsing of the web tools.
+
+Converting a large page to markdown takes hundreds of milliseconds of pure CPU, so
+the conversion runs in a `ProcessPool` of its own. Small pages are converted in a
+thread, where the IPC would cost more than the parse.
+"""
+
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from agents.tools.html_to_markdown import html_to_markdown
+from agents.tools.process_pool import ProcessPool
+
+load_dotenv()
+
+# Number of worker processes (0 runs the conversions in a thread of the app process)
+HTML_PARSE_WORKERS = int(os.environ.get("HTML_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Maximum number of conversions submitted to the pool at the same time
+HTML_PARSE_MAX_PENDING = int(os.environ.get("HTML_PARSE_MAX_PENDING", str(max(1, HTML_PARSE_WORKERS) * 4)))
+# Pages smaller than this are converted in a thread, the IPC would cost more than the parse
+HTML_PARSE_INLINE_BYTES = int(os.environ.get("HTML_PARSE_INLINE_BYTES", "20000"))
+
+
+def _warm_up() -> int:
+    """Run in each worker at start-up; importing this module already loaded the parser."""
+    return os.getpid()
+
+
+# Create a singleton instance of the pool shared by all tools
+html_parse_pool = ProcessPool(
+    workers=HTML_PARSE_WORKERS,
+    max_pending=HTML_PARSE_MAX_PENDING,
+    inline_bytes=HTML_PARSE_INLINE_BYTES,
+    name="HTML parsing",
+    warm_up=_warm_up,
+)
+
+
+async def html_to_markdown_async(
+    html: str,
+    base_url: str = "",
+    include_images: bool = True,
+    clean_image_urls: bool = False,
+    max_length: Optional[int] = None,
+) -> str:
+    """Convert a fetched page to markdown in the parsing pool; see `html_to_markdown`."""
+    return await html_parse_pool.run(
+        html_to_markdown, html, base_url, include_images, clean_image_urls, max_length, size=len(html)
+    )
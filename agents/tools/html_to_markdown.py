@@ -0,0 +1,427 @@
+"""
+HTML to markdown conversion shared by the web tools.
+
+The original path parses a page with BeautifulSoup's pure-Python parser, rewrites the
+links, serializes the tree back to HTML and parses it a second time in html2text.
+The fast engine parses once with lxml (libxml2), drops scripts, navigation and hidden
+elements, picks the main content block by text density, drops the ads, share bars
+and other chrome left inside it, and renders markdown directly from the tree,
+resolving links and images on the way.
+
+The engine is selected with HTML_MARKDOWN_ENGINE ('fast' or 'legacy'); the legacy
+engine is also used when lxml is not installed. Both can be compared with:
+
+    python -m agents.tools.benchmark_html_to_markdown <directory of saved pages>
+"""
+
+import logging
+import os
+import re
+from typing import Optional
+from urllib.parse import urljoin, urlparse
+
+from dotenv import load_dotenv
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # pragma: no cover - optional dependency
+    etree = None
+    lxml_html = None
+
+load_dotenv()
+
+logger = logging.getLogger("html_to_markdown")
+
+HTML_MARKDOWN_ENGINE = os.environ.get("HTML_MARKDOWN_ENGINE", "fast").lower()
+
+# Elements that never carry lesson-relevant content
+DROP_TAGS = {
+    "script", "style", "noscript", "template", "iframe", "object", "embed", "svg", "canvas",
+    "form", "button", "input", "select", "textarea", "nav", "footer", "aside", "head",
+}
+
+# class/id tokens of navigation, ads and other page chrome
+BOILERPLATE_TOKENS = {
+    "nav", "navbar", "menu", "footer", "foot", "sidebar", "side", "aside", "advert", "advertisement",
+    "ad", "ads", "banner", "breadcrumb", "breadcrumbs", "comment", "comments", "share", "sharing", "social",
+    "related", "recommend", "login", "register", "copyright", "popup", "modal", "cookie", "toolbar",
+    "pagination", "pager", "topbar", "qrcode", "download",
+}
+TOKEN_SPLIT_PATTERN = re.compile(r"[\s_\-]+")
+# A chrome-named element is only dropped when it is mostly links or holds little of the
+# page's text: layout wrappers such as <div class="page with-sidebar"> hold the article
+BOILERPLATE_LINK_DENSITY = 0.5
+BOILERPLATE_MAX_TEXT_SHARE = 0.2
+
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "header", "figure", "figcaption", "dl", "dt", "dd",
+    "address", "center", "details", "summary", "body", "html",
+}
+CANDIDATE_TAGS = {"div", "section", "article", "main", "td", "body"}
+PARAGRAPH_TAGS = {"p", "pre", "td", "li", "blockquote", "dd"}
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+# Sentence punctuation, Chinese and Western, used as a signal of running prose
+PUNCTUATION_PATTERN = re.compile(r"[，。；、！？,.;!?]")
+
+
+def clean_image_url(url: str) -> str:
+    """Remove query parameters from image URLs."""
+    parsed = urlparse(url)
+    return parsed.scheme + "://" + parsed.netloc + parsed.path
+
+
+def _text_length(element) -> int:
+    return len(WHITESPACE_PATTERN.sub("", element.text_content()))
+
+
+def _link_density(element) -> float:
+    text_length = len(element.text_content()) or 1
+    link_length = sum(len(link.text_content()) for link in element.iter("a"))
+    return min(1.0, link_length / text_length)
+
+
+def _has_chrome_name(element) -> bool:
+    attributes = f"{element.get('class', '')} {element.get('id', '')}".lower()
+    # Compound names count as a whole too: top-bar, side_bar
+    names = attributes.split() + [TOKEN_SPLIT_PATTERN.sub("", name) for name in attributes.split()]
+    tokens = TOKEN_SPLIT_PATTERN.split(attributes) + names
+    return any(token in BOILERPLATE_TOKENS for token in tokens)
+
+
+def _drop(doomed: list) -> None:
+    for element in doomed:
+        if element.getparent() is not None:
+            element.drop_tree()
+
+
+def _strip_hidden(root) -> None:
+    """Drop scripts, forms, navigation and hidden elements from the tree, keeping their tail text."""
+    doomed = []
+    for element in root.iter():
+        if not isinstance(element.tag, str):
+            # Comments and processing instructions
+            doomed.append(element)
+            continue
+        tag = element.tag.lower()
+        if tag in DROP_TAGS:
+            doomed.append(element)
+        elif tag not in ("html", "body", "article", "main") and (
+            element.get("hidden") is not None
+            or "display:none" in element.get("style", "").replace(" ", "")
+        ):
+            doomed.append(element)
+    _drop(doomed)
+
+
+def _strip_chrome(content, body_length: int) -> None:
+    """
+    Drop the page chrome left inside the content block: share bars, related links,
+    comment counters and the like, named by their class or id.
+
+    The content block and its ancestors are never dropped, and neither is an element
+    holding an article or a large share of the page's text without being mostly links.
+    """
+    kept = set(content.iterancestors())
+    kept.add(content)
+    doomed = []
+    for element in content.iter():
+        if not isinstance(element.tag, str) or element in kept:
+            continue
+        if element.tag.lower() in ("article", "main"):
+            continue
+        if element.get("role") in ("navigation", "banner", "contentinfo", "complementary"):
+            doomed.append(element)
+        elif _has_chrome_name(element) and (
+            _link_density(element) > BOILERPLATE_LINK_DENSITY
+            or _text_length(element) < body_length * BOILERPLATE_MAX_TEXT_SHARE
+        ):
+            if element.find(".//article") is None and element.find(".//main") is None:
+                doomed.append(element)
+    _drop(doomed)
+
+
+def _body(root):
+    body = root.find(".//body")
+    return root if body is None else body
+
+
+def _main_content(root):
+    """
+    Pick the element holding the main content of the page.
+
+    `<article>`/`<main>` are trusted when they hold most of the text; otherwise
+    paragraphs score their parent and grandparent by length and punctuation
+    (a readability-style heuristic), discounted by the share of link text.
+    """
+    body = _body(root)
+    body_length = _text_length(body)
+    if body_length == 0:
+        return body
+
+    for xpath in (".//article", ".//main", ".//*[@role='main']"):
+        found = root.xpath(xpath)
+        if found:
+            best = max(found, key=lambda element: len(element.text_content()))
+            if _text_length(best) >= body_length * 0.3:
+                return best
+
+    scores = {}
+    for paragraph in body.iter(*PARAGRAPH_TAGS):
+        text = WHITESPACE_PATTERN.sub("", paragraph.text_content())
+        if len(text) < 20:
+            continue
+        score = 1 + len(PUNCTUATION_PATTERN.findall(text)) + min(len(text) / 100, 3)
+        parent = paragraph.getparent()
+        for weight, ancestor in ((1.0, parent), (0.5, parent.getparent() if parent is not None else None)):
+            if ancestor is not None and ancestor.tag in CANDIDATE_TAGS:
+                scores[ancestor] = scores.get(ancestor, 0.0) + score * weight
+
+    if not scores:
+        return body
+
+    best = max(scores, key=lambda element: scores[element] * (1 - _link_density(element)))
+    # Paragraphs of a long article are often split over sibling blocks: climb while the
+    # parent adds little besides them
+    while best is not body and best.getparent() is not None:
+        parent = best.getparent()
+        if len(parent.text_content()) > len(best.text_content()) * 1.5:
+            break
+        best = parent
+    return best
+
+
+class _MarkdownRenderer:
+    """Render an lxml element tree to markdown in a single walk."""
+
+    def __init__(self, base_url: str, include_images: bool, clean_image_urls: bool):
+        self._base_url = base_url
+        self._include_images = include_images
+        self._clean_image_urls = clean_image_urls
+
+    def _url(self, url: str) -> str:
+        url = url.strip()
+        return urljoin(self._base_url, url) if self._base_url else url
+
+    def _children(self, element) -> str:
+        parts = [WHITESPACE_PATTERN.sub(" ", element.text)] if element.text else []
+        for child in element:
+            parts.append(self.render(child))
+            if child.tail:
+                parts.append(WHITESPACE_PATTERN.sub(" ", child.tail))
+        return "".join(parts)
+
+    def _list(self, element, ordered: bool) -> str:
+        lines = []
+        index = 1
+        for item in element:
+            if not isinstance(item.tag, str):
+                continue
+            content = self._children(item) if item.tag == "li" else self.render(item)
+            content = re.sub(r"\n{2,}", "\n", content.strip())
+            if not content:
+                continue
+            marker = f"{index}. " if ordered else "- "
+            indent = " " * len(marker)
+            lines.append(marker + content.replace("\n", "\n" + indent))
+            index += 1
+        return "\n\n" + "\n".join(lines) + "\n\n" if lines else ""
+
+    def _table(self, element) -> str:
+        rows = []
+        for row in element.xpath("./tr|./thead/tr|./tbody/tr|./tfoot/tr"):
+            cells = [
+                WHITESPACE_PATTERN.sub(" ", self._children(cell)).strip().replace("|", "\\|")
+                for cell in row.xpath("./th|./td")
+            ]
+            if any(cells):
+                rows.append(cells)
+        if not rows:
+            return ""
+        width = max(len(cells) for cells in rows)
+        if width == 1:
+            # Layout table: keep its content as paragraphs
+            return "\n\n" + "\n\n".join(cells[0] for cells in rows) + "\n\n"
+        rows = [cells + [""] * (width - len(cells)) for cells in rows]
+        lines = ["| " + " | ".join(rows[0]) + " |", "|" + " --- |" * width]
+        lines.extend("| " + " | ".join(cells) + " |" for cells in rows[1:])
+        return "\n\n" + "\n".join(lines) + "\n\n"
+
+    def render(self, element) -> str:
+        tag = element.tag.lower() if isinstance(element.tag, str) else None
+        if tag is None or tag in DROP_TAGS:
+            return ""
+
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            text = WHITESPACE_PATTERN.sub(" ", self._children(element)).strip()
+            return f"\n\n{'#' * int(tag[1])} {text}\n\n" if text else ""
+        if tag == "br":
+            return "\n"
+        if tag == "hr":
+            return "\n\n---\n\n"
+        if tag == "a":
+            text = self._children(element).strip()
+            href = element.get("href", "")
+            if not text:
+                return ""
+            if not href or href.startswith(("#", "javascript:", "mailto:")):
+                return text
+            return f"[{text}]({self._url(href)})"
+        if tag == "img":
+            if not self._include_images:
+                return ""
+            # Lazy-loaded images keep the real URL in a data attribute
+            src = element.get("data-src") or element.get("data-original") or element.get("src", "")
+            if not src or src.startswith("data:"):
+                return ""
+            src = self._url(src)
+            if self._clean_image_urls:
+                src = clean_image_url(src)
+            alt = WHITESPACE_PATTERN.sub(" ", element.get("alt", "")).strip()
+            return f"![{alt}]({src})"
+        if tag in ("strong", "b"):
+            text = self._children(element)
+            return f"**{text.strip()}**" if text.strip() else text
+        if tag in ("em", "i"):
+            text = self._children(element)
+            return f"*{text.strip()}*" if text.strip() else text
+        if tag == "code":
+            text = element.text_content()
+            return f"`{text.strip()}`" if text.strip() else ""
+        if tag == "pre":
+            return "\n\n```\n" + element.text_content().strip("\n") + "\n```\n\n"
+        if tag in ("ul", "ol"):
+            return self._list(element, ordered=tag == "ol")
+        if tag == "li":
+            return "\n- " + self._children(element).strip() + "\n"
+        if tag == "blockquote":
+            content = self._children(element).strip()
+            return "\n\n" + "\n".join(f"> {line}" for line in content.splitlines()) + "\n\n" if content else ""
+        if tag == "table":
+            return self._table(element)
+        if tag in BLOCK_TAGS:
+            content = self._children(element).strip()
+            return f"\n\n{content}\n\n" if content else ""
+        return self._children(element)
+
+
+def _tidy(markdown: str) -> str:
+    markdown = re.sub(r"[ \t]+\n", "\n", markdown)
+    markdown = re.sub(r"\n\n[ \t]+", "\n\n", markdown)
+    markdown = re.sub(r"\n{3,}", "\n\n", markdown)
+    return markdown.strip()
+
+
+def fast_html_to_markdown(
+    html: str,
+    base_url: str = "",
+    include_images: bool = True,
+    clean_image_urls: bool = False,
+    main_content: bool = True,
+) -> str:
+    """
+    Convert HTML to markdown with lxml, keeping only the main content of the page.
+
+    Args:
+        html: The HTML document
+        base_url: URL the page was fetched from, used to resolve relative links
+        include_images: Whether to include image references in the markdown
+        clean_image_urls: Whether to remove query parameters from image URLs
+        main_content: Whether to keep only the main content block instead of the whole body
+
+    Returns:
+        The markdown
+    """
+    if not html or not html.strip():
+        return ""
+    # Parse bytes so that pages declaring an encoding in an XML prolog are accepted
+    parser = lxml_html.HTMLParser(encoding="utf-8", remove_comments=True)
+    try:
+        root = lxml_html.document_fromstring(html.encode("utf-8", errors="replace"), parser=parser)
+    except (etree.ParserError, ValueError):
+        return ""
+
+    _strip_hidden(root)
+    content = _main_content(root) if main_content else _body(root)
+    _strip_chrome(content, _text_length(_body(root)))
+    return _tidy(_MarkdownRenderer(base_url, include_images, clean_image_urls).render(content))
+
+
+def legacy_html_to_markdown(
+    html: str,
+    base_url: str = "",
+    include_images: bool = True,
+    clean_image_urls: bool = False,
+) -> str:
+    """Convert HTML to markdown with BeautifulSoup and html2text, keeping the whole page."""
+    import html2text
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+
+    # Remove script and style elements
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    # Convert relative URLs to absolute
+    for tag in soup.find_all(["a", "img"]):
+        if tag.get("href"):
+            tag["href"] = urljoin(base_url, tag["href"])
+        if tag.get("src"):
+            tag["src"] = urljoin(base_url, tag["src"])
+            if clean_image_urls and tag.name == "img":
+                tag["src"] = clean_image_url(tag["src"])
+
+    h2t = html2text.HTML2Text()
+    h2t.body_width = 0  # No line wrapping
+    h2t.ignore_images = not include_images
+    h2t.ignore_emphasis = False
+    h2t.ignore_links = False
+    h2t.ignore_tables = False
+
+    return h2t.handle(str(soup)).strip()
+
+
+def active_engine() -> str:
+    """Return the engine used by `html_to_markdown`: 'fast' or 'legacy'."""
+    if HTML_MARKDOWN_ENGINE == "legacy":
+        return "legacy"
+    if lxml_html is None:
+        return "legacy"
+    return "fast"
+
+
+if HTML_MARKDOWN_ENGINE != "legacy" and lxml_html is None:
+    logger.warning("lxml is not installed; falling back to the legacy HTML to markdown engine")
+
+
+def html_to_markdown(
+    html: str,
+    base_url: str = "",
+    include_images: bool = True,
+    clean_image_urls: bool = False,
+    max_length: Optional[int] = None,
+) -> str:
+    """
+    Convert a fetched page to markdown with the configured engine.
+
+    Args:
+        html: The HTML document
+        base_url: URL the page was fetched from, used to resolve relative links
+        include_images: Whether to include image references in the markdown
+        clean_image_urls: Whether to remove query parameters from image URLs
+        max_length: Maximum length of the output markdown (if None, no limit)
+
+    Returns:
+        The markdown
+    """
+    if active_engine() == "fast":
+        markdown = fast_html_to_markdown(html, base_url, include_images, clean_image_urls)
+    else:
+        markdown = legacy_html_to_markdown(html, base_url, include_images, clean_image_urls)
+
+    if max_length and len(markdown) > max_length:
+        markdown = markdown[:max_length] + "\n...(truncated)"
+    return markdown
+
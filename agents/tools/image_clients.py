@@ -0,0 +1,126 @@
+"""
+Long-lived async clients of the image tools.
+
+`generate_image` used to build a new Azure OpenAI client on every call and upload
+the result with a synchronous blob client, created per call as well, which blocked
+the event loop for the whole upload. The manager keeps one async image client and
+one async blob container client per event loop, reusing their connections across
+calls, and closes them on shutdown.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+
+from azure.storage.blob import ContentSettings
+from azure.storage.blob.aio import BlobServiceClient, ContainerClient
+from dotenv import load_dotenv
+from openai import AsyncAzureOpenAI
+
+load_dotenv()
+
+logger = logging.getLogger("image_clients")
+
+STORAGE_ACCOUNT_NAME = os.getenv("STORAGE_ACCOUNT_NAME")
+STORAGE_ACCOUNT_KEY = os.getenv("STORAGE_ACCOUNT_KEY")
+CONTAINER_NAME = "$web"
+
+# Get the full URL for the blob storage website
+WEBSITE_URL = f"https://{STORAGE_ACCOUNT_NAME}.blob.core.windows.net"
+
+
+class ImageClientManager:
+    """
+    Per event loop async image generation and blob storage clients.
+
+    Async clients are bound to the loop that created them, so the chainlit app and
+    each `asyncio.run` of the bulk runner get their own pair.
+    """
+
+    def __init__(self):
+        self._image_clients: Dict[asyncio.AbstractEventLoop, AsyncAzureOpenAI] = {}
+        self._blob_clients: Dict[asyncio.AbstractEventLoop, Tuple[BlobServiceClient, ContainerClient]] = {}
+
+    def _drop_stale(self) -> None:
+        # Forget the clients of loops that have been closed, e.g. by asyncio.run
+        for clients in (self._image_clients, self._blob_clients):
+            for stale_loop in [loop for loop in clients if loop.is_closed()]:
+                clients.pop(stale_loop, None)
+
+    def get_image_client(self) -> AsyncAzureOpenAI:
+        """Return the image generation client of the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        client = self._image_clients.get(loop)
+        if client is None:
+            self._drop_stale()
+            client = AsyncAzureOpenAI(
+                azure_endpoint=os.getenv("AZURE_OPENAI_IMAGE_ENDPOINT"),
+                api_version=os.getenv("AZUER_OPENAI_IMAGE_VERSION"),
+                azure_deployment=os.getenv("AZURE_OPENAI_IMAGE_DEPLOYMENT"),
+                api_key=os.getenv("AZURE_OPENAI_IMAGE_KEY"),
+            )
+            self._image_clients[loop] = client
+        return client
+
+    def get_container_client(self) -> ContainerClient:
+        """Return the blob container client of the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        clients = self._blob_clients.get(loop)
+        if clients is None:
+            self._drop_stale()
+            service = BlobServiceClient(account_url=WEBSITE_URL, credential=STORAGE_ACCOUNT_KEY)
+            clients = (service, service.get_container_client(CONTAINER_NAME))
+            self._blob_clients[loop] = clients
+        return clients[1]
+
+    async def upload(self, name: str, data: bytes, content_type: str = "image/png", **settings: Any) -> str:
+        """
+        Upload a blob to the static website container.
+
+        Args:
+            name: Name of the blob, e.g. images/xxx.png
+            data: The blob content
+            content_type: MIME type served with the blob
+            settings: Other `ContentSettings` fields, e.g. cache_control
+
+        Returns:
+            The public URL of the blob
+        """
+        await self.get_container_client().upload_blob(
+            name=name,
+            data=data,
+            overwrite=True,
+            content_settings=ContentSettings(content_type=content_type, **settings),
+        )
+        return f"{WEBSITE_URL}/{CONTAINER_NAME}/{name}"
+
+    async def close(self) -> None:
+        """Close the clients of the process."""
+        image_clients = list(self._image_clients.items())
+        blob_clients = list(self._blob_clients.items())
+        self._image_clients.clear()
+        self._blob_clients.clear()
+        current_loop = asyncio.get_running_loop()
+        closers: List[Tuple[asyncio.AbstractEventLoop, Any]] = [
+            (loop, client.close()) for loop, client in image_clients
+        ] + [(loop, service.close()) for loop, (service, _) in blob_clients]
+        for loop, closer in closers:
+            if loop is current_loop:
+                try:
+                    await closer
+                except Exception as e:
+                    logger.warning(f"Error closing an image client: {e}")
+            elif not loop.is_closed() and loop.is_running():
+                asyncio.run_coroutine_threadsafe(closer, loop)
+            else:
+                closer.close()
+
+
+# Create a singleton instance of the manager shared by the image tools
+image_client_manager = ImageClientManager()
+
+
+async def close_image_clients() -> None:
+    """Close the image generation and blob storage clients, e.g. on application shutdown."""
+    await image_client_manager.close()
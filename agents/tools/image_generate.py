@@ -1,60 +1,122 @@
-from mimetypes import guess_type
+import asyncio
 import os
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
-import requests
 import base64
-from openai import AzureOpenAI
-import base64
-from dotenv import load_dotenv
+import hashlib
+import time
+import uuid
+from datetime import datetime
+
+import chainlit as cl
+from autogen_core import Image
+from autogen_core.models import UserMessage
 from autogen_core.tools import FunctionTool
 
-from config import (
-    get_advance_model_client,
-    get_low_model_client,
-    get_model_client,
-    get_moderate_model_client,
+from agents.tools.image_clients import image_client_manager
+from agents.tools.image_generation_cache import image_generation_cache
+from agents.tools.image_processing import (
+    IMAGE_CACHE_CONTROL,
+    downscale_for_review_async,
+    output_signature,
+    process_image_async,
 )
+from config import get_advance_model_client, get_low_model_client, get_moderate_model_client
+from httpClientPool import http_client_manager
+from teamRun import timed_tool
+
 
 load_dotenv()
 
-model_client = get_moderate_model_client()
+IMAGE_GENERATION_MODEL = "gpt-image-1"
+# Size and quality of the generated images (gpt-image-1 accepts auto for both)
+IMAGE_GENERATION_SIZE = os.getenv("IMAGE_GENERATION_SIZE", "auto")
+IMAGE_GENERATION_QUALITY = os.getenv("IMAGE_GENERATION_QUALITY", "auto")
+# Maximum number of images generated and uploaded at the same time by generate_images
+IMAGE_GENERATION_CONCURRENCY = int(os.getenv("IMAGE_GENERATION_CONCURRENCY", "3"))
 
-imageAzureOpenAI = AzureOpenAI( 
-    azure_endpoint=os.getenv("AZURE_OPENAI_IMAGE_ENDPOINT"),
-    api_version=os.getenv("AZUER_OPENAI_IMAGE_VERSION"),
-    azure_deployment=os.getenv("AZURE_OPENAI_IMAGE_DEPLOYMENT"),
-    api_key=os.getenv("AZURE_OPENAI_IMAGE_KEY"))
 
+async def upload_image_variants(image_bytes: bytes, name: str) -> Dict[str, Optional[str]]:
+    """
+    Transcode a generated image and upload its full-size and thumbnail variants.
 
-from mimetypes import guess_type
-import os
-from dotenv import load_dotenv
-import requests
-import base64
-from openai import AzureOpenAI,AsyncAzureOpenAI
-import base64
-import uuid
-from datetime import datetime
-from azure.storage.blob import BlobServiceClient, ContentSettings
+    Args:
+        image_bytes: The generated PNG
+        name: Base name of the blobs, without directory or extension
 
-from dotenv import load_dotenv
-import chainlit as cl
+    Returns:
+        The 'url' of the full-size image and the 'thumbnail_url' (None without thumbnail)
+    """
+    variants = await process_image_async(image_bytes)
+    urls = await asyncio.gather(*(
+        upload_image_to_blob_storage(
+            variant["data"],
+            f"images/{name}{'_thumb' if variant['variant'] == 'thumbnail' else ''}{variant['extension']}",
+            content_type=variant["content_type"],
+        )
+        for variant in variants
+    ))
+    image = {"url": None, "thumbnail_url": None}
+    for variant, url in zip(variants, urls):
+        image["thumbnail_url" if variant["variant"] == "thumbnail" else "url"] = url
+    return image
 
 
-load_dotenv()
+async def _generate_and_upload(prompt: str, size: str, quality: str) -> Dict:
+    start = time.perf_counter()
+    result = await image_client_manager.get_image_client().images.generate(
+        model=IMAGE_GENERATION_MODEL,
+        prompt=prompt,
+        size=size,
+        quality=quality
+    )
+    generation_seconds = time.perf_counter() - start
+
+    # Get the image data
+    image_bytes = base64.b64decode(result.data[0].b64_json)
+    sha256 = hashlib.sha256(image_bytes).hexdigest()
+
+    # Upload to Azure Blob Storage, unless the very same image is already there
+    image = await image_generation_cache.image_for_hash(sha256, output_signature())
+    if image is None:
+        image = await upload_image_variants(image_bytes, sha256[:32])
+        print(f"*********Image generated and uploaded to: {image['url']}")
+    return {**image, "sha256": sha256, "generation_seconds": generation_seconds}
+
+
+async def generate_and_upload_image(
+    prompt: str, size: str = IMAGE_GENERATION_SIZE, quality: str = IMAGE_GENERATION_QUALITY
+) -> Dict:
+    """
+    Generate an image with the pooled Azure OpenAI client and upload it to Blob Storage.
 
-# Setup Azure Blob Storage client
-STORAGE_ACCOUNT_NAME = os.getenv("STORAGE_ACCOUNT_NAME")
-STORAGE_ACCOUNT_KEY = os.getenv("STORAGE_ACCOUNT_KEY")
-CONTAINER_NAME = "$web"
+    The image of a prompt already generated with the same options is reused from the
+    image cache instead.
 
-# Get the full URL for the blob storage website
-BLOB_SERVICE_URL = f"https://{STORAGE_ACCOUNT_NAME}.blob.core.windows.net"
-WEBSITE_URL = f"https://{STORAGE_ACCOUNT_NAME}.blob.core.windows.net"
+    Args:
+        prompt: The text prompt for image generation
+        size: Size of the image
+        quality: Quality of the image
+
+    Returns:
+        The 'url' of the optimized image and the 'thumbnail_url' of its thumbnail
+
+    Raises:
+        Exception: If the generation or the upload fails
+    """
+    return await image_generation_cache.get_or_generate(
+        prompt,
+        IMAGE_GENERATION_MODEL,
+        size,
+        quality,
+        lambda: _generate_and_upload(prompt, size, quality),
+        output=output_signature(),
+    )
 
 
 # 定义生成图像的工具函数
 @cl.step(type="tool", name="generate_image")
+@timed_tool("generate_image")
 async def generate_image(prompt: str) -> str:
     """
     Generate an image using Azure OpenAI and upload it to Blob Storage
@@ -65,31 +127,8 @@ async def generate_image(prompt: str) -> str:
     Returns:
         The URL of the uploaded image
     """
-    imageAzureOpenAI = AsyncAzureOpenAI( 
-        azure_endpoint=os.getenv("AZURE_OPENAI_IMAGE_ENDPOINT"),
-        api_version=os.getenv("AZUER_OPENAI_IMAGE_VERSION"),
-        azure_deployment=os.getenv("AZURE_OPENAI_IMAGE_DEPLOYMENT"),
-        api_key=os.getenv("AZURE_OPENAI_IMAGE_KEY")
-    )
-
     try:
-        # Generate the image
-        result = await imageAzureOpenAI.images.generate(
-            model="gpt-image-1",
-            prompt=prompt
-        )
-        
-        # Get the image data
-        image_base64 = result.data[0].b64_json
-        image_bytes = base64.b64decode(image_base64)
-        
-        # Upload to Azure Blob Storage
-        image_url = upload_image_to_blob_storage(image_bytes)
-
-        print(f"*********Image generated and uploaded to: {image_url}")
-        
-        return image_url
-    
+        return (await generate_and_upload_image(prompt))["url"]
     except Exception as e:
         print(f"Error generating or uploading image: {str(e)}")
         return None
@@ -102,102 +141,157 @@ image_generation_tool = FunctionTool(
     )
 
 
+@cl.step(type="tool", name="generate_images")
+@timed_tool("generate_images")
+async def generate_images(prompts: List[str]) -> List[Dict[str, Optional[str]]]:
+    """
+    Generate several images concurrently and upload them to Blob Storage.
+
+    At most IMAGE_GENERATION_CONCURRENCY images are generated at the same time; a
+    failed image does not fail the others.
+
+    Args:
+        prompts: The text prompts, one per image
+
+    Returns:
+        For each prompt, in order, a dictionary with the prompt, the image URL (None on
+        failure), the URL of its thumbnail and the error if any
+    """
+    slots = asyncio.Semaphore(IMAGE_GENERATION_CONCURRENCY)
+
+    async def generate(prompt: str) -> Dict[str, Optional[str]]:
+        async with slots:
+            try:
+                image = await generate_and_upload_image(prompt)
+                return {"prompt": prompt, "url": image["url"], "thumbnail_url": image.get("thumbnail_url")}
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error generating or uploading image: {str(e)}")
+                return {"prompt": prompt, "url": None, "error": str(e)}
+
+    return list(await asyncio.gather(*(generate(prompt) for prompt in prompts)))
+
+
+image_batch_generation_tool = FunctionTool(
+        generate_images,
+        name="generate_images",
+        description="Generate several images at once, one per text prompt, using Azure OpenAI gpt-image-1 model, upload them to storage and return the image url and thumbnail url of each prompt.",
+    )
+
+
+PROMPT_IMAGE_REVIEW = "评估此图像是否符合描述：{description}。提供反馈，说明优点和改进建议。"
+
+# Model tier reviewing the images: low | moderate | advance (it must accept images)
+IMAGE_REVIEW_MODEL_TIER = os.getenv("IMAGE_REVIEW_MODEL_TIER", "moderate").lower()
+IMAGE_REVIEW_DOWNLOAD_TIMEOUT = float(os.getenv("IMAGE_REVIEW_DOWNLOAD_TIMEOUT", "20"))
+
+_review_client = None
+
+
+def _get_review_client():
+    global _review_client
+    if _review_client is None:
+        factories = {
+            "low": get_low_model_client,
+            "moderate": get_moderate_model_client,
+            "advance": get_advance_model_client,
+        }
+        _review_client = factories.get(IMAGE_REVIEW_MODEL_TIER, get_moderate_model_client)()
+    return _review_client
+
+
 # 定义获取图像并反馈的工具函数
-def get_feedback(image_url:str, description:str)->str:
-    """"
-    Get feedback on the generated image from the model.
+async def get_feedback(image_url: str, description: str) -> str:
+    """
+    Get feedback on a generated image from the vision model.
+
+    The image is downloaded through the shared HTTP pool and downscaled before it
+    is encoded, and the feedback is cached per image content and description.
+
     Args:
         image_url: URL of the generated image
         description: Description of the image for evaluation
+
     Returns:
         str: Feedback from the model
     """
-    base64_image = fetch_image_base64(image_url)
-    if not base64_image:
+    try:
+        response = await http_client_manager.get(
+            image_url, timeout=IMAGE_REVIEW_DOWNLOAD_TIMEOUT, follow_redirects=True
+        )
+        response.raise_for_status()
+    except Exception as e:
+        print(f"Error downloading image for review: {str(e)}")
         return "无法获取图像。"
 
-    # Guess the MIME type of the image based on the file extension
-    mime_type, _ = guess_type(image_url)
-    if mime_type is None:
-        mime_type = 'application/octet-stream'  # Default MIME type if none is found
-
-
-    messages = [
-        {"role": "user", "content": [
-            {"type": "image_url","image_url":{"url": f"data:{mime_type};base64,{base64_image}"}},
-            {"type": "text", "text": f"评估此图像是否符合描述：{description}。提供反馈，说明优点和改进建议。"}
-        ]}
-    ]
+    sha256 = hashlib.sha256(response.content).hexdigest()
+    feedback = await image_generation_cache.get_review(sha256, description, IMAGE_REVIEW_MODEL_TIER)
+    if feedback is not None:
+        return feedback
 
     try:
-        response = model_client.chat.completions.create(
-            model=os.environ.get("AZURE_OPENAI_MODERATED_DEPLOYMENT_NAME"),
-            messages=messages
-        )
-        feedback = response.choices[0].message.content
-        return feedback
+        image_bytes, _ = await downscale_for_review_async(response.content)
+        result = await _get_review_client().create([
+            UserMessage(
+                content=[
+                    PROMPT_IMAGE_REVIEW.format(description=description),
+                    Image.from_base64(base64.b64encode(image_bytes).decode("utf-8")),
+                ],
+                source="user",
+            )
+        ])
+        feedback = result.content if isinstance(result.content, str) else str(result.content)
     except Exception as e:
         return f"获取反馈错误：{str(e)}"
 
-def upload_image_to_blob_storage(image_bytes, file_name=None):
+    await image_generation_cache.set_review(feedback, sha256, description, IMAGE_REVIEW_MODEL_TIER)
+    return feedback
+
+
+@cl.step(type="tool", name="review_image")
+@timed_tool("review_image")
+async def review_image(image_url: str, description: str) -> str:
+    """
+    Review a generated image against the description it should match.
+
+    Args:
+        image_url: URL of the generated image
+        description: What the image should show
+
+    Returns:
+        The strengths of the image and suggestions to improve it
+    """
+    return await get_feedback(image_url, description)
+
+
+image_review_tool = FunctionTool(
+        review_image,
+        name="review_image",
+        description="Check whether a generated image matches its description and get feedback with strengths and improvement suggestions.",
+    )
+
+async def upload_image_to_blob_storage(image_bytes, file_name=None, content_type="image/png"):
     """
     Upload an image to Azure Blob Storage with static website hosting and return the URL
     
     Args:
         image_bytes: The image binary data
         file_name: Optional file name, if not provided a UUID will be generated
+        content_type: MIME type of the image
         
     Returns:
         The URL to access the uploaded image
     """
-    try:
-        # Create a unique filename if one is not provided
-        if not file_name:
-            # Create a timestamp-based unique filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_id = str(uuid.uuid4())[:8]
-            file_name = f"images/{timestamp}_{unique_id}.png"
-        
-        # Initialize the BlobServiceClient
-        blob_service_client = BlobServiceClient(
-            account_url=f"https://{STORAGE_ACCOUNT_NAME}.blob.core.windows.net", 
-            credential=STORAGE_ACCOUNT_KEY
-        )
-        
-        # Get container client
-        container_client = blob_service_client.get_container_client(CONTAINER_NAME)
-        
-        # Set content settings for image
-        content_settings = ContentSettings(content_type='image/png')
-        
-        # Upload the image
-        blob_client = container_client.upload_blob(
-            name=file_name,
-            data=image_bytes,
-            overwrite=True,
-            content_settings=content_settings
-        )
-        
-        # Return the public URL for the image
-        # Using the website URL for static website hosting
-        return f"{WEBSITE_URL}/{CONTAINER_NAME}/{file_name}"
-    
-    except Exception as e:
-        print(f"Error uploading image to Azure Blob Storage: {str(e)}")
-        return None
+    # Create a unique filename if one is not provided
+    if not file_name:
+        # Create a timestamp-based unique filename
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        unique_id = str(uuid.uuid4())[:8]
+        file_name = f"images/{timestamp}_{unique_id}.png"
 
-def fetch_image_base64(url:str)->str:
-    """
-    Fetch an image from a URL and convert it to base64 format.
-    Args:
-        url: URL of the image to fetch
-    Returns:
-        str: Base64 encoded string of the image
-    """
-    response = requests.get(url)
-    if response.status_code == 200:
-        image_data = response.content
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        return base64_image
-    else:
-        return None
\ No newline at end of file
+    # Upload through the pooled async container client, using the website URL
+    # for static website hosting
+    return await image_client_manager.upload(
+        file_name, image_bytes, content_type=content_type, cache_control=IMAGE_CACHE_CONTROL
+    )
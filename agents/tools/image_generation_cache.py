@@ -0,0 +1,206 @@
+"""
+Persistent cache of generated images.
+
+A gpt-image-1 call takes tens of seconds, and image_creator keeps asking for the same
+illustrations (李白望月, 春夜细雨) across lessons. Generated images are therefore
+indexed under their normalized prompt plus the generation options, and a repeated
+request returns the blob URL of the first image. The index also maps the SHA-256 of
+every generated image to its uploaded URLs, so identical images are stored only once,
+and keeps the vision model's feedback on an image per content hash.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from sharedState import ResultCache, SqliteStateBackend
+
+load_dotenv()
+
+logger = logging.getLogger("image_generation_cache")
+
+IMAGE_CACHE_PATH = os.environ.get("IMAGE_CACHE_PATH", ".cache/image_generation.sqlite")
+# Images stay in the blob container, so entries are kept for a long time (0 disables the cache)
+IMAGE_CACHE_TTL = float(os.environ.get("IMAGE_CACHE_TTL", str(90 * 24 * 3600)))
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+TRAILING_PUNCTUATION = "。.!！?？;；,，、 "
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt so that trivially different wordings share a cache entry.
+
+    Full-width characters are folded (NFKC), case and whitespace runs are ignored,
+    and trailing punctuation is dropped.
+    """
+    prompt = unicodedata.normalize("NFKC", prompt).lower()
+    return WHITESPACE_PATTERN.sub(" ", prompt).strip().rstrip(TRAILING_PUNCTUATION)
+
+
+class ImageGenerationCache:
+    """
+    Index of generated images keyed on the normalized prompt, the model, size and
+    quality, and the post-processing settings of the uploaded variants.
+
+    Concurrent requests for the same key, e.g. twice the same prompt in one
+    `generate_images` batch, share a single generation. If the caller generating
+    the image is cancelled, one of the waiting callers takes the generation over.
+    """
+
+    def __init__(self, path: str = IMAGE_CACHE_PATH, ttl: float = IMAGE_CACHE_TTL):
+        self._path = path
+        self._ttl = ttl
+        self._store: Optional[ResultCache] = None
+        self._pending: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.duplicate_images = 0
+        self.saved_seconds = 0.0
+        self.review_hits = 0
+
+    @property
+    def store(self) -> ResultCache:
+        """Return the on-disk index, opening the sqlite file on first use."""
+        if self._store is None:
+            self._store = ResultCache("image_generation", backend=SqliteStateBackend(self._path))
+        return self._store
+
+    async def _read(self, *parts: Any) -> Optional[Dict[str, Any]]:
+        try:
+            return await self.store.get(*parts)
+        except Exception as e:
+            logger.warning(f"Image cache read failed: {e}")
+            return None
+
+    async def _write(self, value: Dict[str, Any], *parts: Any) -> None:
+        try:
+            await self.store.set(value, *parts, ttl=self._ttl)
+        except Exception as e:
+            logger.warning(f"Image cache write failed: {e}")
+
+    async def image_for_hash(self, sha256: str, output: str = "") -> Optional[Dict[str, Any]]:
+        """Return the URLs of an already uploaded image with this content hash, or None."""
+        if self._ttl <= 0:
+            return None
+        entry = await self._read("sha256", sha256, output)
+        if entry is None:
+            return None
+        self.duplicate_images += 1
+        return entry
+
+    async def get_or_generate(
+        self,
+        prompt: str,
+        model: str,
+        size: str,
+        quality: str,
+        generate: Callable[[], Awaitable[Dict[str, Any]]],
+        output: str = "",
+    ) -> Dict[str, Any]:
+        """
+        Return the image of a prompt, generating it on a miss.
+
+        Args:
+            prompt: The text prompt of the image
+            model: Image model
+            size: Requested image size
+            quality: Requested image quality
+            generate: Coroutine function generating and uploading the image, returning a
+                dictionary with its 'url', its 'sha256' and the 'generation_seconds'
+            output: Post-processing settings of the uploaded image
+
+        Returns:
+            The dictionary of the image, with at least its 'url'
+        """
+        if self._ttl <= 0:
+            return await generate()
+
+        parts = ("prompt", normalize_prompt(prompt), model, size, quality, output)
+        key = (asyncio.get_running_loop(), self.store.make_key(*parts))
+        pending = self._pending.get(key)
+        while pending is not None:
+            # Unlike awaiting the future, wait() only raises if this caller itself is cancelled
+            await asyncio.wait((pending,))
+            if not pending.cancelled():
+                entry = pending.result()
+                self._record_hit(prompt, entry)
+                return entry
+            # The generating caller was cancelled: take the generation over, or follow
+            # the waiter that already did
+            pending = self._pending.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            entry = await self._read(*parts)
+            if entry is not None:
+                self._record_hit(prompt, entry)
+            else:
+                self.misses += 1
+                entry = await generate()
+                entry["prompt"] = prompt
+                entry["created_at"] = time.time()
+                await self._write(entry, *parts)
+                image = {"url": entry["url"], "thumbnail_url": entry.get("thumbnail_url")}
+                await self._write(image, "sha256", entry["sha256"], output)
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the error; nobody else needs to retrieve it
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(key, None)
+
+    async def get_review(self, sha256: str, description: str, model: str) -> Optional[str]:
+        """Return the cached feedback on an image against a description, or None."""
+        if self._ttl <= 0:
+            return None
+        entry = await self._read("review", sha256, normalize_prompt(description), model)
+        if entry is None:
+            return None
+        self.review_hits += 1
+        return entry["feedback"]
+
+    async def set_review(self, feedback: str, sha256: str, description: str, model: str) -> None:
+        """Store the feedback on an image against a description."""
+        if self._ttl > 0:
+            await self._write({"feedback": feedback}, "review", sha256, normalize_prompt(description), model)
+
+    def _record_hit(self, prompt: str, entry: Dict[str, Any]) -> None:
+        self.hits += 1
+        self.saved_seconds += entry.get("generation_seconds", 0.0)
+        logger.info(f"Image cache hit for '{prompt[:50]}': {self.metrics()}")
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return the hit rate and the generation time saved since the process started."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 1),
+            "duplicate_images": self.duplicate_images,
+            "review_hits": self.review_hits,
+        }
+
+    def summary(self) -> str:
+        """Describe the metrics in one line, e.g. at the end of a bulk run."""
+        metrics = self.metrics()
+        return (f"Image cache: {metrics['hits']} hits, {metrics['misses']} misses "
+                f"({metrics['hit_rate']:.0%} hit rate), {metrics['saved_seconds']:.0f}s of generation saved")
+
+
+# Create a singleton instance of the cache shared by the image tools
+image_generation_cache = ImageGenerationCache()
@@ -0,0 +1,184 @@
+"""
+Post-processing of generated images before they are uploaded.
+
+gpt-image-1 returns PNGs of several MB, which students on school networks then
+download inside lessons and PDFs. Each image is transcoded to WebP or JPEG at a
+configurable quality, optionally downscaled, and a thumbnail is made next to it.
+The work is CPU-bound, so it runs in a pool of worker processes; the uploads carry
+a long cache-control header since every variant is stored under a content hash.
+"""
+
+import io
+import os
+from typing import Dict, List, Tuple, Union
+
+from dotenv import load_dotenv
+
+from agents.tools.process_pool import ProcessPool
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+load_dotenv()
+
+# Format of the uploaded images: webp | jpeg | png (png uploads the original bytes)
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "webp").lower()
+IMAGE_OUTPUT_QUALITY = int(os.getenv("IMAGE_OUTPUT_QUALITY", "80"))
+# Longest side of the uploaded images in pixels (0 keeps the generated size)
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1536"))
+# Longest side of the thumbnails in pixels (0 disables the thumbnails)
+IMAGE_THUMBNAIL_DIMENSION = int(os.getenv("IMAGE_THUMBNAIL_DIMENSION", "480"))
+IMAGE_CACHE_CONTROL = os.getenv("IMAGE_CACHE_CONTROL", "public, max-age=31536000, immutable")
+# Longest side and JPEG quality of the images sent to the vision model for review
+IMAGE_REVIEW_MAX_DIMENSION = int(os.getenv("IMAGE_REVIEW_MAX_DIMENSION", "768"))
+IMAGE_REVIEW_QUALITY = int(os.getenv("IMAGE_REVIEW_QUALITY", "85"))
+# Number of worker processes (0 processes the images in a thread of the app process)
+IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", "2"))
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    "png": ("PNG", "image/png", ".png"),
+}
+
+
+def output_signature() -> str:
+    """Describe the processing settings, so that cached images made with other settings are not reused."""
+    if Image is None or IMAGE_OUTPUT_FORMAT not in FORMATS or IMAGE_OUTPUT_FORMAT == "png":
+        return "png"
+    return f"{IMAGE_OUTPUT_FORMAT}-q{IMAGE_OUTPUT_QUALITY}-{IMAGE_MAX_DIMENSION}-{IMAGE_THUMBNAIL_DIMENSION}"
+
+
+def _encode(image: "Image.Image", output_format: str, quality: int) -> bytes:
+    pil_format = FORMATS[output_format][0]
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+        # JPEG has no alpha channel: flatten on white, like the lesson pages
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.convert("RGBA").split()[-1])
+        image = background
+    buffer = io.BytesIO()
+    options = {"quality": quality, "optimize": True}
+    if pil_format == "WEBP":
+        options = {"quality": quality, "method": 4}
+    image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def process_image(
+    image_bytes: bytes,
+    output_format: str = IMAGE_OUTPUT_FORMAT,
+    quality: int = IMAGE_OUTPUT_QUALITY,
+    max_dimension: int = IMAGE_MAX_DIMENSION,
+    thumbnail_dimension: int = IMAGE_THUMBNAIL_DIMENSION,
+) -> List[Dict[str, Union[str, bytes, int]]]:
+    """
+    Make the uploaded variants of a generated image.
+
+    Args:
+        image_bytes: The generated PNG
+        output_format: 'webp', 'jpeg' or 'png'
+        quality: Encoder quality, 1-100
+        max_dimension: Longest side of the full image (0 keeps its size)
+        thumbnail_dimension: Longest side of the thumbnail (0 makes none)
+
+    Returns:
+        The variants ('full' and possibly 'thumbnail'), each with its data, content
+        type, file extension, width and height
+    """
+    if Image is None or output_format not in FORMATS or output_format == "png":
+        return [{"variant": "full", "data": image_bytes, "content_type": "image/png", "extension": ".png"}]
+
+    _, content_type, extension = FORMATS[output_format]
+    with Image.open(io.BytesIO(image_bytes)) as original:
+        original.load()
+        image = original
+        if max_dimension and max(image.size) > max_dimension:
+            image = image.copy()
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        variants = []
+        data = _encode(image, output_format, quality)
+        # Keep the original if it happens to be smaller, e.g. a flat diagram
+        if len(data) < len(image_bytes) or image is not original:
+            variants.append({"variant": "full", "data": data, "content_type": content_type,
+                             "extension": extension, "width": image.width, "height": image.height})
+        else:
+            variants.append({"variant": "full", "data": image_bytes, "content_type": "image/png",
+                             "extension": ".png", "width": image.width, "height": image.height})
+
+        if thumbnail_dimension and max(original.size) > thumbnail_dimension:
+            thumbnail = original.copy()
+            thumbnail.thumbnail((thumbnail_dimension, thumbnail_dimension), Image.LANCZOS)
+            variants.append({"variant": "thumbnail", "data": _encode(thumbnail, output_format, quality),
+                             "content_type": content_type, "extension": extension,
+                             "width": thumbnail.width, "height": thumbnail.height})
+    return variants
+
+
+def downscale_for_review(
+    image_bytes: bytes, max_dimension: int = IMAGE_REVIEW_MAX_DIMENSION, quality: int = IMAGE_REVIEW_QUALITY
+) -> Tuple[bytes, str]:
+    """
+    Shrink an image before it is sent to a vision model.
+
+    Vision tokens grow with the number of 512 pixel tiles of the image, so a review
+    does not need more than a few hundred pixels per side.
+
+    Args:
+        image_bytes: The image in any format Pillow reads
+        max_dimension: Longest side of the result
+        quality: JPEG quality of the result
+
+    Returns:
+        The JPEG bytes and their MIME type, or the original bytes without Pillow
+
+    Raises:
+        ValueError: If the data is not an image
+    """
+    if Image is None:
+        return image_bytes, "image/png"
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            image.load()
+            if max(image.size) > max_dimension:
+                image = image.copy()
+                image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            return _encode(image, "jpeg", quality), "image/jpeg"
+    except OSError as e:
+        raise ValueError(f"Not an image: {e}")
+
+
+def _warm_up() -> int:
+    """Run in each worker at start-up; importing this module already loaded Pillow."""
+    return os.getpid()
+
+
+# Pool of worker processes shared by the image tools
+image_process_pool = ProcessPool(
+    workers=IMAGE_PROCESS_WORKERS,
+    max_pending=max(1, IMAGE_PROCESS_WORKERS) * 2,
+    name="image processing",
+    warm_up=_warm_up,
+)
+
+
+async def process_image_async(image_bytes: bytes) -> List[Dict[str, Union[str, bytes, int]]]:
+    """Make the variants of a generated image in the worker pool; see `process_image`."""
+    return await image_process_pool.run(
+        process_image,
+        image_bytes,
+        IMAGE_OUTPUT_FORMAT,
+        IMAGE_OUTPUT_QUALITY,
+        IMAGE_MAX_DIMENSION,
+        IMAGE_THUMBNAIL_DIMENSION,
+        size=len(image_bytes),
+    )
+
+
+async def downscale_for_review_async(image_bytes: bytes) -> Tuple[bytes, str]:
+    """Shrink an image for a vision model in the worker pool; see `downscale_for_review`."""
+    return await image_process_pool.run(
+        downscale_for_review, image_bytes, IMAGE_REVIEW_MAX_DIMENSION, IMAGE_REVIEW_QUALITY, size=len(image_bytes)
+    )
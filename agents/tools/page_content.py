@@ -0,0 +1,123 @@
+"""
+Markdown content of web pages for the agents' tools.
+
+Pages are downloaded through the page cache with a byte budget derived from the
+number of characters the tool will keep, so nothing is spent on content that would
+only be truncated. HTML is converted in the parsing pool, plain text is used as is,
+PDF and Office documents go through the upload document converter, and any other
+content type is skipped before its body is downloaded.
+"""
+
+import asyncio
+import os
+import tempfile
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+from agents.tools.html_parse_pool import html_to_markdown_async
+from agents.tools.html_to_markdown import active_engine
+from httpClientPool import page_cache
+from httpClientPool.pageCache import DOCUMENT_CONTENT_TYPES, PAGE_FETCH_MAX_BYTES, CachedPage
+
+load_dotenv()
+
+# HTML bytes downloaded per character of markdown kept: pages carry a lot of markup
+# around their text, and CJK characters take three bytes in UTF-8
+PAGE_FETCH_BYTES_PER_CHAR = int(os.environ.get("PAGE_FETCH_BYTES_PER_CHAR", "16"))
+# Smallest budget, so that the main content detection still sees the whole article
+PAGE_FETCH_MIN_BYTES = int(float(os.environ.get("PAGE_FETCH_MIN_KB", "512")) * 1024)
+# What to do with PDF, Word and PowerPoint links: convert | skip
+PAGE_FETCH_DOCUMENTS = os.environ.get("PAGE_FETCH_DOCUMENTS", "convert").lower()
+
+
+def byte_budget(max_length: Optional[int]) -> int:
+    """Return the number of bytes to download for a page of which `max_length` characters are kept."""
+    if not max_length:
+        return PAGE_FETCH_MAX_BYTES
+    return min(PAGE_FETCH_MAX_BYTES, max(PAGE_FETCH_MIN_BYTES, max_length * PAGE_FETCH_BYTES_PER_CHAR))
+
+
+def _document_extension(page: CachedPage) -> str:
+    media_type = page.meta.get("content_type", "").split(";")[0].strip().lower()
+    if media_type in DOCUMENT_CONTENT_TYPES:
+        return DOCUMENT_CONTENT_TYPES[media_type]
+    extension = os.path.splitext(urlparse(page.url).path)[1].lower()
+    if extension in DOCUMENT_CONTENT_TYPES.values():
+        return extension
+    return ".pdf" if page.body.startswith(b"%PDF-") else ".docx"
+
+
+def _convert_document(body: bytes, extension: str, name: str) -> str:
+    # Imported here: the converter pulls in markitdown and the agent stack
+    from agents.file_processor.main import process_file
+
+    if not name.lower().endswith(extension):
+        name += extension
+    with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as f:
+        f.write(body)
+        path = f.name
+    try:
+        error, result = process_file(path, name)
+    finally:
+        os.remove(path)
+    if error:
+        raise ValueError(error)
+    return result.text_content
+
+
+async def fetch_page_markdown(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    max_length: Optional[int] = None,
+    include_images: bool = True,
+    clean_image_urls: bool = False,
+    timeout: float = 10,
+) -> str:
+    """
+    Fetch a page and return its content as markdown.
+
+    Args:
+        url: The URL of the page
+        headers: Optional HTTP headers for the request
+        max_length: Maximum length of the output markdown (if None, no limit)
+        include_images: Whether to include image references in the markdown
+        clean_image_urls: Whether to remove query parameters from image URLs
+        timeout: Request timeout in seconds
+
+    Returns:
+        The markdown
+
+    Raises:
+        ValueError: If the content type is not supported or the document is too large
+        httpx.HTTPStatusError: If the server answers with an error status
+        httpx.RequestError: If the request fails
+    """
+    page = await page_cache.fetch(url, headers=headers, timeout=timeout, max_bytes=byte_budget(max_length))
+    if page.skipped:
+        raise ValueError(f"Skipped {url}: {page.skipped}")
+
+    kind = page.kind
+    if kind == "document" and PAGE_FETCH_DOCUMENTS != "convert":
+        raise ValueError(f"Skipped {url}: document links are not converted")
+
+    # Reuse the markdown converted from the same page body with the same options
+    if kind == "html":
+        variant = f"{active_engine()}-{'images' if include_images else 'no_images'}{'-clean' if clean_image_urls else ''}"
+    else:
+        variant = kind
+    markdown = await page_cache.get_markdown(page, variant)
+    if markdown is None:
+        if kind == "html":
+            markdown = await html_to_markdown_async(page.text, url, include_images, clean_image_urls)
+        elif kind == "document":
+            name = os.path.basename(urlparse(url).path) or "document"
+            markdown = await asyncio.to_thread(_convert_document, page.body, _document_extension(page), name)
+        else:
+            markdown = page.text
+        await page_cache.set_markdown(page, variant, markdown)
+
+    if max_length and len(markdown) > max_length:
+        markdown = markdown[:max_length] + "\n...(truncated)"
+    return markdown.strip()
@@ -0,0 +1,99 @@
+"""
+Process pool for the CPU-heavy work of the tools.
+
+Converting a large page to markdown or transcoding a generated image takes hundreds
+of milliseconds of pure CPU. Run inside an async tool, that blocks the event loop and
+with it every chainlit session. Such work is therefore shipped to a pool of
+pre-started worker processes. A bounded number of calls may be pending at once, so a
+burst of tool calls waits on the event loop instead of piling inputs up in the
+pool's queue.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("process_pool")
+
+
+class ProcessPool:
+    """
+    Pool of worker processes for CPU-bound tool work, started ahead of the first request.
+
+    The workers are created with the forkserver (or spawn) start method rather than
+    fork, so they never inherit the threads and sockets of the running app. Each
+    worker runs `warm_up` at start-up; passing a function of the module that does
+    the work makes the workers import that module, and its heavy dependencies,
+    before the first real call.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_pending: int,
+        inline_bytes: int = 0,
+        name: str = "worker",
+        warm_up: Callable[[], Any] = os.getpid,
+    ):
+        self._name = name
+        self._warm_up = warm_up
+        self._workers = workers
+        self._max_pending = max_pending
+        self._inline_bytes = inline_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+
+    def start(self) -> None:
+        """Start the worker processes if they are not running yet."""
+        if self._workers <= 0 or self._executor is not None:
+            return
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self._executor = ProcessPoolExecutor(max_workers=self._workers, mp_context=context)
+        # Each submission starts one more worker while none is idle: pre-start them all
+        for _ in range(self._workers):
+            self._executor.submit(self._warm_up)
+        logger.info(f"Started {self._workers} {self._name} workers")
+
+    def _slot(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        slot = self._slots.get(loop)
+        if slot is None:
+            slot = asyncio.Semaphore(self._max_pending)
+            self._slots[loop] = slot
+        return slot
+
+    async def run(self, func: Callable[..., Any], *args: Any, size: int = 0) -> Any:
+        """
+        Run a picklable function in the pool without blocking the event loop.
+
+        Args:
+            func: Module-level function to run
+            args: Its picklable arguments
+            size: Size of the input in bytes; small inputs are processed in a thread
+
+        Returns:
+            The result of the function
+        """
+        if self._workers <= 0 or size < self._inline_bytes:
+            return await asyncio.to_thread(func, *args)
+
+        self.start()
+        async with self._slot():
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory): replace the pool for the next calls
+                logger.warning(f"{self._name} pool is broken; restarting it")
+                self.shutdown()
+                return await asyncio.to_thread(func, *args)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes, dropping the calls still queued."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
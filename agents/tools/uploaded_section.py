@@ -0,0 +1,36 @@
+from typing import Optional
+
+import chainlit as cl
+from autogen_core.tools import FunctionTool
+
+from agents.file_processor.condenser import read_section
+from teamRun import timed_tool
+
+
+@cl.step(type="tool", name="read_uploaded_section")
+@timed_tool("read_uploaded_section")
+async def read_uploaded_section(digest_id: str, section_id: str, max_length: Optional[int] = 20000) -> str:
+    """
+    Read the original text of a section of condensed uploaded files.
+
+    Args:
+        digest_id: The digest_id given in the upload digest
+        section_id: The section id listed in the digest index, e.g. D1-C3
+        max_length: Maximum length of the returned text
+
+    Returns:
+        str: The original text of the section, or an error message
+    """
+    content = read_section(digest_id, section_id)
+    if content is None:
+        return f"Error: section {section_id} of upload {digest_id} was not found"
+    if max_length and len(content) > max_length:
+        content = content[:max_length] + "\n... (truncated)"
+    return content
+
+
+read_uploaded_section_tool = FunctionTool(
+    read_uploaded_section,
+    name="read_uploaded_section",
+    description="Read the original text of a section of the uploaded files by the digest_id and section id listed in the upload digest.",
+)
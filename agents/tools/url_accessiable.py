@@ -1,14 +1,30 @@
 import asyncio
-import json
 import os
-from typing import Dict, List, Optional
-from urllib.parse import urljoin, urlparse
+import time
+from typing import Any, Dict, List
+from urllib.parse import urlparse
 
 import chainlit as cl
-import html2text
 import httpx
 from autogen_core.tools import FunctionTool
-from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+
+from httpClientPool import http_client_manager
+from sharedState import ResultCache
+from teamRun import timed_tool
+
+load_dotenv()
+
+URL_CHECK_TIMEOUT = float(os.environ.get("URL_CHECK_TIMEOUT", "5"))
+URL_CHECK_CONCURRENCY = int(os.environ.get("URL_CHECK_CONCURRENCY", "16"))
+# How long verdicts are reused, in seconds; failures are retried sooner
+URL_CHECK_CACHE_TTL = float(os.environ.get("URL_CHECK_CACHE_TTL", "3600"))
+URL_CHECK_NEGATIVE_CACHE_TTL = float(os.environ.get("URL_CHECK_NEGATIVE_CACHE_TTL", "300"))
+
+# Statuses of servers that refuse HEAD but may serve the resource to a GET
+HEAD_REJECTED_STATUSES = {400, 403, 405, 501}
+
+url_check_cache = ResultCache("url_check")
 
 
 def clean_url(url: str) -> str:
@@ -26,7 +42,7 @@ def clean_url(url: str) -> str:
 
 
 @cl.step(type="tool", name="is_url_accessible")
-def is_url_accessible_with_chainlit(url: str) -> bool:
+async def is_url_accessible_with_chainlit(url: str) -> bool:
     """Check if a URL is accessible with Chainlit context.
 
     Args:
@@ -35,16 +51,78 @@ def is_url_accessible_with_chainlit(url: str) -> bool:
     Returns:
         bool: True if the URL is accessible, False otherwise.
     """
+    return await is_url_accessible(url)
+
+
+async def _ranged_get(url: str) -> httpx.Response:
+    # Ask for the first byte only and stop at the headers
+    async with http_client_manager.stream(
+        "GET", url, headers={"Range": "bytes=0-0"}, timeout=URL_CHECK_TIMEOUT, follow_redirects=True
+    ) as response:
+        return response
+
+
+async def check_url(url: str) -> Dict[str, Any]:
+    """
+    Check whether a URL serves content, using the cached verdict when there is one.
+
+    A HEAD request is tried first; servers rejecting HEAD, or failing on it, get a
+    ranged GET for a single byte.
+
+    Args:
+        url: The URL to check, as written; the query often identifies the resource
+            (YouTube watch?v=..., signed blob and CDN URLs)
+
+    Returns:
+        Dict with the url, accessible, status, content_type, latency_ms, method and error
+    """
+    url = url.strip()
+    cached = await url_check_cache.get(url)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    verdict = {"url": url, "accessible": False, "status": None, "content_type": None,
+               "latency_ms": None, "method": None, "error": None}
+    start = time.perf_counter()
+    for method in ("HEAD", "GET"):
+        verdict["method"] = method
+        try:
+            if method == "HEAD":
+                response = await http_client_manager.head(url, timeout=URL_CHECK_TIMEOUT, follow_redirects=True)
+            else:
+                response = await _ranged_get(url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            verdict["error"] = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            if isinstance(e, httpx.TimeoutException):
+                # A server too slow for HEAD will not answer a GET in time either
+                break
+            continue
+
+        verdict["status"] = response.status_code
+        verdict["content_type"] = response.headers.get("content-type")
+        verdict["error"] = None
+        verdict["accessible"] = response.status_code in (200, 206)
+        if verdict["accessible"] or response.status_code not in HEAD_REJECTED_STATUSES:
+            break
+
+    verdict["latency_ms"] = round((time.perf_counter() - start) * 1000)
+    ttl = URL_CHECK_CACHE_TTL if verdict["accessible"] else URL_CHECK_NEGATIVE_CACHE_TTL
     try:
-        response = httpx.head(clean_url(url), timeout=5)
-        return response.status_code == 200
-    except Exception:
-        return False
+        await url_check_cache.set(verdict, url, ttl=ttl)
+    except Exception as e:
+        print(f"Failed to cache the verdict for {url}: {e}")
+    return {**verdict, "cached": False}
 
 
-def is_url_accessible(url: str) -> bool:
+@timed_tool("is_url_accessible")
+async def is_url_accessible(url: str) -> bool:
     """Check if a URL is accessible without Chainlit context.
 
+    The check is asynchronous so that it does not block the event loop and can be
+    cancelled together with the team run that requested it.
+
     Args:
         url: The URL to check.
 
@@ -52,12 +130,44 @@ def is_url_accessible(url: str) -> bool:
         bool: True if the URL is accessible, False otherwise.
     """
     try:
-        response = httpx.head(clean_url(url), timeout=5)
-        return response.status_code == 200
+        return (await check_url(url))["accessible"]
+    except asyncio.CancelledError:
+        raise
     except Exception:
         return False
 
 
+@cl.step(type="tool", name="validate_urls")
+@timed_tool("validate_urls")
+async def validate_urls(urls: List[str]) -> List[Dict[str, Any]]:
+    """Check a batch of URLs concurrently, e.g. every image and video of a lesson.
+
+    Args:
+        urls: The URLs to check; duplicates are checked once.
+
+    Returns:
+        List[Dict[str, Any]]: One verdict per distinct URL with url, accessible, status,
+        content_type, latency_ms, method (HEAD or ranged GET), error and cached.
+    """
+    distinct = list(dict.fromkeys(url.strip() for url in urls if url and url.strip()))
+    slots = asyncio.Semaphore(URL_CHECK_CONCURRENCY)
+
+    async def check(url: str) -> Dict[str, Any]:
+        async with slots:
+            try:
+                return await check_url(url)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                return {"url": url, "accessible": False, "error": str(e)}
+
+    results = await asyncio.gather(*(check(url) for url in distinct))
+    duplicates = len(urls) - len(distinct)
+    if duplicates:
+        print(f"validate_urls: {duplicates} duplicated URLs in the batch")
+    return list(results)
+
+
 url_accessible_valid_tool = FunctionTool(
     is_url_accessible,
     name="urlAccessibleValidTool",
@@ -66,3 +176,16 @@ url_accessible_valid_tool = FunctionTool(
         "httpx",
     ],
 )
+
+url_batch_validator_tool = FunctionTool(
+    validate_urls,
+    name="urlBatchValidatorTool",
+    description=(
+        "Validate a list of URLs at once, e.g. all image and video URLs of a lesson. "
+        "Returns for each distinct URL whether it is accessible, its HTTP status, content type and latency."
+    ),
+    global_imports=[
+        "httpx",
+        {"module": "typing", "imports": ["Any", "Dict", "List"]},
+    ],
+)
@@ -12,37 +12,56 @@ logging.getLogger().setLevel(logging.WARNING)
 import asyncio
 import json
 import os
-import tempfile
 import time
 import traceback
-from datetime import datetime, timezone
 
 import chainlit as cl
 from autogen_agentchat.base import TaskResult
 from autogen_agentchat.messages import (
     ModelClientStreamingChunkEvent,
     BaseChatMessage,
+    SelectSpeakerEvent,
     StopMessage,
     TextMessage,
 )
 from autogen_agentchat.teams import SelectorGroupChat
-from autogen_core import CancellationToken
 # Replace incorrect import with import from autogen_agentchat
 from autogen_agentchat.messages import FunctionCall
 
 from agents.catch_up_and_explore_by_AI.catch_up_and_explore_by_AI_agents import (
     create_catch_up_team,
 )
+from agents.file_processor.condenser import condense_documents
 from agents.file_processor.main import process_file
 from agents.open_topic_class_generation.open_topic_class_generation_agents import (
+    MAX_MESSAGES,
     create_team,
 )
 
 from agents.open_topic_class_generation.open_topic_class_generation_agents_grounding_bing import (
     create_team_grounding_with_bing,
 )
+from agents.tools.grounding_clients import close_grounding_clients
+from agents.tools.html_parse_pool import html_parse_pool
+from agents.tools.image_clients import close_image_clients
 from agents.tools.image_generate import image_generation_tool
-from config import CATCH_UP_AND_EXPLORE_BY_AI_AGENT, OPEN_TOPIC_CLASS_GENERATION_AGENT,CURRENT_AGENT_TEAM_NAME,OPEN_TOPIC_CLASS_GENERATION_AGENT_GROUNDING_WITH_BING
+from agents.tools.image_processing import image_process_pool
+from httpClientPool import close_http_clients
+from config import CATCH_UP_AND_EXPLORE_BY_AI_AGENT, OPEN_TOPIC_CLASS_GENERATION_AGENT,CURRENT_AGENT_TEAM_NAME,OPEN_TOPIC_CLASS_GENERATION_AGENT_GROUNDING_WITH_BING,LESSON_FORMATTER_AGENT
+from lessonOutput import LessonDraftWriter, extract_final_content, finalize_lesson
+from teamRun import (
+    JOB_STATUS_COMPLETED,
+    JOB_STATUS_FAILED,
+    JOB_STATUS_QUEUED,
+    TeamRunJob,
+    team_run_scheduler,
+)
+
+# Seconds a run may outlive its disconnected session before it is cancelled
+ORPHANED_RUN_GRACE_SECONDS = float(os.environ.get("ORPHANED_RUN_GRACE_SECONDS", "60"))
+
+# The event loop only keeps weak references to tasks, so pending cancellations are held here
+orphaned_run_cancellations: set[asyncio.Task] = set()
 
 
 # Add serialization helper function
@@ -132,6 +151,89 @@ async def on_chat_start():
     cl.user_session.set(CATCH_UP_AND_EXPLORE_BY_AI_AGENT, catch_up_team)
     cl.user_session.set(OPEN_TOPIC_CLASS_GENERATION_AGENT_GROUNDING_WITH_BING, open_topic_team_grounding_with_bing)
 
+    # Re-attach to a team run that is still in progress for this conversation or user
+    await reattach_team_job()
+
+@cl.on_chat_resume
+async def on_chat_resume(thread):
+    await on_chat_start()
+
+def get_run_owner():
+    """Return the conversation key and the optional user identifier owning a team run."""
+    user = cl.user_session.get("user")
+    return cl.context.session.thread_id, (user.identifier if user else None)
+
+async def reattach_team_job():
+    owner, user = get_run_owner()
+    job = team_run_scheduler.find_job(owner, user)
+    if job is None or job.done:
+        return
+
+    job.reattach_count += 1
+    await cl.Message(content="检测到正在运行的教学内容生成任务，正在重新连接...").send()
+    await render_team_job(job)
+
+async def cancel_team_job():
+    """Cancel the in-flight team run of the current conversation, if there is one."""
+    owner, _ = get_run_owner()
+    job = team_run_scheduler.find_job(owner)
+    if job is None or job.done:
+        return None
+
+    if await team_run_scheduler.cancel(job):
+        return job
+    return None
+
+@cl.on_stop
+async def on_stop():
+    job = await cancel_team_job()
+    if job is not None:
+        await cl.Message(
+            content=f"已停止生成。本次运行已消耗约 {job.total_tokens} tokens，"
+                    f"提前停止预计节省约 {job.estimate_saved_tokens()} tokens。"
+        ).send()
+
+@cl.on_chat_end
+async def on_chat_end():
+    owner, _ = get_run_owner()
+    job = team_run_scheduler.find_job(owner)
+    if job is None or job.done:
+        return
+
+    # Chat end also fires on a dropped connection, so give the browser a grace period
+    # to reconnect (same session) or re-attach (new session) before cancelling the run.
+    session = cl.context.session
+    socket_id = getattr(session, "socket_id", None)
+    reattach_count = job.reattach_count
+
+    async def cancel_orphaned_job():
+        await asyncio.sleep(ORPHANED_RUN_GRACE_SECONDS)
+        if getattr(session, "socket_id", None) != socket_id or job.reattach_count != reattach_count:
+            return
+        if await team_run_scheduler.cancel(job):
+            print(
+                f"Cancelled orphaned team run {job.job_id}: {job.total_tokens} tokens used, "
+                f"~{job.estimate_saved_tokens()} tokens saved"
+            )
+
+    task = asyncio.create_task(cancel_orphaned_job())
+    orphaned_run_cancellations.add(task)
+    task.add_done_callback(orphaned_run_cancellations.discard)
+
+@cl.on_app_startup
+async def on_app_startup():
+    # Start the HTML parsing workers before the first tool call needs them
+    html_parse_pool.start()
+
+@cl.on_app_shutdown
+async def on_app_shutdown():
+    # Close the pooled keep-alive connections of the web tools
+    await close_http_clients()
+    await close_image_clients()
+    await close_grounding_clients()
+    html_parse_pool.shutdown()
+    image_process_pool.shutdown()
+
 @cl.on_message  # type: ignore
 async def chat(message: cl.Message) -> None:
     # Check if there are files uploaded
@@ -141,8 +243,8 @@ async def chat(message: cl.Message) -> None:
         try:
             # Process uploaded files with timeout handling
             await cl.Message(content="正在处理上传的文件，请稍候...").send()
-            # Use a longer timeout for file processing
-            await asyncio.wait_for(process_uploaded_files(files, message), timeout=120.0)
+            # The timeout covers converting the files only, not the queue wait and team run that follow
+            upload = await asyncio.wait_for(process_uploaded_files(files, message), timeout=120.0)
         except asyncio.TimeoutError:
             await cl.Message(content="文件处理超时，请尝试将文件拆分为较小的部分或减少文件数量。").send()
         except Exception as e:
@@ -150,6 +252,9 @@ async def chat(message: cl.Message) -> None:
             error_trace = traceback.format_exc()
             print(f"File processing error: {error_trace}")
             await cl.Message(content=error_msg + "请重试或联系系统管理员。").send()
+        else:
+            if upload is not None:
+                await run_uploaded_content(upload)
     else:
         # Process text request directly
         if os.environ.get("GROUNDING_WITH_BING", "false").lower() == "true":
@@ -166,11 +271,7 @@ async def chat(message: cl.Message) -> None:
         )
 
 async def process_uploaded_files(files, message: cl.Message):
-    # Use catch_up_team instead of open_topic_team for file processing
-    catch_up_team = cl.user_session.get(CATCH_UP_AND_EXPLORE_BY_AI_AGENT)
-    cl.user_session.set(CURRENT_AGENT_TEAM_NAME,CATCH_UP_AND_EXPLORE_BY_AI_AGENT)
-    
-    combined_content = ""
+    documents = []
     file_count = len(files)
     
     await cl.Message(content=f"开始处理 {file_count} 个文件...").send()
@@ -178,83 +279,106 @@ async def process_uploaded_files(files, message: cl.Message):
     # Process each file
     for i, file in enumerate(files):
         try:
-            temp_dir = tempfile.mkdtemp()
-            temp_file_path = os.path.join(temp_dir, file.name)
-                        
-            # Save the uploaded file directly to temp directory
-            try:
-                # Use the file's path attribute instead of trying to get bytes
-                original_file_path = None
-                if hasattr(file, 'path') and file.path:
-                    # Option 1: Copy the file from its current location to our temp path
-                    import shutil
-                    shutil.copy(file.path, temp_file_path)
-                    # Store the original file path for saving markdown alongside it
-                    original_file_path = file.path
-                else:
-                    # Fallback for versions where path might not be available
-                    raise Exception(f"Cannot access file: File path not available")
-                
-                # Get file size for limit check
-                file_size = os.path.getsize(temp_file_path) / (1024 * 1024)  # Size in MB
-                
-            except Exception as e:
-                error_msg = f"无法保存文件: {str(e)}"
-                print(f"File saving error: {traceback.format_exc()}")
-                await cl.Message(content=error_msg).send()
+            # Read the upload where chainlit stored it instead of copying it to a temp directory
+            if not getattr(file, 'path', None):
+                # Fallback for versions where path might not be available
+                await cl.Message(content=f"无法读取文件 {file.name}: 文件路径不可用").send()
                 continue
+
+            # Get file size for limit check
+            file_size = os.path.getsize(file.path) / (1024 * 1024)  # Size in MB
                 
             # Check if file is too large
             if file_size > 50:  # 50MB limit
                 await cl.Message(content=f"文件 {file.name} 太大 ({file_size:.1f}MB)，请上传50MB以下的文件。").send()
                 continue
             
-            # Process the file and convert to markdown - pass the original file path
+            # Process the file and convert to markdown
             # First step: 处理文件内容
-            from pathlib import Path
-            file_name = Path(temp_file_path).name
-            async with cl.Step(name=f" 处理文件:{file_name}") as step:
-                error, content = process_file(temp_file_path, original_file_path=original_file_path)
+            async with cl.Step(name=f" 处理文件:{file.name}") as step:
+                # Conversion is blocking, run it in a worker thread to keep the event loop responsive
+                error, content = await asyncio.to_thread(process_file, file.path, file.name)
                 if error:
                     # Add message to the step instead of sending separately
-                    step.set_name(f"处理文件 {file.name} 时发生错误: {str(e)}")
+                    step.name = f"处理文件 {file.name} 时发生错误: {error}"
                 else:
-                    step.set_name(f"处理文件 {file.name} 成功")    
+                    step.name = f"处理文件 {file.name} 成功"
                     # Add success message to the step instead of sending separately
-                    combined_content += f"\n\n## Content from {file.name}\n\n{content.markdown}"
+                    documents.append((file.name, content.markdown))
 
                 # Update the step to refresh its content in the UI
                 await step.update()
-                
-            # Clean up
-            os.remove(temp_file_path)
-            os.rmdir(temp_dir)
                         
         except Exception as e:
             await cl.Message(content=f"处理文件 {file.name} 时发生错误: {str(e)}").send()
             print(f"Error processing file {file.name}: {traceback.format_exc()}")
     
-    if combined_content:
-        # Create a message with the combined content
-        new_message = cl.Message(content=combined_content)
-        
-        try:                
-            # Now run the catch_up_team with the processed content in a separate step
-            await run_stream_team(catch_up_team, new_message)
-        except asyncio.TimeoutError:
-            await cl.Message(content="内容处理超时，请尝试减少文件数量或拆分为较小的请求。").send()
-        except Exception as e:
-            error_msg = f"内容处理失败: {str(e)}"
-            print(f"Content processing error: {traceback.format_exc()}")
-            await cl.Message(content=error_msg).send()
-    else:
-        await cl.Message(content="无法从上传的文件中提取内容。请确保文件格式正确且内容可读。").send()
+    if documents:
+        # Large uploads are condensed into a digest with an index into the full text
+        async with cl.Step(name="整理上传内容") as condense_step:
+            upload = await condense_documents(documents)
+            if upload.condensed:
+                condense_step.name = f"已将约 {upload.source_tokens} tokens 的上传内容整理为 {upload.chunk_count} 个片段摘要"
+            else:
+                condense_step.name = "上传内容无需整理"
+            await condense_step.update()
+        return upload
+
+    await cl.Message(content="无法从上传的文件中提取内容。请确保文件格式正确且内容可读。").send()
+    return None
+
+async def run_uploaded_content(upload):
+    # Use catch_up_team instead of open_topic_team for file processing
+    catch_up_team = cl.user_session.get(CATCH_UP_AND_EXPLORE_BY_AI_AGENT)
+    cl.user_session.set(CURRENT_AGENT_TEAM_NAME,CATCH_UP_AND_EXPLORE_BY_AI_AGENT)
+
+    # Create a message with the combined content
+    new_message = cl.Message(content=upload.content)
+
+    try:
+        # Now run the catch_up_team with the processed content in a separate step
+        await run_stream_team(catch_up_team, new_message)
+    except Exception as e:
+        error_msg = f"内容处理失败: {str(e)}"
+        print(f"Content processing error: {traceback.format_exc()}")
+        await cl.Message(content=error_msg).send()
 
 async def run_stream_team(team=SelectorGroupChat, message: cl.Message | None = None):
+    owner, user = get_run_owner()
+    job = await team_run_scheduler.submit(
+        owner,
+        team,
+        [TextMessage(content=message.content, source="user")],
+        cl.user_session.get(CURRENT_AGENT_TEAM_NAME),
+        user=user,
+        max_messages=MAX_MESSAGES,
+        # Persists the formatter output as it streams, so a crash does not lose the lesson
+        draft=LessonDraftWriter(),
+        # Validates and saves the lesson once, even if no renderer is attached when the run ends
+        finalize=finalize_lesson,
+    )
+    await render_team_job(job)
+
+async def render_team_job(job: TeamRunJob):
     executing = False
 
-    async with cl.Step(name= cl.user_session.get(CURRENT_AGENT_TEAM_NAME)) as executing_step:
-        start = time.time()
+    # Show the queue position while the run waits for a free slot
+    if job.status == JOB_STATUS_QUEUED:
+        queue_message = cl.Message(content="")
+        queue_message_sent = False
+        async for position in team_run_scheduler.queue_positions(job):
+            queue_message.content = f"当前生成任务较多，您的任务正在排队（第 {position} 位），请稍候..."
+            if queue_message_sent:
+                await queue_message.update()
+            else:
+                await queue_message.send()
+                queue_message_sent = True
+        if queue_message_sent:
+            queue_message.content = "排队结束，开始生成教学内容。"
+            await queue_message.update()
+
+    async with cl.Step(name=job.team_name) as executing_step:
+        start = job.started_at or time.time()
         
         # 添加时间更新任务
         update_time_task = None
@@ -292,11 +416,8 @@ async def run_stream_team(team=SelectorGroupChat, message: cl.Message | None = N
         final_answer = cl.Message(content="")
 
         try:
-            # Create a clean cancellation token
-            cancellation_token = CancellationToken()
-            
-            # Use the async generator directly instead of trying to wrap it in a task
-            async for msg in team.run_stream(task=[TextMessage(content=message.content, source="user")],cancellation_token=cancellation_token,):
+            # Follow the scheduled run, replaying any events emitted before attaching
+            async for msg in job.stream_events():
                 try:
                     if isinstance(msg, ModelClientStreamingChunkEvent):
                         # Ensure content is properly serializable
@@ -324,7 +445,7 @@ async def run_stream_team(team=SelectorGroupChat, message: cl.Message | None = N
                             content = content.split("TERMINATE")[0].strip()
                                 
                         # Process based on source
-                        if msg.source != "markdown_content_formator":
+                        if msg.source != LESSON_FORMATTER_AGENT:
                             executing = True
                             if content:  # Only stream non-empty content
                                 await executing_step.stream_token(content)
@@ -336,6 +457,10 @@ async def run_stream_team(team=SelectorGroupChat, message: cl.Message | None = N
                             if content:  # Only stream non-empty content
                                 await final_answer.stream_token(content)
                     
+                    elif isinstance(msg, SelectSpeakerEvent):
+                        # Speaker selections are only recorded on the run's timeline
+                        continue
+
                     elif isinstance(msg, StopMessage):
                         # Handle stop messages properly
                         print(f"Received StopMessage")
@@ -355,8 +480,8 @@ async def run_stream_team(team=SelectorGroupChat, message: cl.Message | None = N
                                     
                         if content and "TERMINATE" in content:
                             content = content.split("TERMINATE")[0].strip()
-                        if content:
-                            final_answer.content += content
+                        if content and not final_answer.content:
+                            final_answer.content = content
                         
                         break
                                 
@@ -364,13 +489,10 @@ async def run_stream_team(team=SelectorGroupChat, message: cl.Message | None = N
                         print("Received TaskResult")
                         print(f"Received TaskResult with stop reason: {msg.stop_reason}")
                         # Process task results if needed
-                        if msg.stop_reason is not None:
-                            finalAgentContent = msg.messages[-1].content
-                            content = finalAgentContent.split("TERMINATE")[0].strip()
-                            if len(content) > 0:
-                                final_answer.content += content
-                            elif len(msg.messages) >=2 :
-                                final_answer.content += msg.messages[-2].content
+                        # The final message is authoritative: it replaces the streamed tokens
+                        content = extract_final_content(msg)
+                        if content:
+                            final_answer.content = content
                     
                     elif executing_step is not None and msg is not None and not isinstance(msg, BaseChatMessage):
                         # Handle any other message types safely
@@ -401,6 +523,9 @@ async def run_stream_team(team=SelectorGroupChat, message: cl.Message | None = N
                     print(f"Error processing message chunk: {str(token_error)}")
                     print(traceback.format_exc())
                     continue
+
+            if job.status == JOB_STATUS_FAILED:
+                await cl.Message(content=f"生成内容时出错: {job.error}").send()
                     
         except Exception as stream_error:
             # Handle other stream errors
@@ -430,157 +555,31 @@ async def run_stream_team(team=SelectorGroupChat, message: cl.Message | None = N
                     except Exception as cancel_error:
                         print(f"Non-critical error during task cleanup: {str(cancel_error)}")
 
+    # Summarize where the time of the run went in a collapsed step
+    if job.done:
+        async with cl.Step(name="运行性能时间线", type="tool") as timeline_step:
+            timeline_step.output = job.timeline.summary_markdown()
+            if job.timeline_path:
+                timeline_step.output += f"\n\n完整时间线: `{job.timeline_path}`"
+
+    # The scheduler validated and saved the lesson once when the run completed
+    await job.wait()
+    result = job.result
+    if result is not None:
+        final_answer.content = result.content
+        if result.report is not None:
+            async with cl.Step(name="媒体链接检查", type="tool") as media_step:
+                media_step.output = result.report.summary_markdown()
+
     # Send the final answer message to the UI
     if final_answer.content:
-        # Send the final answer to the UI
-        await final_answer.stream_token(final_answer.content)
-        
-        try:
-            # Clean up content before saving
-            clean_content = final_answer.content
-            if "TERMINATE" in clean_content:
-                clean_content = clean_content.split("TERMINATE")[0].strip()
-            
-            # Create timestamp for filenames
-            timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-            
-            # Save markdown to public/md directory
-            os.makedirs("public/md", exist_ok=True)
-            md_filename = f"public/md/course_materials_{timestamp}.md"
-            with open(md_filename, "w", encoding="utf-8") as md_file:
-                md_file.write(clean_content)
-            
-            # Generate PDF
-            pdf_file = md_to_pdf(clean_content)
-            
+        # Completes the streamed message (or sends it if nothing was streamed) without re-sending the content
+        await final_answer.send()
+
+        if result is not None:
             # Add both links to the response
-            await cl.Message(content=f"\n\nMarkdown: [{os.path.basename(md_filename)}]({md_filename})").send()
-            await cl.Message(content=f"\n\nPDF: [{os.path.basename(pdf_file)}]({pdf_file})").send()
-        except Exception as file_error:
-            print(f"Error creating files: {file_error}")
-            print(traceback.format_exc())
+            await cl.Message(content=f"\n\nMarkdown: [{os.path.basename(result.markdown_path)}]({result.markdown_path})").send()
+            await cl.Message(content=f"\n\nPDF: [{os.path.basename(result.pdf_path)}]({result.pdf_path})").send()
+        elif job.status == JOB_STATUS_COMPLETED:
+            print(f"Error creating files: {job.finalize_error}")
             await cl.Message(content="\n\n无法创建文件，请检查生成的内容。").send()
-
-def md_to_pdf(md: str) -> str:
-    import base64
-    import os  # Import os at the beginning of the function
-    import re
-    import urllib.request
-    from io import BytesIO
-
-    os.makedirs("public/pdfs", exist_ok=True)
-    os.makedirs("public/fonts", exist_ok=True)
-
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-
-    filename = f"public/pdfs/course_materials_{timestamp}.pdf"
-
-    # Clean up the content
-    content = md
-    
-    # Ensure we have content
-    if not content:
-        content = "# 无内容 \n\n请检查生成过程，内容生成失败。"
-
-    # Add a title if there isn't one
-    if not content.startswith('# '):
-        content = f"# 中国小学语文教学内容\n\n{content}"
-    
-    # Download a Chinese font if we don't have one already
-    chinese_font_path = "public/fonts/NotoSansSC-Regular.ttf"
-    if not os.path.exists(chinese_font_path):
-        try:
-            print("Downloading Chinese font...")
-            # Fix: Updated URL to direct download link instead of GitHub blob page
-            font_url = "https://github.com/jsntn/webfonts/raw/master/NotoSansSC-Regular.ttf"
-            urllib.request.urlretrieve(font_url, chinese_font_path)
-            print(f"Downloaded font to {chinese_font_path}")
-        except Exception as font_error:
-            print(f"Error downloading font: {str(font_error)}")
-            # Create a fallback font
-            chinese_font_path = None
-    
-    # Create PDF with reportlab
-    try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
-        from reportlab.pdfgen import canvas
-
-        # Try to register the Chinese font
-        has_chinese_font = False
-        if chinese_font_path and os.path.exists(chinese_font_path):
-            try:
-                pdfmetrics.registerFont(TTFont("NotoSansSC", chinese_font_path))
-                has_chinese_font = True
-            except Exception as font_register_error:
-                print(f"Error registering font: {str(font_register_error)}")
-        
-        # Create a basic PDF with title
-        c = canvas.Canvas(filename, pagesize=A4)
-        width, height = A4
-        
-        # Draw a title - use Chinese font if available
-        font_name = "NotoSansSC" if has_chinese_font else "Helvetica-Bold"
-        c.setFont(font_name, 16)
-        c.drawString(50, height - 50, "中国小学语文教学内容")
-        
-        # Draw content
-        font_name = "NotoSansSC" if has_chinese_font else "Helvetica"
-        c.setFont(font_name, 10)
-        y_position = height - 80
-        line_height = 14
-        
-        # Simplify content to plain text - use 'content' instead of undefined 'plain_text'
-        plain_text = content  # Initialize plain_text with content
-        plain_text = re.sub(r'#+ (.*)', r'\1', plain_text)  # Headers to plain text
-        plain_text = re.sub(r'\*\*(.*?)\*\*', r'\1', plain_text)  # Remove bold
-        plain_text = re.sub(r'\*(.*?)\*', r'\1', plain_text)  # Remove italics
-        
-        # Add text by lines
-        for line in plain_text.split('\n'):
-            if not line.strip():
-                y_position -= line_height * 0.5
-                continue
-            
-            # Check if we need a new page
-            if y_position < 50:
-                c.showPage()
-                c.setFont(font_name, 10)
-                y_position = height - 50
-            
-            # Simple word wrap with better handling for Chinese text
-            if len(line) * 5 > width - 100:  # Rough estimate of line width
-                # For Chinese text, we need shorter chunks
-                chunk_size = 40 if has_chinese_font else 80
-                chunks = [line[i:i+chunk_size] for i in range(0, len(line), chunk_size)]
-                for chunk in chunks:
-                    c.drawString(50, y_position, chunk)
-                    y_position -= line_height
-            else:
-                c.drawString(50, y_position, line)
-                y_position -= line_height
-        
-        c.save()
-        print(f"Successfully created PDF with reportlab: {filename}")
-        
-        # If we couldn't display Chinese characters, add a note to the markdown file
-        if not has_chinese_font:
-            md_note_filename = f"public/md/course_materials_{timestamp}_no_chinese_font.md"
-            with open(md_note_filename, "w", encoding="utf-8") as f:
-                f.write(content)
-            print(f"Created fallback markdown file with full content: {md_note_filename}")
-        
-        return filename
-        
-    except Exception as reportlab_error:
-        print(f"ReportLab failed: {str(reportlab_error)}")
-        print(traceback.format_exc())
-        
-        # Last resort: PDF-named text file
-        print("PDF generation failed, creating a text file with .pdf extension")
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write("# 中国小学语文教学内容\n\n")
-            f.write(content)
-        print(f"Created text file with PDF extension: {filename}")
-        return filename
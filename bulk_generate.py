@@ -0,0 +1,379 @@
+"""
+Headless bulk lesson generation.
+
+Generates one lesson per row of a CSV or JSONL file without the chainlit UI, running
+up to `--concurrency` agent teams at the same time through the team run scheduler.
+Lessons are saved through the same markdown/PDF pipeline as the app, every finished
+lesson is appended to a checkpoint file so an interrupted batch can be resumed, and
+throughput and per-lesson latency statistics are printed at the end.
+
+Each row needs a `topic` (or `message`) column with the request sent to the team.
+Rows may also carry an `id` (defaults to the row number), a `profile` overriding the
+command line profile, and for the catch-up profile a `file` column with the path of
+a student record that is converted to markdown like an upload in the app.
+
+Usage:
+    python bulk_generate.py topics.csv --profile open-topic --concurrency 4
+    python bulk_generate.py records.jsonl --profile catch-up --checkpoint records.checkpoint.jsonl
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from autogen_agentchat.messages import TextMessage
+from autogen_agentchat.teams import SelectorGroupChat
+from chainlit.context import init_http_context
+
+from agents.catch_up_and_explore_by_AI.catch_up_and_explore_by_AI_agents import (
+    create_catch_up_team,
+)
+from agents.file_processor.condenser import condense_documents
+from agents.file_processor.main import process_file
+from agents.open_topic_class_generation.open_topic_class_generation_agents import (
+    MAX_MESSAGES,
+    create_team,
+)
+from agents.open_topic_class_generation.open_topic_class_generation_agents_grounding_bing import (
+    create_team_grounding_with_bing,
+)
+from agents.tools.grounding_clients import close_grounding_clients
+from agents.tools.html_parse_pool import html_parse_pool
+from agents.tools.image_clients import close_image_clients
+from agents.tools.image_generation_cache import image_generation_cache
+from agents.tools.image_processing import image_process_pool
+from config import (
+    CATCH_UP_AND_EXPLORE_BY_AI_AGENT,
+    OPEN_TOPIC_CLASS_GENERATION_AGENT,
+    OPEN_TOPIC_CLASS_GENERATION_AGENT_GROUNDING_WITH_BING,
+)
+from httpClientPool import close_http_clients
+from lessonOutput import (
+    LessonDraftWriter,
+    finalize_lesson,
+    lesson_file_stem,
+)
+from teamRun import JOB_STATUS_COMPLETED, TeamRunJob, TeamRunScheduler
+
+logger = logging.getLogger("bulk_generate")
+
+# Profile name -> (team name, team factory)
+PROFILES: Dict[str, Tuple[str, Callable[[], SelectorGroupChat]]] = {
+    "open-topic": (OPEN_TOPIC_CLASS_GENERATION_AGENT, create_team),
+    "grounding": (OPEN_TOPIC_CLASS_GENERATION_AGENT_GROUNDING_WITH_BING, create_team_grounding_with_bing),
+    "catch-up": (CATCH_UP_AND_EXPLORE_BY_AI_AGENT, create_catch_up_team),
+}
+
+
+def load_rows(path: str) -> List[Dict[str, Any]]:
+    """
+    Load the lesson requests from a CSV or JSONL file.
+
+    Args:
+        path: Path of the input file; `.jsonl` files are read as JSON lines, anything else as CSV
+
+    Returns:
+        The rows, each with an `id`
+    """
+    rows: List[Dict[str, Any]] = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    rows.append(json.loads(line))
+        else:
+            rows.extend(dict(row) for row in csv.DictReader(f))
+
+    seen: Set[str] = set()
+    for index, row in enumerate(rows, start=1):
+        row_id = str(row.get("id") or f"{index:05d}").strip()
+        if row_id in seen:
+            raise ValueError(f"Duplicate id in {path}: {row_id}")
+        seen.add(row_id)
+        row["id"] = row_id
+    return rows
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """Return the ids of the lessons already completed according to a checkpoint file."""
+    completed: Set[str] = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash; the lesson is simply generated again
+                continue
+            if record.get("status") == JOB_STATUS_COMPLETED:
+                completed.add(record["id"])
+            else:
+                completed.discard(record["id"])
+    return completed
+
+
+def append_checkpoint(path: str, record: Dict[str, Any]) -> None:
+    """Durably append the record of a finished lesson to the checkpoint file."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def build_task(row: Dict[str, Any], profile: str) -> str:
+    """
+    Build the task sent to the team for a row.
+
+    For the catch-up profile, the files listed in the `file` column (separated by `;`)
+    are converted to markdown and condensed the same way as uploads in the app.
+    """
+    task = str(row.get("topic") or row.get("message") or "").strip()
+    if profile != "catch-up" or not row.get("file"):
+        return task
+
+    documents = []
+    for file_path in str(row["file"]).split(";"):
+        file_path = file_path.strip()
+        if not file_path:
+            continue
+        error, content = await asyncio.to_thread(process_file, file_path)
+        if error:
+            raise ValueError(error)
+        documents.append((os.path.basename(file_path), content.markdown))
+    upload = await condense_documents(documents)
+    return f"{task}\n{upload.content}".strip()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Return the nearest-rank percentile of a list of values."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class BulkRunStats:
+    """Throughput and latency statistics of a bulk run."""
+
+    def __init__(self, total: int, skipped: int):
+        self.total = total
+        self.skipped = skipped
+        self.completed = 0
+        self.failed = 0
+        self.latencies: List[float] = []
+        self.queue_waits: List[float] = []
+        self.tokens = 0
+        self._start = time.perf_counter()
+
+    @property
+    def finished(self) -> int:
+        """Return the number of lessons finished in this run, successfully or not."""
+        return self.completed + self.failed
+
+    def record(self, record: Dict[str, Any]) -> None:
+        """Add the record of a finished lesson."""
+        if record["status"] == JOB_STATUS_COMPLETED:
+            self.completed += 1
+            self.latencies.append(record["latency"])
+        else:
+            self.failed += 1
+        if record.get("queue_wait") is not None:
+            self.queue_waits.append(record["queue_wait"])
+        self.tokens += record.get("tokens", 0)
+
+    def summary(self) -> str:
+        """Format the statistics of the run."""
+        elapsed = time.perf_counter() - self._start
+        lines = [
+            f"Lessons: {self.completed} completed, {self.failed} failed, {self.skipped} skipped "
+            f"(from checkpoint), {self.total} total",
+            f"Wall time: {elapsed:.1f}s",
+        ]
+        if elapsed > 0 and self.completed:
+            lines.append(f"Throughput: {self.completed / elapsed * 3600:.1f} lessons/hour")
+        if self.latencies:
+            lines.append(
+                "Latency per lesson: "
+                f"mean {sum(self.latencies) / len(self.latencies):.1f}s, "
+                f"p50 {percentile(self.latencies, 0.5):.1f}s, "
+                f"p90 {percentile(self.latencies, 0.9):.1f}s, "
+                f"max {max(self.latencies):.1f}s"
+            )
+        if self.queue_waits:
+            lines.append(f"Queue wait: mean {sum(self.queue_waits) / len(self.queue_waits):.1f}s")
+        lines.append(f"Tokens: {self.tokens}")
+        return "\n".join(lines)
+
+
+async def generate_lesson(scheduler: TeamRunScheduler, row: Dict[str, Any], profile: str) -> Dict[str, Any]:
+    """
+    Generate, save and describe the lesson of a single row.
+
+    Returns:
+        The checkpoint record of the lesson
+    """
+    profile = row.get("profile") or profile
+    record: Dict[str, Any] = {"id": row["id"], "profile": profile}
+    job: Optional[TeamRunJob] = None
+    try:
+        # A bad row fails on its own instead of stopping the whole batch
+        if profile not in PROFILES:
+            raise ValueError(f"Invalid profile: {profile}. Must be one of: {', '.join(PROFILES)}")
+        team_name, create = PROFILES[profile]
+
+        task = await build_task(row, profile)
+        if not task:
+            raise ValueError("Row has no topic")
+
+        draft = LessonDraftWriter(lesson_file_stem(row["id"]))
+        job = await scheduler.submit(
+            f"bulk:{row['id']}",
+            create(),
+            [TextMessage(content=task, source="user")],
+            team_name,
+            max_messages=MAX_MESSAGES,
+            draft=draft,
+            finalize=finalize_lesson,
+        )
+        await job.wait()
+
+        record.update({
+            "status": job.status,
+            "latency": round(job.finished_at - (job.started_at or job.created_at), 3),
+            "queue_wait": round((job.started_at or job.finished_at) - job.created_at, 3),
+            "tokens": job.total_tokens,
+            "timeline": job.timeline_path,
+        })
+        if draft.exists:
+            record["draft"] = draft.path
+        if job.status != JOB_STATUS_COMPLETED:
+            record["error"] = job.error or job.status
+            return record
+
+        lesson = job.result
+        if lesson is None:
+            record.update({"status": "failed", "error": job.finalize_error or "The team produced no lesson"})
+            return record
+
+        if lesson.report is not None and lesson.report.changed:
+            record["media_removed"] = lesson.report.dead + lesson.report.duplicates
+        record.update({"markdown": lesson.markdown_path, "pdf": lesson.pdf_path})
+        return record
+    except asyncio.CancelledError:
+        if job is not None:
+            await asyncio.shield(scheduler.cancel(job))
+        raise
+    except Exception as e:
+        logger.exception(f"Lesson {row['id']} failed")
+        record.update({"status": "failed", "error": str(e)})
+        return record
+
+
+async def run_bulk(
+    input_path: str,
+    profile: str,
+    concurrency: int,
+    checkpoint_path: str,
+    limit: Optional[int] = None,
+) -> BulkRunStats:
+    """
+    Generate the lessons of an input file, skipping the ones completed in the checkpoint.
+
+    Args:
+        input_path: CSV or JSONL file with one lesson request per row
+        profile: Default profile of the rows ('open-topic', 'grounding' or 'catch-up')
+        concurrency: Maximum number of team runs executing at the same time
+        checkpoint_path: JSONL file recording every finished lesson
+        limit: Optional maximum number of lessons to generate in this run
+
+    Returns:
+        The statistics of the run
+    """
+    # The agents' tools report their progress as chainlit steps; a headless HTTP
+    # context turns those into no-ops instead of failing outside a websocket session.
+    init_http_context()
+
+    rows = load_rows(input_path)
+    completed = load_checkpoint(checkpoint_path)
+    pending = [row for row in rows if row["id"] not in completed]
+    skipped = len(rows) - len(pending)
+    if limit is not None:
+        pending = pending[:limit]
+
+    stats = BulkRunStats(total=len(rows), skipped=skipped)
+    print(f"Generating {len(pending)} lessons with profile '{profile}' and concurrency {concurrency} "
+          f"({skipped} already completed in {checkpoint_path})")
+
+    scheduler = TeamRunScheduler(max_concurrent_runs=concurrency)
+    queue: asyncio.Queue = asyncio.Queue()
+    for row in pending:
+        queue.put_nowait(row)
+
+    async def worker():
+        while True:
+            try:
+                row = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            record = await generate_lesson(scheduler, row, profile)
+            append_checkpoint(checkpoint_path, record)
+            stats.record(record)
+            outcome = record.get("markdown") or record.get("error")
+            latency = f" in {record['latency']:.1f}s" if "latency" in record else ""
+            print(f"[{stats.finished}/{len(pending)}] {row['id']} {record['status']}{latency}: {outcome}")
+
+    # One worker per slot keeps at most `concurrency` teams alive at any time
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(pending)))]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await close_http_clients()
+        await close_image_clients()
+        await close_grounding_clients()
+        html_parse_pool.shutdown()
+        image_process_pool.shutdown()
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate lessons in bulk without the chainlit UI.")
+    parser.add_argument("input", help="CSV or JSONL file with one lesson request per row")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="open-topic",
+                        help="Agent team used for rows without a profile column (default: open-topic)")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("MAX_CONCURRENT_TEAM_RUNS", "4")),
+                        help="Maximum number of team runs executing at the same time")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <input>.checkpoint.jsonl)")
+    parser.add_argument("--limit", type=int, help="Maximum number of lessons to generate in this run")
+    args = parser.parse_args()
+
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    logging.basicConfig(level=logging.WARNING)
+    checkpoint_path = args.checkpoint or f"{os.path.splitext(args.input)[0]}.checkpoint.jsonl"
+
+    start = time.perf_counter()
+    try:
+        stats = asyncio.run(run_bulk(args.input, args.profile, args.concurrency, checkpoint_path, args.limit))
+    except KeyboardInterrupt:
+        print(f"\nInterrupted after {time.perf_counter() - start:.1f}s; rerun the same command to resume "
+              f"from {checkpoint_path}")
+        return
+
+    print()
+    print(stats.summary())
+    if image_generation_cache.hits or image_generation_cache.misses:
+        print(image_generation_cache.summary())
+
+
+if __name__ == "__main__":
+    main()
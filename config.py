@@ -23,6 +23,9 @@ CATCH_UP_AND_EXPLORE_BY_AI_AGENT = "Catch-up And Explore Agent Team"
 
 CURRENT_AGENT_TEAM_NAME = "Current Agent Team Name"
 
+# Name of the agent producing the final lesson markdown in every team
+LESSON_FORMATTER_AGENT = "markdown_content_formator"
+
 AZURE_OPENAI_API_KEY = os.environ.get("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_ENDPOINT = os.environ.get("AZURE_OPENAI_ENDPOINT")
 
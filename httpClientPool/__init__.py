@@ -0,0 +1,29 @@
+"""
+Shared HTTP client infrastructure.
+
+This package provides a process-wide pooled async HTTP client used by every web tool,
+with keep-alive, per-host connection limits, DNS caching and optional HTTP/2, and an
+HTTP-conditional on-disk cache of fetched pages.
+"""
+
+from .httpClientManager import (
+    CachingDnsBackend,
+    HttpClientManager,
+    close_http_clients,
+    http_client_manager,
+)
+from .pageCache import (
+    CachedPage,
+    PageCache,
+    page_cache,
+)
+
+__all__ = [
+    "CachedPage",
+    "CachingDnsBackend",
+    "HttpClientManager",
+    "PageCache",
+    "close_http_clients",
+    "http_client_manager",
+    "page_cache",
+]
@@ -0,0 +1,243 @@
+"""
+Process-wide pooled async HTTP client.
+
+Every web tool used to open a fresh `httpx.AsyncClient` per call, paying a new TCP
+and TLS handshake for every request. The manager keeps one client per event loop
+with keep-alive connections, caps the connections opened to a single host, caches
+DNS lookups, optionally negotiates HTTP/2 and closes everything on shutdown.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpcore
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("http_client_manager")
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_MAX_CONNECTIONS_PER_HOST", "8"))
+HTTP_ENABLE_HTTP2 = os.environ.get("HTTP_ENABLE_HTTP2", "false").lower() == "true"
+HTTP_DNS_CACHE_TTL = float(os.environ.get("HTTP_DNS_CACHE_TTL", "300"))
+# Hosts whose connection slots are remembered; the least recently used ones are dropped beyond it
+HTTP_HOST_SLOT_CACHE_SIZE = int(os.environ.get("HTTP_HOST_SLOT_CACHE_SIZE", "1024"))
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+
+
+class CachingDnsBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend resolving host names through a TTL cache.
+
+    Only the TCP connection is opened to the cached address; TLS still verifies
+    and sends SNI for the original host name, since httpcore passes it to
+    `start_tls` separately.
+    """
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend, ttl: float = HTTP_DNS_CACHE_TTL):
+        self._backend = backend
+        self._ttl = ttl
+        self._cache: Dict[Tuple[str, int], Tuple[List[str], float]] = {}
+
+    async def _resolve(self, host: str, port: int) -> List[str]:
+        key = (host, port)
+        cached = self._cache.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[key] = (addresses, time.monotonic() + self._ttl)
+        return addresses
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None, local_address: Optional[str] = None, socket_options=None):
+        try:
+            addresses = await self._resolve(host, port)
+        except OSError:
+            addresses = [host]
+
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        # Every cached address failed: the records may be stale
+        self._cache.pop((host, port), None)
+        raise error
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+class HttpClientManager:
+    """
+    Owner of the pooled `httpx.AsyncClient` instances of the process.
+
+    A client is bound to the event loop it was created on, so one client is kept per
+    running loop (the chainlit app runs a single loop). Requests made through
+    `request` and `stream` also take a per-host slot, which limits how many
+    connections a burst of tool calls opens to the same site.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections: int = HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        max_connections_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+        http2: bool = HTTP_ENABLE_HTTP2,
+        dns_cache_ttl: float = HTTP_DNS_CACHE_TTL,
+        host_slot_cache_size: int = HTTP_HOST_SLOT_CACHE_SIZE,
+    ):
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._max_connections_per_host = max_connections_per_host
+        self._http2 = http2 and self._http2_available()
+        self._dns_cache_ttl = dns_cache_ttl
+        self._clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._host_slot_cache_size = host_slot_cache_size
+        self._host_slots: "OrderedDict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Semaphore]" = OrderedDict()
+        self._dns_cache_warning_logged = False
+
+    @staticmethod
+    def _http2_available() -> bool:
+        try:
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            logger.warning("HTTP_ENABLE_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+            return False
+
+    def _install_dns_cache(self, transport: httpx.AsyncHTTPTransport) -> None:
+        # httpx has no public hook for the network backend of its transport, so the
+        # backend of the httpcore pool is swapped in place. httpx and httpcore are
+        # pinned in requirements.txt; if their internals change, the client simply
+        # resolves every connection again.
+        pool = getattr(transport, "_pool", None)
+        backend = getattr(pool, "_network_backend", None)
+        if isinstance(pool, httpcore.AsyncConnectionPool) and isinstance(backend, httpcore.AsyncNetworkBackend):
+            pool._network_backend = CachingDnsBackend(backend, ttl=self._dns_cache_ttl)
+        elif not self._dns_cache_warning_logged:
+            self._dns_cache_warning_logged = True
+            logger.warning(
+                f"DNS caching is not supported with httpx {httpx.__version__} and httpcore "
+                f"{httpcore.__version__}; host names are resolved on every connection"
+            )
+
+    def _create_client(self) -> httpx.AsyncClient:
+        transport = httpx.AsyncHTTPTransport(limits=self._limits, http2=self._http2)
+        if self._dns_cache_ttl > 0:
+            self._install_dns_cache(transport)
+        return httpx.AsyncClient(
+            transport=transport,
+            headers=DEFAULT_HEADERS,
+            timeout=httpx.Timeout(10.0),
+        )
+
+    def get_client(self) -> httpx.AsyncClient:
+        """Return the pooled client of the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            # Drop the clients of loops that have been closed, e.g. by asyncio.run
+            for stale_loop in [stale for stale in self._clients if stale.is_closed()]:
+                self._clients.pop(stale_loop, None)
+            for stale_key in [key for key in self._host_slots if key[0].is_closed()]:
+                self._host_slots.pop(stale_key, None)
+            client = self._create_client()
+            self._clients[loop] = client
+        return client
+
+    def _host_slot(self, url: Any) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        host = urlparse(str(url)).netloc.lower()
+        key = (loop, host)
+        slot = self._host_slots.get(key)
+        if slot is None:
+            slot = asyncio.Semaphore(self._max_connections_per_host)
+            self._host_slots[key] = slot
+            # A web search touches many one-off hosts: forget the least recently used
+            # ones, which are idle unless more hosts than this are being fetched at once
+            while len(self._host_slots) > self._host_slot_cache_size:
+                self._host_slots.popitem(last=False)
+        else:
+            self._host_slots.move_to_end(key)
+        return slot
+
+    async def request(self, method: str, url: Any, **kwargs: Any) -> httpx.Response:
+        """
+        Send a request through the pooled client and read the whole response.
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            kwargs: Arguments of `httpx.AsyncClient.request` (headers, params, timeout...)
+
+        Returns:
+            The response
+        """
+        async with self._host_slot(url):
+            return await self.get_client().request(method, url, **kwargs)
+
+    async def get(self, url: Any, **kwargs: Any) -> httpx.Response:
+        """Send a GET request through the pooled client."""
+        return await self.request("GET", url, **kwargs)
+
+    async def head(self, url: Any, **kwargs: Any) -> httpx.Response:
+        """Send a HEAD request through the pooled client."""
+        return await self.request("HEAD", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: Any, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """
+        Send a request through the pooled client and stream the response body.
+
+        The per-host slot is held until the body has been consumed or the context exits.
+        """
+        async with self._host_slot(url):
+            async with self.get_client().stream(method, url, **kwargs) as response:
+                yield response
+
+    async def close(self) -> None:
+        """Close the clients of the process, waiting for their connections to shut down."""
+        clients = list(self._clients.items())
+        self._clients.clear()
+        self._host_slots.clear()
+        current_loop = asyncio.get_running_loop()
+        for loop, client in clients:
+            if loop is current_loop:
+                await client.aclose()
+            elif not loop.is_closed() and loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+
+# Create a singleton instance of the manager shared by all tools
+http_client_manager = HttpClientManager()
+
+
+async def close_http_clients() -> None:
+    """Gracefully close the pooled HTTP clients, e.g. on application shutdown."""
+    await http_client_manager.close()
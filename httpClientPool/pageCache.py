@@ -0,0 +1,529 @@
+"""
+HTTP-conditional on-disk cache of fetched web pages.
+
+Lessons keep fetching the same Baidu Baike and Wikipedia pages. Every page is stored
+gzip-compressed together with its validators (ETag, Last-Modified), its freshness
+lifetime derived from Cache-Control/Expires, and the markdown converted from it.
+A fresh page costs no request at all; a stale one is revalidated with a conditional
+GET, and a 304 reuses both the stored bytes and the converted markdown.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import codecs
+import os
+import re
+import shutil
+import tempfile
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+from .httpClientManager import http_client_manager
+
+load_dotenv()
+
+logger = logging.getLogger("page_cache")
+
+PAGE_CACHE_DIR = os.environ.get("PAGE_CACHE_DIR", ".cache/pages")
+PAGE_CACHE_MAX_MB = float(os.environ.get("PAGE_CACHE_MAX_MB", "200"))
+# Upper bound of the heuristic lifetime of pages that only send Last-Modified
+PAGE_CACHE_HEURISTIC_TTL = float(os.environ.get("PAGE_CACHE_HEURISTIC_TTL", "86400"))
+# Eviction frees space down to this fraction of the limit, so the next scan is only due
+# after the cache has grown again by the remaining fraction
+PAGE_CACHE_PRUNE_TARGET = 0.9
+
+# Byte budgets of streamed downloads; HTML beyond the budget is truncated, documents are skipped
+PAGE_FETCH_MAX_BYTES = int(float(os.environ.get("PAGE_FETCH_MAX_MB", "5")) * 1024 * 1024)
+PAGE_FETCH_MAX_DOCUMENT_BYTES = int(float(os.environ.get("PAGE_FETCH_MAX_DOCUMENT_MB", "20")) * 1024 * 1024)
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+TEXT_CONTENT_TYPES = ("text/plain", "text/markdown", "text/x-markdown")
+DOCUMENT_CONTENT_TYPES = {
+    "application/pdf": ".pdf",
+    "application/msword": ".doc",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
+    "application/vnd.ms-powerpoint": ".ppt",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": ".pptx",
+}
+# Content types that say nothing about the body; the first bytes decide instead
+GENERIC_CONTENT_TYPES = ("", "application/octet-stream", "binary/octet-stream", "application/download")
+
+# GB2312 and GBK pages are decoded with their superset, so that extended characters survive
+CHARSET_ALIASES = {"gb2312": "gb18030", "gbk": "gb18030", "x-gbk": "gb18030", "gb_2312-80": "gb18030", "cp936": "gb18030"}
+META_CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_\-]+)""", re.IGNORECASE)
+
+META_FILE = "meta.json"
+BODY_FILE = "body.gz"
+
+
+class CachedPage:
+    """A page body with the HTTP metadata needed to reuse and revalidate it."""
+
+    def __init__(self, url: str, body: bytes, meta: Dict, path: Optional[str] = None):
+        self.url = url
+        self.body = body
+        self.meta = meta
+        self.path = path
+
+    @property
+    def text(self) -> str:
+        """Return the body decoded with the charset detected when it was fetched."""
+        return self.body.decode(self.meta.get("encoding") or "utf-8", errors="replace")
+
+    @property
+    def kind(self) -> str:
+        """Return the content kind: 'html', 'text', 'document' or 'other'."""
+        return self.meta.get("kind") or content_kind(self.meta.get("content_type", "")) or sniff_kind(self.body)
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.meta.get("truncated"))
+
+    @property
+    def skipped(self) -> Optional[str]:
+        """Return why the body was not downloaded, if it was not."""
+        return self.meta.get("skipped")
+
+    @property
+    def body_hash(self) -> str:
+        return self.meta.get("body_hash", "")
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.meta.get("expires_at", 0) > time.time()
+
+
+def content_kind(content_type: str) -> Optional[str]:
+    """
+    Classify a Content-Type header.
+
+    Returns:
+        'html', 'text', 'document' or 'other', or None when the header is missing or
+        too generic and the body has to be sniffed
+    """
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in GENERIC_CONTENT_TYPES:
+        return None
+    if media_type in HTML_CONTENT_TYPES:
+        return "html"
+    if media_type in TEXT_CONTENT_TYPES:
+        return "text"
+    if media_type in DOCUMENT_CONTENT_TYPES:
+        return "document"
+    return "other"
+
+
+def sniff_kind(head: bytes) -> str:
+    """Classify a body from its first bytes."""
+    start = head[:1024].lstrip().lower()
+    if start.startswith(b"%pdf-"):
+        return "document"
+    if start.startswith((b"pk\x03\x04", b"\xd0\xcf\x11\xe0")):
+        # Office Open XML (zip) or legacy Office (OLE) documents
+        return "document"
+    if start.startswith((b"<!doctype html", b"<html", b"<?xml", b"<head", b"<body", b"<!--")) or b"<html" in start:
+        return "html"
+    if b"\x00" in head[:1024]:
+        return "other"
+    return "text"
+
+
+def _normalize_charset(charset: str) -> Optional[str]:
+    charset = CHARSET_ALIASES.get(charset.strip().strip("'\"").lower(), charset.strip().strip("'\"").lower())
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return None
+
+
+def detect_charset(content_type: str, body: bytes) -> str:
+    """
+    Detect the charset of an HTML or text body.
+
+    The Content-Type charset wins, then a byte order mark, then a `<meta>` charset
+    declaration; otherwise the body is tried as UTF-8 and falls back to GB18030,
+    which covers the GB2312/GBK pages of Chinese sites.
+    """
+    for part in content_type.split(";")[1:]:
+        name, _, value = part.strip().partition("=")
+        if name.lower() == "charset" and value:
+            charset = _normalize_charset(value)
+            if charset:
+                return charset
+
+    if body.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if body.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+
+    match = META_CHARSET_PATTERN.search(body[:4096])
+    if match:
+        charset = _normalize_charset(match.group(1).decode("ascii", errors="ignore"))
+        if charset:
+            return charset
+
+    try:
+        body.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # A body truncated at the byte budget may end in the middle of a character
+        if e.start >= len(body) - 3 and e.reason == "unexpected end of data":
+            return "utf-8"
+    return "gb18030"
+
+
+def _freshness(headers: httpx.Headers, now: float) -> Tuple[bool, float]:
+    """
+    Derive whether a response may be stored and until when it is fresh.
+
+    Returns:
+        (storable, expires_at); an expires_at in the past means "revalidate before use"
+    """
+    directives = {}
+    for part in headers.get("cache-control", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip().strip('"')
+
+    if "no-store" in directives:
+        return False, 0.0
+    if "no-cache" in directives:
+        return True, 0.0
+
+    age = 0.0
+    try:
+        age = float(headers.get("age", 0))
+    except ValueError:
+        pass
+
+    if "max-age" in directives:
+        try:
+            return True, now + float(directives["max-age"]) - age
+        except ValueError:
+            return True, 0.0
+
+    if "expires" in headers:
+        try:
+            expires = parsedate_to_datetime(headers["expires"]).timestamp()
+            date = parsedate_to_datetime(headers["date"]).timestamp() if "date" in headers else now
+            return True, now + (expires - date)
+        except (TypeError, ValueError):
+            # An invalid Expires header means already expired
+            return True, 0.0
+
+    if "last-modified" in headers:
+        # Heuristic freshness: 10% of the time since the last modification
+        try:
+            last_modified = parsedate_to_datetime(headers["last-modified"]).timestamp()
+            return True, now + min(max(0.0, (now - last_modified) * 0.1), PAGE_CACHE_HEURISTIC_TTL)
+        except (TypeError, ValueError):
+            pass
+
+    return True, 0.0
+
+
+class PageCache:
+    """
+    Compressed page store with conditional revalidation and size-based eviction.
+
+    Each URL owns a directory holding its metadata, its gzip-compressed body and one
+    gzip-compressed markdown file per conversion variant. Directories are evicted
+    least recently used first once the cache exceeds `max_mb`.
+
+    The size of the cache is only measured by scanning it on the first store and
+    whenever the bytes written since the last scan may have pushed it over the
+    limit, not on every store.
+    """
+
+    def __init__(self, directory: str = PAGE_CACHE_DIR, max_mb: float = PAGE_CACHE_MAX_MB):
+        self._directory = directory
+        self._max_bytes = max_mb * 1024 * 1024
+        # Size measured by the last scan plus what this process wrote since; other
+        # workers sharing the directory are accounted for by the next scan
+        self._estimated_bytes: Optional[float] = None
+        self.fresh_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def _entry_dir(self, url: str) -> str:
+        return os.path.join(self._directory, hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def _load(self, url: str) -> Optional[CachedPage]:
+        path = self._entry_dir(url)
+        try:
+            with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with gzip.open(os.path.join(path, BODY_FILE), "rb") as f:
+                body = f.read()
+        except (OSError, ValueError, EOFError):
+            return None
+        if hashlib.sha256(body).hexdigest() != meta.get("body_hash"):
+            # The body and the metadata were written by different fetches
+            return None
+        return CachedPage(url, body, meta, path)
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> int:
+        # mkstemp gives each writer its own file, also across the workers sharing the cache
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return len(data)
+
+    def _write_meta(self, page: CachedPage) -> int:
+        return self._write_atomic(
+            os.path.join(page.path, META_FILE),
+            json.dumps(page.meta, ensure_ascii=False).encode("utf-8"),
+        )
+
+    def _store(self, page: CachedPage, body_changed: bool) -> None:
+        os.makedirs(page.path, exist_ok=True)
+        written = 0
+        if body_changed:
+            # Markdown converted from a previous body is stale
+            for name in os.listdir(page.path):
+                if name.endswith(".md.gz"):
+                    os.remove(os.path.join(page.path, name))
+            written += self._write_atomic(os.path.join(page.path, BODY_FILE), gzip.compress(page.body, compresslevel=6))
+        written += self._write_meta(page)
+        self._account(written)
+
+    def _account(self, written: int) -> None:
+        # Replaced files are counted again, which only brings the next scan forward
+        if self._estimated_bytes is not None:
+            self._estimated_bytes += written
+        if self._estimated_bytes is None or self._estimated_bytes > self._max_bytes:
+            self._prune()
+
+    def _prune(self) -> None:
+        """Scan the cache and evict the least recently used pages once it exceeds its size limit."""
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self._directory):
+            if not entry.is_dir():
+                continue
+            size = 0
+            mtime = 0.0
+            try:
+                for child in os.scandir(entry.path):
+                    stat = child.stat()
+                    size += stat.st_size
+                    if child.name == META_FILE:
+                        mtime = stat.st_mtime
+            except FileNotFoundError:
+                # Evicted by another worker meanwhile
+                continue
+            entries.append((mtime, size, entry.path))
+            total_size += size
+
+        if total_size > self._max_bytes:
+            target = self._max_bytes * PAGE_CACHE_PRUNE_TARGET
+            for _, size, path in sorted(entries):
+                if total_size <= target:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total_size -= size
+        self._estimated_bytes = total_size
+
+    def _touch(self, page: CachedPage) -> None:
+        # Refresh the modification time so that pruning evicts the least recently used pages
+        try:
+            os.utime(os.path.join(page.path, META_FILE))
+        except OSError:
+            pass
+
+    async def _download(self, response: httpx.Response, max_bytes: int, max_document_bytes: int) -> Tuple[bytes, Dict]:
+        """
+        Stream a response body within the byte budget of its content kind.
+
+        The content kind is decided from the Content-Type header, or by sniffing the
+        first bytes when the header is missing or generic, before the body is read.
+        """
+        content_type = response.headers.get("content-type", "")
+        kind = content_kind(content_type)
+        content_length = None
+        try:
+            content_length = int(response.headers["content-length"])
+        except (KeyError, ValueError):
+            pass
+
+        info = {"kind": kind, "truncated": False, "skipped": None}
+        if kind == "other":
+            info["skipped"] = f"unsupported content type {content_type.split(';')[0].strip()}"
+            return b"", info
+        if kind == "document" and content_length is not None and content_length > max_document_bytes:
+            info["skipped"] = f"document of {content_length} bytes exceeds the {max_document_bytes} byte budget"
+            return b"", info
+
+        chunks = []
+        size = 0
+        limit = max_document_bytes if kind == "document" else max_bytes
+        async for chunk in response.aiter_bytes():
+            if kind is None:
+                # No usable Content-Type: decide from the first bytes
+                kind = info["kind"] = sniff_kind(chunk)
+                if kind == "other":
+                    info["skipped"] = "unrecognized binary content"
+                    return b"", info
+                limit = max_document_bytes if kind == "document" else max_bytes
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= limit:
+                break
+
+        body = b"".join(chunks)
+        if size > limit or (size == limit and content_length != size):
+            body = body[:limit]
+            if kind == "document":
+                # A truncated document cannot be converted
+                info["skipped"] = f"document exceeds the {limit} byte budget"
+                return b"", info
+            info["truncated"] = True
+        info["kind"] = kind or "html"
+        return body, info
+
+    async def fetch(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 10,
+        max_bytes: int = PAGE_FETCH_MAX_BYTES,
+        max_document_bytes: int = PAGE_FETCH_MAX_DOCUMENT_BYTES,
+    ) -> CachedPage:
+        """
+        Return the page at `url`, from the cache when it is fresh or still valid.
+
+        The body is streamed and reading stops at the byte budget of its kind: pages
+        beyond `max_bytes` are truncated, documents beyond `max_document_bytes` and
+        unsupported content types are skipped without downloading their body.
+
+        Args:
+            url: URL of the page
+            headers: Optional HTTP headers for the request
+            timeout: Request timeout in seconds
+            max_bytes: Byte budget of HTML and text pages
+            max_document_bytes: Byte budget of documents (PDF, Word, PowerPoint)
+
+        Returns:
+            The page
+
+        Raises:
+            httpx.HTTPStatusError: If the server answers with an error status
+            httpx.RequestError: If the request fails
+        """
+        cached = await asyncio.to_thread(self._load, url)
+        if cached is not None and cached.truncated and cached.meta.get("max_bytes", 0) < max_bytes:
+            # The stored body was cut shorter than this caller wants
+            cached = None
+        if cached is not None and cached.is_fresh:
+            self.fresh_hits += 1
+            await asyncio.to_thread(self._touch, cached)
+            return cached
+
+        request_headers = dict(headers or {})
+        if cached is not None:
+            if cached.meta.get("etag"):
+                request_headers["If-None-Match"] = cached.meta["etag"]
+            if cached.meta.get("last_modified"):
+                request_headers["If-Modified-Since"] = cached.meta["last_modified"]
+
+        async with http_client_manager.stream("GET", url, headers=request_headers, timeout=timeout) as response:
+            now = time.time()
+
+            if response.status_code == 304 and cached is not None:
+                self.revalidated += 1
+                storable, expires_at = _freshness(response.headers, now)
+                cached.meta["expires_at"] = expires_at
+                cached.meta["etag"] = response.headers.get("etag", cached.meta.get("etag"))
+                cached.meta["last_modified"] = response.headers.get("last-modified", cached.meta.get("last_modified"))
+                if storable:
+                    try:
+                        await asyncio.to_thread(self._store, cached, False)
+                    except OSError as e:
+                        logger.warning(f"Failed to refresh cached page {url}: {e}")
+                return cached
+
+            response.raise_for_status()
+            self.misses += 1
+
+            body, info = await self._download(response, max_bytes, max_document_bytes)
+            storable, expires_at = _freshness(response.headers, now)
+            content_type = response.headers.get("content-type", "")
+            meta = {
+                "url": str(response.url),
+                "status": response.status_code,
+                "content_type": content_type,
+                "encoding": detect_charset(content_type, body) if info["kind"] in ("html", "text") else None,
+                "kind": info["kind"],
+                "truncated": info["truncated"],
+                "skipped": info["skipped"],
+                "max_bytes": max_bytes,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "expires_at": expires_at,
+                "fetched_at": now,
+                "body_hash": hashlib.sha256(body).hexdigest(),
+            }
+
+        if not storable:
+            return CachedPage(url, body, meta)
+
+        page = CachedPage(url, body, meta, self._entry_dir(url))
+        # An unchanged body (e.g. a page without validators) keeps its converted markdown
+        body_changed = cached is None or cached.body_hash != page.body_hash
+        try:
+            await asyncio.to_thread(self._store, page, body_changed)
+        except OSError as e:
+            logger.warning(f"Failed to cache page {url}: {e}")
+            page.path = None
+        return page
+
+    def _markdown_path(self, page: CachedPage, variant: str) -> str:
+        return os.path.join(page.path, f"{variant}.md.gz")
+
+    def _read_markdown(self, page: CachedPage, variant: str) -> Optional[str]:
+        try:
+            with gzip.open(self._markdown_path(page, variant), "rt", encoding="utf-8") as f:
+                return f.read()
+        except (OSError, EOFError):
+            return None
+
+    def _write_markdown(self, page: CachedPage, variant: str, markdown: str) -> None:
+        self._account(self._write_atomic(
+            self._markdown_path(page, variant), gzip.compress(markdown.encode("utf-8"), compresslevel=6),
+        ))
+
+    async def get_markdown(self, page: CachedPage, variant: str) -> Optional[str]:
+        """Return the markdown converted from the stored page body for a conversion variant."""
+        if page.path is None:
+            return None
+        return await asyncio.to_thread(self._read_markdown, page, variant)
+
+    async def set_markdown(self, page: CachedPage, variant: str, markdown: str) -> None:
+        """Store the markdown converted from the page body, if the page itself is cached."""
+        if page.path is None:
+            return
+        try:
+            await asyncio.to_thread(self._write_markdown, page, variant, markdown)
+        except OSError as e:
+            logger.warning(f"Failed to cache markdown for {page.url}: {e}")
+
+    def metrics(self) -> Dict[str, int]:
+        """Return the counters of the cache since the process started."""
+        return {"fresh_hits": self.fresh_hits, "revalidated": self.revalidated, "misses": self.misses}
+
+
+# Create a singleton instance of the cache shared by all tools
+page_cache = PageCache()
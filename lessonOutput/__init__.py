@@ -0,0 +1,69 @@
+"""
+Lesson output pipeline.
+
+This package extracts the final lesson of a team run and saves it as markdown and
+PDF, for both the chainlit app and the headless bulk runner, persists the lesson
+as a crash-safe draft while it is being generated, formats it deterministically
+at the end of the team run, and validates its media links and saves it once
+when the run completes.
+"""
+
+from .lessonDraft import (
+    LessonDraftWriter,
+    read_draft,
+    recover_drafts,
+)
+
+from .lessonFinalizer import (
+    SavedLesson,
+    finalize_lesson,
+)
+
+from .lessonFormatter import (
+    LESSON_FORMATTER_MODE,
+    LessonFormatterAgent,
+    format_lesson_markdown,
+)
+
+from .lessonOutput import (
+    extract_final_content,
+    lesson_file_stem,
+    md_to_pdf,
+    save_lesson,
+    strip_terminate,
+)
+
+from .mediaValidation import (
+    MEDIA_CHECK_TOOLS,
+    MEDIA_VALIDATION_MODE,
+    PROMPT_MEDIA_CHECK,
+    MediaValidationReport,
+    extract_links,
+    outside_code_blocks,
+    sub_links,
+    validate_media_links,
+)
+
+__all__ = [
+    "LESSON_FORMATTER_MODE",
+    "LessonDraftWriter",
+    "LessonFormatterAgent",
+    "MEDIA_CHECK_TOOLS",
+    "MEDIA_VALIDATION_MODE",
+    "MediaValidationReport",
+    "PROMPT_MEDIA_CHECK",
+    "SavedLesson",
+    "extract_final_content",
+    "extract_links",
+    "finalize_lesson",
+    "format_lesson_markdown",
+    "lesson_file_stem",
+    "md_to_pdf",
+    "outside_code_blocks",
+    "read_draft",
+    "recover_drafts",
+    "save_lesson",
+    "strip_terminate",
+    "sub_links",
+    "validate_media_links",
+]
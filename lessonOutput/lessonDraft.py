@@ -0,0 +1,172 @@
+"""
+Crash-safe drafts of lessons being generated.
+
+The output of the formatter agent is appended to a partial markdown file while it
+streams, with a periodic fsync, so that a lesson survives a crash or a dropped
+session. Once the final lesson has been saved the draft is discarded; drafts left
+behind by an interrupted run can be turned into regular lesson files with:
+
+    python -m lessonOutput.lessonDraft
+"""
+
+import glob
+import logging
+import os
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+
+from autogen_agentchat.messages import BaseChatMessage, ModelClientStreamingChunkEvent
+from dotenv import load_dotenv
+
+from config import LESSON_FORMATTER_AGENT
+
+from .lessonOutput import lesson_file_stem, save_lesson, strip_terminate
+
+load_dotenv()
+
+logger = logging.getLogger("lesson_draft")
+
+DRAFT_DIR = os.environ.get("LESSON_DRAFT_DIR", "public/md/drafts")
+DRAFT_FSYNC_INTERVAL = float(os.environ.get("LESSON_DRAFT_FSYNC_SECONDS", "2"))
+
+DRAFT_SUFFIX = ".partial.md"
+
+# Separates the turns of the formatter in a draft; only the last turn is recovered
+TURN_MARKER = "\n\n<!-- lesson-draft-turn -->\n\n"
+
+
+class LessonDraftWriter:
+    """
+    Append-only writer persisting the formatter output of a team run as it streams.
+
+    Chunks are flushed to the OS immediately and fsynced at most every
+    `fsync_interval` seconds, which bounds both the data lost on a power failure
+    and the cost of syncing on every token.
+    """
+
+    def __init__(
+        self,
+        file_stem: Optional[str] = None,
+        sources: Sequence[str] = (LESSON_FORMATTER_AGENT,),
+        fsync_interval: float = DRAFT_FSYNC_INTERVAL,
+    ):
+        self.file_stem = file_stem or lesson_file_stem()
+        self.path = os.path.join(DRAFT_DIR, f"{self.file_stem}{DRAFT_SUFFIX}")
+        self._sources = set(sources)
+        self._fsync_interval = fsync_interval
+        self._file = None
+        self._last_fsync = 0.0
+        self._in_turn = False
+        self._closed = False
+
+    @property
+    def exists(self) -> bool:
+        """Return whether anything has been written to the draft."""
+        return os.path.exists(self.path)
+
+    def _open(self) -> None:
+        os.makedirs(DRAFT_DIR, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._last_fsync = time.monotonic()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+
+    def write(self, text: str) -> None:
+        """Append streamed text to the draft."""
+        if not text or self._closed:
+            return
+        if self._file is None:
+            self._open()
+        self._file.write(text)
+        self._file.flush()
+        if time.monotonic() - self._last_fsync >= self._fsync_interval:
+            self._sync()
+
+    def observe(self, event: Any) -> None:
+        """
+        Update the draft with an event emitted by `team.run_stream`.
+
+        Args:
+            event: The event or message produced by the team
+        """
+        if getattr(event, "source", None) not in self._sources:
+            return
+        if isinstance(event, ModelClientStreamingChunkEvent):
+            if not self._in_turn:
+                self._in_turn = True
+                if self._file is not None or self.exists:
+                    self.write(TURN_MARKER)
+            self.write(event.content if isinstance(event.content, str) else str(event.content))
+        elif isinstance(event, BaseChatMessage):
+            # The formatter's turn is complete: make it durable right away
+            self._in_turn = False
+            if self._file is not None:
+                self._sync()
+
+    def close(self) -> None:
+        """Sync and close the draft file, keeping it on disk."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._file is not None:
+            try:
+                self._sync()
+            finally:
+                self._file.close()
+                self._file = None
+
+    def discard(self) -> None:
+        """Close and delete the draft once the final lesson has been saved."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def read_draft(path: str) -> str:
+    """
+    Read the lesson content of a draft file.
+
+    Args:
+        path: Path of the partial markdown file
+
+    Returns:
+        The last formatter turn of the draft, without the TERMINATE signal
+    """
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        content = f.read()
+    return strip_terminate(content.split(TURN_MARKER)[-1].strip())
+
+
+def recover_drafts(directory: str = DRAFT_DIR) -> List[Tuple[str, str, str]]:
+    """
+    Save the drafts left behind by interrupted runs as regular lesson files.
+
+    Args:
+        directory: Directory containing the partial markdown files
+
+    Returns:
+        The recovered drafts as (draft path, markdown path, PDF path) tuples
+    """
+    recovered = []
+    for path in sorted(glob.glob(os.path.join(directory, f"*{DRAFT_SUFFIX}"))):
+        content = read_draft(path)
+        if not content:
+            os.remove(path)
+            continue
+        file_stem = f"{os.path.basename(path)[:-len(DRAFT_SUFFIX)]}_recovered"
+        md_file, pdf_file = save_lesson(content, file_stem)
+        os.remove(path)
+        recovered.append((path, md_file, pdf_file))
+    return recovered
+
+
+if __name__ == "__main__":
+    results = recover_drafts()
+    for draft_path, md_file, pdf_file in results:
+        print(f"Recovered {draft_path} -> {md_file}, {pdf_file}")
+    print(f"Recovered {len(results)} lesson drafts from {DRAFT_DIR}")
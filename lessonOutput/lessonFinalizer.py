@@ -0,0 +1,67 @@
+"""
+Completion step of a lesson team run.
+
+`finalize_lesson` is passed to `TeamRunScheduler.submit` and runs once when the
+team finishes, before the job is marked completed. It validates the media links
+of the final lesson, saves it and discards the draft, so the lesson is saved
+exactly once however many renderers follow the run, including none.
+"""
+
+import asyncio
+import logging
+from typing import Any, Optional
+
+from autogen_agentchat.base import TaskResult
+
+from .lessonOutput import extract_final_content, save_lesson
+from .mediaValidation import MediaValidationReport, validate_media_links
+
+logger = logging.getLogger("lesson_finalizer")
+
+
+class SavedLesson:
+    """The validated and saved lesson of a team run."""
+
+    def __init__(
+        self,
+        content: str,
+        markdown_path: str,
+        pdf_path: str,
+        report: Optional[MediaValidationReport] = None,
+    ):
+        self.content = content
+        self.markdown_path = markdown_path
+        self.pdf_path = pdf_path
+        self.report = report
+
+
+async def finalize_lesson(job: Any) -> Optional[SavedLesson]:
+    """
+    Validate the media links of the final lesson of a job and save it.
+
+    Args:
+        job: The finished `TeamRunJob`
+
+    Returns:
+        The saved lesson, or None if the team produced no lesson
+    """
+    content = ""
+    for event in job.events:
+        if isinstance(event, TaskResult):
+            content = extract_final_content(event)
+    if not content:
+        return None
+
+    # Check every image and video link once, without spending model turns on it
+    report = None
+    try:
+        report = await validate_media_links(content)
+        content = report.content
+    except Exception as e:
+        logger.warning(f"Could not validate the media links of run {job.job_id}: {str(e)}")
+
+    file_stem = job.draft.file_stem if job.draft is not None else None
+    md_file, pdf_file = await asyncio.to_thread(save_lesson, content, file_stem)
+    if job.draft is not None:
+        job.draft.discard()
+    return SavedLesson(content, md_file, pdf_file, report=report)
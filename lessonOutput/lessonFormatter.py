@@ -0,0 +1,232 @@
+"""
+Deterministic final formatting of a lesson.
+
+Every team used to end with an LLM agent re-streaming the whole lesson just to strip
+the query strings of image and video URLs, turn `![video](...)` embeds into plain
+links and append TERMINATE. The same transforms are applied here on the markdown
+syntax tree in milliseconds, by an agent that takes the formatter's place in the
+teams under the same name.
+"""
+
+import logging
+import os
+import re
+from typing import AsyncGenerator, List, Optional, Sequence, Union
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import (
+    BaseAgentEvent,
+    BaseChatMessage,
+    ModelClientStreamingChunkEvent,
+    TextMessage,
+)
+from autogen_core import CancellationToken
+from dotenv import load_dotenv
+
+from .lessonOutput import strip_terminate
+from .mediaValidation import outside_code_blocks, sub_links
+
+try:
+    from markdown_it import MarkdownIt
+except ImportError:  # pragma: no cover - optional dependency
+    MarkdownIt = None
+
+load_dotenv()
+
+logger = logging.getLogger("lesson_formatter")
+
+# Final stage of the teams: deterministic (this module) | llm (the former formatter agent)
+LESSON_FORMATTER_MODE = os.environ.get("LESSON_FORMATTER_MODE", "deterministic").lower()
+
+VIDEO_HOSTS = ("youtube.com", "youtu.be", "bilibili.com", "b23.tv", "v.qq.com", "youku.com", "ixigua.com", "douyin.com")
+VIDEO_EXTENSIONS = (".mp4", ".webm", ".mov", ".m3u8")
+
+# A model's preamble before the first heading ("以下是最终版本的课程内容：") is dropped
+MAX_PREAMBLE_CHARS = 200
+
+WRAPPING_FENCE_PATTERN = re.compile(r"^\s*(```|~~~)\s*(markdown|md)?\s*$", re.IGNORECASE)
+INLINE_CODE_PATTERN = re.compile(r"(`+)(?:(?!\1).)+?\1")
+
+_parser = MarkdownIt("commonmark").enable("table") if MarkdownIt is not None else None
+
+
+def strip_query(url: str) -> str:
+    """
+    Remove the query string and fragment of a media URL.
+
+    YouTube watch links only identify their video through the `v` parameter, which
+    is kept.
+    """
+    parsed = urlparse(url)
+    query = ""
+    if parsed.path.rstrip("/") == "/watch":
+        query = urlencode([(key, value) for key, value in parse_qsl(parsed.query) if key == "v"])
+    return parsed._replace(query=query, fragment="").geturl()
+
+
+def is_video_link(text: str, url: str) -> bool:
+    """Return whether a link, by its text or its URL, points at a video."""
+    if "视频" in text or "video" in text.lower():
+        return True
+    parsed = urlparse(url)
+    host = parsed.netloc.lower().split(":")[0]
+    if any(host == video_host or host.endswith("." + video_host) for video_host in VIDEO_HOSTS):
+        return True
+    return parsed.path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def _unwrap_fence(markdown: str) -> str:
+    """Remove a ```markdown fence wrapped around the whole document."""
+    lines = markdown.strip().split("\n")
+    if len(lines) >= 2 and WRAPPING_FENCE_PATTERN.match(lines[0]) and lines[-1].strip() in ("```", "~~~"):
+        return "\n".join(lines[1:-1])
+    return markdown
+
+
+def _parse(markdown: str) -> Optional[list]:
+    if _parser is None:
+        return None
+    try:
+        return _parser.parse(markdown)
+    except Exception as e:
+        logger.warning(f"Could not parse the lesson markdown: {e}")
+        return None
+
+
+def _rewritable_lines(markdown: str, tokens: Optional[list]) -> List[bool]:
+    """Return, for each line, whether it holds markdown text rather than code or raw HTML."""
+    if tokens is None:
+        return outside_code_blocks(markdown)
+    rewritable = [True] * len(markdown.split("\n"))
+    for token in tokens:
+        if token.type in ("fence", "code_block", "html_block") and token.map:
+            start, end = token.map
+            for line in range(start, min(end, len(rewritable))):
+                rewritable[line] = False
+    return rewritable
+
+
+def _drop_preamble(lines: List[str], tokens: Optional[list]) -> List[str]:
+    """Drop a single short paragraph preceding the first heading of the lesson."""
+    if not tokens:
+        return lines
+    heading = next((index for index, token in enumerate(tokens) if token.type == "heading_open"), None)
+    if heading is None or heading == 0:
+        return lines
+    before = tokens[:heading]
+    if [token.type for token in before] != ["paragraph_open", "inline", "paragraph_close"]:
+        return lines
+    paragraph = before[1]
+    if len(paragraph.content) > MAX_PREAMBLE_CHARS or "](" in paragraph.content:
+        return lines
+    return lines[tokens[heading].map[0]:]
+
+
+def _format_line(line: str) -> str:
+    # Links inside inline code are left alone
+    code_spans = []
+
+    def mask(match: "re.Match") -> str:
+        code_spans.append(match.group(0))
+        return f"\x00{len(code_spans) - 1}\x00"
+
+    def replace(match: "re.Match") -> str:
+        is_image, text, url = match.group(1) == "!", match.group(2), match.group(3)
+        is_video = is_video_link(text, url)
+        if not is_image and not is_video:
+            return match.group(0)
+        formatted = match.group(0).replace(url, strip_query(url), 1)
+        # A video cannot be embedded as an image: keep it as a link
+        if is_image and is_video:
+            formatted = formatted[1:]
+        return formatted
+
+    def replace_thumbnail(match: "re.Match") -> str:
+        # The thumbnail stays an image even when it stands for a video
+        image, thumbnail_url, url = match.group(1), match.group(3), match.group(4)
+        formatted = match.group(0).replace(image, image.replace(thumbnail_url, strip_query(thumbnail_url), 1), 1)
+        head, _, tail = formatted.rpartition(url)
+        return head + strip_query(url) + tail
+
+    masked = INLINE_CODE_PATTERN.sub(mask, line)
+    formatted = sub_links(masked, replace, replace_thumbnail)
+    return re.sub(r"\x00(\d+)\x00", lambda match: code_spans[int(match.group(1))], formatted)
+
+
+def format_lesson_markdown(markdown: str) -> str:
+    """
+    Apply the final formatting to a compiled lesson.
+
+    Image and video URLs lose their query strings, `![video](...)` embeds become
+    plain links, and a ```markdown fence or a short preamble around the lesson is
+    removed. Code blocks and inline code are left untouched.
+
+    Args:
+        markdown: The lesson compiled by the team
+
+    Returns:
+        The formatted lesson, without the TERMINATE signal
+    """
+    markdown = _unwrap_fence(strip_terminate(markdown).strip())
+    tokens = _parse(markdown)
+    lines = markdown.split("\n")
+    lines = [
+        _format_line(line) if rewritable else line
+        for line, rewritable in zip(lines, _rewritable_lines(markdown, tokens))
+    ]
+    return "\n".join(_drop_preamble(lines, tokens)).strip()
+
+
+class LessonFormatterAgent(BaseChatAgent):
+    """
+    Final stage of the lesson teams, formatting the compiled lesson without a model call.
+
+    The agent answers with the formatted lesson of the last text message of
+    `content_source` (or of any other agent if it has not spoken) followed by
+    TERMINATE. The lesson is also emitted as a single streaming chunk, so the chainlit
+    app and the draft writer see it exactly as they saw the output of the former
+    LLM formatter.
+    """
+
+    def __init__(self, name: str, description: str, content_source: Optional[str] = None):
+        super().__init__(name=name, description=description)
+        self._content_source = content_source
+        self._lesson: Optional[str] = None
+        self._fallback: Optional[str] = None
+
+    @property
+    def produced_message_types(self) -> Sequence[type[BaseChatMessage]]:
+        return (TextMessage,)
+
+    def _observe(self, messages: Sequence[BaseChatMessage]) -> None:
+        for message in messages:
+            # Tool call summaries and the formatter's own turns are not lessons
+            if not isinstance(message, TextMessage) or message.source == self.name:
+                continue
+            if self._content_source is None or message.source == self._content_source:
+                self._lesson = message.content
+            else:
+                self._fallback = message.content
+
+    async def on_messages(self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken) -> Response:
+        response = None
+        async for item in self.on_messages_stream(messages, cancellation_token):
+            if isinstance(item, Response):
+                response = item
+        return response
+
+    async def on_messages_stream(
+        self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken
+    ) -> AsyncGenerator[Union[BaseAgentEvent, BaseChatMessage, Response], None]:
+        self._observe(messages)
+        lesson = self._lesson if self._lesson is not None else self._fallback
+        content = format_lesson_markdown(lesson) if lesson else ""
+        content = f"{content}\nTERMINATE" if content else "TERMINATE"
+        yield ModelClientStreamingChunkEvent(content=content, source=self.name)
+        yield Response(chat_message=TextMessage(content=content, source=self.name))
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        self._lesson = None
+        self._fallback = None
@@ -0,0 +1,214 @@
+"""
+Output pipeline for generated lessons.
+
+The chainlit app and the headless bulk runner share these helpers to extract the
+final lesson from a team run and save it as markdown (public/md) and PDF (public/pdfs).
+"""
+
+import os
+import re
+import traceback
+import urllib.request
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from autogen_agentchat.base import TaskResult
+
+
+def lesson_file_stem(name: Optional[str] = None) -> str:
+    """
+    Build the base name of the output files of a lesson.
+
+    Args:
+        name: Optional identifier appended to the timestamp, e.g. the id of a bulk job row
+
+    Returns:
+        The file stem, without directory or extension
+    """
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    if not name:
+        return f"course_materials_{timestamp}"
+    safe_name = re.sub(r"[^\w\-]+", "_", name).strip("_")
+    return f"course_materials_{timestamp}_{safe_name}"
+
+
+def strip_terminate(content: str) -> str:
+    """Remove the TERMINATE signal and everything after it."""
+    if "TERMINATE" in content:
+        return content.split("TERMINATE")[0].strip()
+    return content
+
+
+def extract_final_content(result: TaskResult) -> str:
+    """
+    Extract the final lesson from the result of a team run.
+
+    The last message normally carries the formatted lesson followed by TERMINATE; if
+    it carries nothing else, the lesson is the message before it.
+
+    Args:
+        result: The TaskResult emitted at the end of `team.run_stream`
+
+    Returns:
+        The lesson markdown, or an empty string if the run produced none
+    """
+    if result.stop_reason is None or not result.messages:
+        return ""
+    content = strip_terminate(str(result.messages[-1].content))
+    if content:
+        return content
+    if len(result.messages) >= 2:
+        return str(result.messages[-2].content)
+    return ""
+
+
+def save_lesson(content: str, file_stem: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Save a lesson as markdown and PDF.
+
+    Args:
+        content: The lesson markdown
+        file_stem: Base name of the output files, defaults to a timestamped name
+
+    Returns:
+        The paths of the markdown and PDF files
+    """
+    clean_content = strip_terminate(content)
+    file_stem = file_stem or lesson_file_stem()
+
+    os.makedirs("public/md", exist_ok=True)
+    md_filename = f"public/md/{file_stem}.md"
+    with open(md_filename, "w", encoding="utf-8") as md_file:
+        md_file.write(clean_content)
+
+    pdf_file = md_to_pdf(clean_content, file_stem)
+    return md_filename, pdf_file
+
+
+def md_to_pdf(md: str, file_stem: Optional[str] = None) -> str:
+    """
+    Render lesson markdown as a PDF in public/pdfs.
+
+    Args:
+        md: The lesson markdown
+        file_stem: Base name of the output files, defaults to a timestamped name
+
+    Returns:
+        The path of the PDF file
+    """
+    os.makedirs("public/pdfs", exist_ok=True)
+    os.makedirs("public/fonts", exist_ok=True)
+
+    file_stem = file_stem or lesson_file_stem()
+
+    filename = f"public/pdfs/{file_stem}.pdf"
+
+    # Clean up the content
+    content = md
+    
+    # Ensure we have content
+    if not content:
+        content = "# 无内容 \n\n请检查生成过程，内容生成失败。"
+
+    # Add a title if there isn't one
+    if not content.startswith('# '):
+        content = f"# 中国小学语文教学内容\n\n{content}"
+    
+    # Download a Chinese font if we don't have one already
+    chinese_font_path = "public/fonts/NotoSansSC-Regular.ttf"
+    if not os.path.exists(chinese_font_path):
+        try:
+            print("Downloading Chinese font...")
+            # Fix: Updated URL to direct download link instead of GitHub blob page
+            font_url = "https://github.com/jsntn/webfonts/raw/master/NotoSansSC-Regular.ttf"
+            urllib.request.urlretrieve(font_url, chinese_font_path)
+            print(f"Downloaded font to {chinese_font_path}")
+        except Exception as font_error:
+            print(f"Error downloading font: {str(font_error)}")
+            # Create a fallback font
+            chinese_font_path = None
+    
+    # Create PDF with reportlab
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.pdfgen import canvas
+
+        # Try to register the Chinese font
+        has_chinese_font = False
+        if chinese_font_path and os.path.exists(chinese_font_path):
+            try:
+                pdfmetrics.registerFont(TTFont("NotoSansSC", chinese_font_path))
+                has_chinese_font = True
+            except Exception as font_register_error:
+                print(f"Error registering font: {str(font_register_error)}")
+        
+        # Create a basic PDF with title
+        c = canvas.Canvas(filename, pagesize=A4)
+        width, height = A4
+        
+        # Draw a title - use Chinese font if available
+        font_name = "NotoSansSC" if has_chinese_font else "Helvetica-Bold"
+        c.setFont(font_name, 16)
+        c.drawString(50, height - 50, "中国小学语文教学内容")
+        
+        # Draw content
+        font_name = "NotoSansSC" if has_chinese_font else "Helvetica"
+        c.setFont(font_name, 10)
+        y_position = height - 80
+        line_height = 14
+        
+        # Simplify content to plain text - use 'content' instead of undefined 'plain_text'
+        plain_text = content  # Initialize plain_text with content
+        plain_text = re.sub(r'#+ (.*)', r'\1', plain_text)  # Headers to plain text
+        plain_text = re.sub(r'\*\*(.*?)\*\*', r'\1', plain_text)  # Remove bold
+        plain_text = re.sub(r'\*(.*?)\*', r'\1', plain_text)  # Remove italics
+        
+        # Add text by lines
+        for line in plain_text.split('\n'):
+            if not line.strip():
+                y_position -= line_height * 0.5
+                continue
+            
+            # Check if we need a new page
+            if y_position < 50:
+                c.showPage()
+                c.setFont(font_name, 10)
+                y_position = height - 50
+            
+            # Simple word wrap with better handling for Chinese text
+            if len(line) * 5 > width - 100:  # Rough estimate of line width
+                # For Chinese text, we need shorter chunks
+                chunk_size = 40 if has_chinese_font else 80
+                chunks = [line[i:i+chunk_size] for i in range(0, len(line), chunk_size)]
+                for chunk in chunks:
+                    c.drawString(50, y_position, chunk)
+                    y_position -= line_height
+            else:
+                c.drawString(50, y_position, line)
+                y_position -= line_height
+        
+        c.save()
+        print(f"Successfully created PDF with reportlab: {filename}")
+        
+        # If we couldn't display Chinese characters, add a note to the markdown file
+        if not has_chinese_font:
+            md_note_filename = f"public/md/{file_stem}_no_chinese_font.md"
+            with open(md_note_filename, "w", encoding="utf-8") as f:
+                f.write(content)
+            print(f"Created fallback markdown file with full content: {md_note_filename}")
+        
+        return filename
+        
+    except Exception as reportlab_error:
+        print(f"ReportLab failed: {str(reportlab_error)}")
+        print(traceback.format_exc())
+        
+        # Last resort: PDF-named text file
+        print("PDF generation failed, creating a text file with .pdf extension")
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write("# 中国小学语文教学内容\n\n")
+            f.write(content)
+        print(f"Created text file with PDF extension: {filename}")
+        return filename
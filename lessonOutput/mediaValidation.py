@@ -0,0 +1,241 @@
+"""
+Deterministic validation of the links of a finished lesson.
+
+Instead of having the reviewer and compiler agents check image and video URLs one
+tool call at a time, the final markdown is parsed once, every distinct link is
+checked concurrently through the cached URL checker, and dead or duplicated media
+are removed (or flagged) before the lesson is saved. No model turn is spent on it.
+"""
+
+import asyncio
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from agents.tools.url_accessiable import URL_CHECK_CONCURRENCY, check_url, url_batch_validator_tool
+
+load_dotenv()
+
+# What to do with dead and duplicated links: remove | flag | off
+MEDIA_VALIDATION_MODE = os.environ.get("MEDIA_VALIDATION_MODE", "remove").lower()
+
+# The links of the saved lesson are checked by this module without a model
+# turn; the reviewer and the compiler only get the batch validator when it is off
+if MEDIA_VALIDATION_MODE == "off":
+    MEDIA_CHECK_TOOLS = [url_batch_validator_tool]
+    PROMPT_MEDIA_CHECK = """
+Use the url_batch_validator_tool to verify all embedded image and video URLs in a single call, and ensure they are unique and not duplicated in the content.
+"""
+else:
+    MEDIA_CHECK_TOOLS = []
+    PROMPT_MEDIA_CHECK = ""
+
+# ![alt](url "title") and [text](url "title"); the optional ! tells images apart.
+# URLs may hold balanced parentheses, e.g. https://zh.wikipedia.org/wiki/Foo_(bar)
+_URL = r'<?(https?://(?:[^\s()<>]|\([^\s()<>]*\))+)>?(?:\s+"[^"\n]*")?'
+LINK_PATTERN = re.compile(r'(!?)\[([^\]\n]*)\]\(\s*' + _URL + r'\s*\)')
+# [![alt](thumbnail_url)](target_url): a thumbnail linking to the full image or to a video
+THUMBNAIL_LINK_PATTERN = re.compile(
+    r'\[(!\[([^\]\n]*)\]\(\s*' + _URL + r'\s*\))\]\(\s*' + _URL + r'\s*\)'
+)
+FENCE_PATTERN = re.compile(r"^\s*(```|~~~)")
+
+DEAD_LINK_FLAG = "（⚠ 链接无法访问）"
+DUPLICATE_MEDIA_FLAG = "（⚠ 重复的媒体）"
+
+
+class MediaValidationReport:
+    """Outcome of the validation pass over a lesson."""
+
+    def __init__(self, content: str, verdicts: Dict[str, Dict], dead: List[str], duplicates: List[str], mode: str):
+        self.content = content
+        self.verdicts = verdicts
+        self.dead = dead
+        self.duplicates = duplicates
+        self.mode = mode
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.dead or self.duplicates) and self.mode != "off"
+
+    def summary_markdown(self) -> str:
+        """Summarize the pass for the chainlit UI."""
+        action = "已移除" if self.mode == "remove" else "已标记"
+        lines = [f"共检查 {len(self.verdicts)} 个链接。"]
+        for url in self.dead:
+            verdict = self.verdicts.get(url, {})
+            reason = verdict.get("status") or verdict.get("error") or "unknown"
+            lines.append(f"- {action}无法访问的链接: {url} ({reason})")
+        for url in self.duplicates:
+            lines.append(f"- {action}重复的媒体: {url}")
+        return "\n".join(lines)
+
+
+def outside_code_blocks(markdown: str) -> List[bool]:
+    """Return, for each line, whether it is outside a fenced code block."""
+    outside = []
+    in_fence = False
+    for line in markdown.split("\n"):
+        if FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+            outside.append(False)
+        else:
+            outside.append(not in_fence)
+    return outside
+
+
+def sub_links(
+    line: str,
+    replace_link: Callable[["re.Match"], str],
+    replace_thumbnail: Callable[["re.Match"], str],
+) -> str:
+    """
+    Rewrite the links of a line, thumbnail links as a whole.
+
+    `replace_thumbnail` gets the `THUMBNAIL_LINK_PATTERN` matches, whose groups are
+    the image markdown, its alt text, the thumbnail URL and the target URL, and
+    `replace_link` gets the `LINK_PATTERN` matches of the rest of the line.
+    """
+    parts = []
+    position = 0
+    for match in THUMBNAIL_LINK_PATTERN.finditer(line):
+        parts.append(LINK_PATTERN.sub(replace_link, line[position:match.start()]))
+        parts.append(replace_thumbnail(match))
+        position = match.end()
+    parts.append(LINK_PATTERN.sub(replace_link, line[position:]))
+    return "".join(parts)
+
+
+def extract_links(markdown: str) -> List[str]:
+    """Return the distinct http(s) link and image URLs of a markdown document, outside code blocks."""
+    lines = markdown.split("\n")
+    urls = []
+
+    def collect_link(match: "re.Match") -> str:
+        urls.append(match.group(3).strip())
+        return match.group(0)
+
+    def collect_thumbnail(match: "re.Match") -> str:
+        urls.extend((match.group(3).strip(), match.group(4).strip()))
+        return match.group(0)
+
+    for line, outside in zip(lines, outside_code_blocks(markdown)):
+        if outside:
+            sub_links(line, collect_link, collect_thumbnail)
+    return list(dict.fromkeys(urls))
+
+
+async def validate_media_links(markdown: str, mode: Optional[str] = None) -> MediaValidationReport:
+    """
+    Check every link of a lesson and drop or flag the dead and duplicated media.
+
+    Dead images are removed, dead plain links (e.g. videos) keep their text without
+    the link, and repeated occurrences of the same image or video are removed after
+    the first one. A thumbnail linking to a full image or a video loses whichever of
+    its two URLs is dead, and counts as a repetition of its target. In 'flag' mode
+    the links are kept and marked instead.
+
+    Args:
+        markdown: The final lesson markdown
+        mode: 'remove', 'flag' or 'off'; defaults to MEDIA_VALIDATION_MODE
+
+    Returns:
+        The report, holding the resulting content
+    """
+    mode = (mode or MEDIA_VALIDATION_MODE).lower()
+    if mode == "off":
+        return MediaValidationReport(markdown, {}, [], [], mode)
+
+    urls = extract_links(markdown)
+    slots = asyncio.Semaphore(URL_CHECK_CONCURRENCY)
+
+    async def check(url: str) -> Dict:
+        async with slots:
+            try:
+                return await check_url(url)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Never drop content because the checker itself failed
+                return {"url": url, "accessible": True, "error": str(e)}
+
+    verdicts = dict(zip(urls, await asyncio.gather(*(check(url) for url in urls))))
+
+    dead: List[str] = []
+    duplicates: List[str] = []
+    seen_media = set()
+
+    def alive(url: str) -> bool:
+        if verdicts.get(url, {}).get("accessible", True):
+            return True
+        if url not in dead:
+            dead.append(url)
+        return False
+
+    def is_repeated(url: str) -> bool:
+        if url not in seen_media:
+            return False
+        if url not in duplicates:
+            duplicates.append(url)
+        return True
+
+    def replace(match: "re.Match") -> str:
+        # Links are keyed on the whole URL: a video is often identified by its query (watch?v=...)
+        is_image, text, url = match.group(1) == "!", match.group(2), match.group(3).strip()
+        if not alive(url):
+            if mode == "flag":
+                return match.group(0) + DEAD_LINK_FLAG
+            return "" if is_image else text
+        # The same image or video should appear once per lesson
+        if is_repeated(url):
+            if mode == "flag":
+                return match.group(0) + DUPLICATE_MEDIA_FLAG
+            return "" if is_image else text
+        if is_image or "视频" in text or "video" in text.lower():
+            seen_media.add(url)
+        return match.group(0)
+
+    def replace_thumbnail(match: "re.Match") -> str:
+        text, thumbnail_url, url = match.group(2), match.group(3).strip(), match.group(4).strip()
+        is_video = "视频" in text or "video" in text.lower()
+        thumbnail_alive, target_alive = alive(thumbnail_url), alive(url)
+        if not (thumbnail_alive and target_alive):
+            if mode == "flag":
+                return match.group(0) + DEAD_LINK_FLAG
+            if target_alive:
+                # Without its thumbnail, the full image is shown and a video becomes a plain link
+                replacement = f"[{text}]({url})" if is_video else f"![{text}]({url})"
+            elif thumbnail_alive and not is_video:
+                replacement = match.group(1)
+            else:
+                return text if is_video else ""
+            url = url if target_alive else thumbnail_url
+            if is_repeated(url):
+                return text if is_video else ""
+            seen_media.add(url)
+            return replacement
+        if is_repeated(url):
+            if mode == "flag":
+                return match.group(0) + DUPLICATE_MEDIA_FLAG
+            return text if is_video else ""
+        seen_media.add(url)
+        return match.group(0)
+
+    lines = markdown.split("\n")
+    result = []
+    for line, outside in zip(lines, outside_code_blocks(markdown)):
+        if outside:
+            new_line = sub_links(line, replace, replace_thumbnail)
+            # Drop lines left empty by a removed image instead of leaving gaps
+            if new_line.strip() == "" and line.strip() != "":
+                continue
+            result.append(new_line)
+        else:
+            result.append(line)
+
+    report = MediaValidationReport("\n".join(result), verdicts, dead, duplicates, mode)
+    if report.changed:
+        print(f"Media validation: {len(dead)} dead and {len(duplicates)} duplicated links ({mode})")
+    return report
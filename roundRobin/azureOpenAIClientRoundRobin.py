@@ -2,10 +2,11 @@ import asyncio
 import json
 import logging
 import os
-from typing import Any, Dict, List, Mapping, Optional, Sequence, Type, Union
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Type, Union
 
+import openai
 from autogen_core import CancellationToken
-from autogen_core.models import CreateResult, LLMMessage
+from autogen_core.models import CreateResult, LLMMessage, RequestUsage
 from autogen_core.tools import Tool, ToolSchema
 from autogen_ext.models.openai import (
     AzureOpenAIChatCompletionClient,
@@ -13,6 +14,8 @@ from autogen_ext.models.openai import (
 )
 from pydantic import BaseModel, Field
 
+from sharedState import EndpointHealth, RateLimiter, get_shared_state
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("azure_openai_round_robin")
@@ -29,22 +32,37 @@ class AzureOpenAIClientsRoundRobin:
     
     This class maintains a pool of initialized Azure OpenAI clients and rotates through them
     for each request, helping to distribute load and avoid rate limit issues.
+
+    The rotation index, endpoint health, request rate buckets and usage counters are
+    kept in the shared state backend, so several app workers rotate together, skip
+    endpoints that another worker found throttled or failing, and share the
+    per-endpoint request budget.
     """
+
+    SHARED_STATE_PREFIX = "roundrobin:azure_openai"
     
-    def __init__(self):
+    def __init__(self, unhealthy_cooldown: float = 30.0):
         self._clients: List[AzureOpenAIChatCompletionClient] = []
-        self._current_index = 0
+        self._endpoints: List[str] = []
         self._lock = asyncio.Lock()
         self._base_config: Dict[str, Any] = {}
         self._initialized = False
+        self._health = EndpointHealth("azure_openai", cooldown=unhealthy_cooldown)
+        self._rate_limiter: Optional[RateLimiter] = None
     
-    async def initialize(self, base_config: Dict[str, Any], connection_configs: List[ClientConfig]):
+    async def initialize(
+        self,
+        base_config: Dict[str, Any],
+        connection_configs: List[ClientConfig],
+        requests_per_minute: int = 0,
+    ):
         """
         Initialize the round-robin client manager with multiple client configurations.
         
         Args:
             base_config: The base configuration shared by all clients (model, deployment, etc)
             connection_configs: List of client-specific configurations (endpoints, api keys)
+            requests_per_minute: Requests allowed per endpoint and minute across all workers (0 for no limit)
         """
         async with self._lock:
             if self._initialized:
@@ -52,6 +70,8 @@ class AzureOpenAIClientsRoundRobin:
                 return
                 
             self._base_config = base_config
+            if requests_per_minute > 0:
+                self._rate_limiter = RateLimiter("azure_openai", limit=requests_per_minute, window=60.0)
             
             # Create all clients
             for config in connection_configs:
@@ -62,6 +82,7 @@ class AzureOpenAIClientsRoundRobin:
                 # Create and initialize the client
                 client = AzureOpenAIChatCompletionClient(**client_config)
                 self._clients.append(client)
+                self._endpoints.append(config.azure_endpoint)
                 
             if not self._clients:
                 raise ValueError("No client configurations provided")
@@ -79,15 +100,23 @@ class AzureOpenAIClientsRoundRobin:
         """Return whether the client manager has been initialized."""
         return self._initialized
     
-    async def get_next_client(self) -> AzureOpenAIChatCompletionClient:
+    @property
+    def clients(self) -> List[AzureOpenAIChatCompletionClient]:
+        """Return all clients in the pool."""
+        return list(self._clients)
+
+    async def get_next(self) -> Tuple[str, AzureOpenAIChatCompletionClient]:
         """
-        Get the next client in the round-robin rotation.
-        
-        This method is thread-safe and will rotate through available clients.
-        
+        Get the endpoint and client next in the round-robin rotation.
+
+        The rotation index is shared by all workers through the shared state backend.
+        Endpoints in an unhealthy cooldown, or whose request budget of the current
+        minute is spent, are skipped. When no endpoint qualifies, the request waits for
+        the budget of the endpoint next in the rotation.
+
         Returns:
-            The next AzureOpenAIChatCompletionClient in the rotation
-        
+            The endpoint URL and its AzureOpenAIChatCompletionClient
+
         Raises:
             ValueError: If no clients are available
         """
@@ -96,15 +125,82 @@ class AzureOpenAIClientsRoundRobin:
             
         if not self._clients:
             raise ValueError("No clients available")
+
+        count = len(self._clients)
+        start = (await get_shared_state().incr(f"{self.SHARED_STATE_PREFIX}:index") - 1) % count
+        for offset in range(count):
+            index = (start + offset) % count
+            endpoint = self._endpoints[index]
+            if not await self._health.is_healthy(endpoint):
+                continue
+            if self._rate_limiter is None or await self._rate_limiter.try_acquire(endpoint):
+                return endpoint, self._clients[index]
+
+        if self._rate_limiter is not None:
+            await self._rate_limiter.acquire(self._endpoints[start])
+        return self._endpoints[start], self._clients[start]
+
+    async def get_next_client(self) -> AzureOpenAIChatCompletionClient:
+        """
+        Get the next client in the round-robin rotation.
         
-        async with self._lock:
-            # Get the next client
-            client = self._clients[self._current_index]
-            
-            # Update the index for the next call
-            self._current_index = (self._current_index + 1) % len(self._clients)
-            
-            return client
+        This method is safe to call concurrently and will rotate through available clients.
+        
+        Returns:
+            The next AzureOpenAIChatCompletionClient in the rotation
+        
+        Raises:
+            ValueError: If no clients are available
+        """
+        _, client = await self.get_next()
+        return client
+
+    async def report_failure(self, endpoint: str, error: Exception) -> bool:
+        """
+        Put an endpoint in cooldown if the error shows it is throttled or failing.
+
+        Args:
+            endpoint: The endpoint that raised the error
+            error: The error raised by the request
+
+        Returns:
+            True if the error is transient and the request can be retried on another endpoint
+        """
+        cooldown = None
+        if isinstance(error, openai.RateLimitError):
+            retry_after = error.response.headers.get("retry-after") if error.response is not None else None
+            try:
+                cooldown = float(retry_after) if retry_after else None
+            except ValueError:
+                cooldown = None
+        elif isinstance(error, openai.APIStatusError):
+            if error.status_code < 500:
+                return False
+        elif not isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            return False
+
+        logger.warning(f"Endpoint {endpoint} failed with {type(error).__name__}, cooling it down")
+        await self._health.mark_unhealthy(endpoint, cooldown=cooldown, reason=type(error).__name__)
+        return True
+
+    async def record_usage(self, endpoint: str, usage: Optional[RequestUsage]) -> None:
+        """Add the usage of a request to the endpoint's shared usage counters."""
+        if usage is None:
+            return
+        state = get_shared_state()
+        await state.incr(f"{self.SHARED_STATE_PREFIX}:usage:{endpoint}:prompt_tokens", usage.prompt_tokens)
+        await state.incr(f"{self.SHARED_STATE_PREFIX}:usage:{endpoint}:completion_tokens", usage.completion_tokens)
+
+    async def shared_usage(self) -> Dict[str, Dict[str, int]]:
+        """Return the usage counters of every endpoint, aggregated across all workers."""
+        state = get_shared_state()
+        usage = {}
+        for endpoint in self._endpoints:
+            usage[endpoint] = {}
+            for counter in ("prompt_tokens", "completion_tokens"):
+                value = await state.get(f"{self.SHARED_STATE_PREFIX}:usage:{endpoint}:{counter}")
+                usage[endpoint][counter] = int(value) if value else 0
+        return usage
 
     def get_base_config(self) -> Dict[str, Any]:
         """Return the base configuration shared by all clients."""
@@ -116,7 +212,8 @@ client_manager = AzureOpenAIClientsRoundRobin()
 # Helper function to initialize the client manager from environment variables
 async def initialize_client_manager_from_env(
     base_config: Dict[str, Any],
-    connection_env_var: str = "AZURE_OPENAI_ROUND_ROBIN_CONNECTION"
+    connection_env_var: str = "AZURE_OPENAI_ROUND_ROBIN_CONNECTION",
+    rate_limit_env_var: str = "AZURE_OPENAI_ENDPOINT_RPM",
 ) -> AzureOpenAIClientsRoundRobin:
     """
     Initialize the client manager from environment variables.
@@ -124,6 +221,7 @@ async def initialize_client_manager_from_env(
     Args:
         base_config: Base configuration for all clients (model, deployment, etc.)
         connection_env_var: Environment variable containing JSON array of connection configs
+        rate_limit_env_var: Environment variable with the requests allowed per endpoint and minute
         
     Returns:
         The initialized client manager
@@ -176,7 +274,8 @@ async def initialize_client_manager_from_env(
         raise ValueError("No valid connection configurations found")
     
     # Initialize the client manager
-    await client_manager.initialize(base_config, connection_configs)
+    requests_per_minute = int(os.environ.get(rate_limit_env_var, "0"))
+    await client_manager.initialize(base_config, connection_configs, requests_per_minute=requests_per_minute)
     return client_manager
 
 class AzureOpenAIRoundRobinClient(AzureOpenAIChatCompletionClient):
@@ -211,19 +310,31 @@ class AzureOpenAIRoundRobinClient(AzureOpenAIChatCompletionClient):
         extra_create_args: Mapping[str, Any] = {},
         cancellation_token: Optional[CancellationToken] = None,
     ) -> CreateResult:
-        """Override the create method to use round-robin client selection."""
-        # Get the next client from the round-robin manager
-        client = await client_manager.get_next_client()
-        
-        # Use the selected client to create the response
-        result = await client.create(messages,
-            tools=tools,
-            json_output=json_output,
-            extra_create_args=extra_create_args,
-            cancellation_token=cancellation_token,
-        )
-        
-        return result
+        """Override the create method to use round-robin client selection.
+
+        A request failing with a transient error (throttling, server error, connection
+        error) puts its endpoint in cooldown and is retried on the next endpoint.
+        """
+        attempts = max(1, client_manager.client_count)
+        for attempt in range(attempts):
+            # Get the next client from the round-robin manager
+            endpoint, client = await client_manager.get_next()
+
+            # Use the selected client to create the response
+            try:
+                result = await client.create(messages,
+                    tools=tools,
+                    json_output=json_output,
+                    extra_create_args=extra_create_args,
+                    cancellation_token=cancellation_token,
+                )
+            except Exception as e:
+                if attempt + 1 < attempts and await client_manager.report_failure(endpoint, e):
+                    continue
+                raise
+
+            await client_manager.record_usage(endpoint, result.usage)
+            return result
     
     async def create_stream(
         self,
@@ -235,26 +346,40 @@ class AzureOpenAIRoundRobinClient(AzureOpenAIChatCompletionClient):
         cancellation_token: Optional[CancellationToken] = None,
         max_consecutive_empty_chunk_tolerance: int = 0,
     ):
-        """Override the create_stream method to use round-robin client selection."""
-        # Get the next client from the round-robin manager
-        client = await client_manager.get_next_client()
-        
-        # Use the selected client to create the stream
-        async for chunk in client.create_stream(
-            messages,
-            tools=tools,
-            json_output=json_output,
-            extra_create_args=extra_create_args,
-            cancellation_token=cancellation_token,
-            max_consecutive_empty_chunk_tolerance=max_consecutive_empty_chunk_tolerance,
-        ):
-            yield chunk
+        """Override the create_stream method to use round-robin client selection.
+
+        A stream failing with a transient error before producing any chunk is retried
+        on the next endpoint.
+        """
+        attempts = max(1, client_manager.client_count)
+        for attempt in range(attempts):
+            # Get the next client from the round-robin manager
+            endpoint, client = await client_manager.get_next()
+            started = False
+
+            # Use the selected client to create the stream
+            try:
+                async for chunk in client.create_stream(
+                    messages,
+                    tools=tools,
+                    json_output=json_output,
+                    extra_create_args=extra_create_args,
+                    cancellation_token=cancellation_token,
+                    max_consecutive_empty_chunk_tolerance=max_consecutive_empty_chunk_tolerance,
+                ):
+                    started = True
+                    if isinstance(chunk, CreateResult):
+                        await client_manager.record_usage(endpoint, chunk.usage)
+                    yield chunk
+                return
+            except Exception as e:
+                if not started and attempt + 1 < attempts and await client_manager.report_failure(endpoint, e):
+                    continue
+                raise
     
     async def close(self) -> None:
         """Close all clients in the round-robin pool."""
-        # Get list of all clients to close
-        for i in range(client_manager.client_count):
-            client = await client_manager.get_next_client()
+        for client in client_manager.clients:
             await client.close()
     
     def actual_usage(self) -> Dict[str, int]:
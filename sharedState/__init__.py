@@ -0,0 +1,34 @@
+"""
+Shared state for running several app workers side by side.
+
+This module provides pluggable backends (in-memory, sqlite, Redis protocol) and the
+primitives built on them: result caches, rate-limit buckets and endpoint health.
+"""
+
+from .sharedPrimitives import (
+    EndpointHealth,
+    RateLimiter,
+    ResultCache,
+)
+from .sharedStateBackend import (
+    InMemoryStateBackend,
+    RedisProtocolError,
+    RedisStateBackend,
+    SharedStateBackend,
+    SqliteStateBackend,
+    create_shared_state_backend,
+    get_shared_state,
+)
+
+__all__ = [
+    "EndpointHealth",
+    "InMemoryStateBackend",
+    "RateLimiter",
+    "RedisProtocolError",
+    "RedisStateBackend",
+    "ResultCache",
+    "SharedStateBackend",
+    "SqliteStateBackend",
+    "create_shared_state_backend",
+    "get_shared_state",
+]
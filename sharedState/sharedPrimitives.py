@@ -0,0 +1,132 @@
+"""
+Shared-state primitives built on top of a `SharedStateBackend`.
+
+- `ResultCache`: JSON result cache with per-entry TTL
+- `RateLimiter`: fixed-window rate-limit buckets
+- `EndpointHealth`: cooldown tracking for unhealthy endpoints
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Optional
+
+from .sharedStateBackend import SharedStateBackend, get_shared_state
+
+
+class ResultCache:
+    """
+    Cache of JSON-serializable results stored in the shared state backend.
+
+    Keys are built from arbitrary JSON-serializable parts and hashed, so callers can
+    pass the arguments of the call they are caching directly.
+    """
+
+    def __init__(self, namespace: str, default_ttl: Optional[float] = None, backend: Optional[SharedStateBackend] = None):
+        self._namespace = namespace
+        self._default_ttl = default_ttl
+        self._backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self) -> SharedStateBackend:
+        """Return the backend of the cache, defaulting to the process-wide one."""
+        return self._backend or get_shared_state()
+
+    def make_key(self, *parts: Any) -> str:
+        """Build the backend key for the given key parts."""
+        digest = hashlib.sha256(
+            json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        ).hexdigest()
+        return f"cache:{self._namespace}:{digest}"
+
+    async def get(self, *parts: Any) -> Optional[Any]:
+        """Return the cached result for the key parts, or None on a miss."""
+        value = await self.backend.get(self.make_key(*parts))
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    async def set(self, value: Any, *parts: Any, ttl: Optional[float] = None) -> None:
+        """Store a result for the key parts."""
+        await self.backend.set(
+            self.make_key(*parts),
+            json.dumps(value, ensure_ascii=False),
+            ttl=ttl if ttl is not None else self._default_ttl,
+        )
+
+
+class RateLimiter:
+    """
+    Fixed-window rate limiter whose buckets are shared by all workers.
+
+    Each bucket allows `limit` acquisitions per `window` seconds.
+    """
+
+    def __init__(self, name: str, limit: int, window: float, backend: Optional[SharedStateBackend] = None):
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        self._name = name
+        self._limit = limit
+        self._window = window
+        self._backend = backend
+
+    @property
+    def backend(self) -> SharedStateBackend:
+        """Return the backend of the limiter, defaulting to the process-wide one."""
+        return self._backend or get_shared_state()
+
+    async def try_acquire(self, bucket: str = "default", cost: int = 1) -> bool:
+        """
+        Try to take `cost` units from a bucket in the current window.
+
+        Returns:
+            True if the units were available
+        """
+        window_index = int(time.time() // self._window)
+        count = await self.backend.incr(
+            f"ratelimit:{self._name}:{bucket}:{window_index}", cost, ttl=self._window * 2
+        )
+        return count <= self._limit
+
+    async def acquire(self, bucket: str = "default", cost: int = 1) -> None:
+        """Wait until `cost` units can be taken from a bucket."""
+        while not await self.try_acquire(bucket, cost):
+            await asyncio.sleep(self._window - (time.time() % self._window))
+
+
+class EndpointHealth:
+    """
+    Health tracking for upstream endpoints shared by all workers.
+
+    An endpoint marked unhealthy is skipped until its cooldown expires.
+    """
+
+    def __init__(self, name: str, cooldown: float = 30.0, backend: Optional[SharedStateBackend] = None):
+        self._name = name
+        self._cooldown = cooldown
+        self._backend = backend
+
+    @property
+    def backend(self) -> SharedStateBackend:
+        """Return the backend of the tracker, defaulting to the process-wide one."""
+        return self._backend or get_shared_state()
+
+    def _key(self, endpoint: str) -> str:
+        return f"health:{self._name}:{endpoint}"
+
+    async def mark_unhealthy(self, endpoint: str, cooldown: Optional[float] = None, reason: str = "") -> None:
+        """Mark an endpoint unhealthy for `cooldown` seconds."""
+        await self.backend.set(self._key(endpoint), reason or "unhealthy", ttl=cooldown or self._cooldown)
+
+    async def mark_healthy(self, endpoint: str) -> None:
+        """Clear the unhealthy mark of an endpoint."""
+        await self.backend.delete(self._key(endpoint))
+
+    async def is_healthy(self, endpoint: str) -> bool:
+        """Return whether the endpoint is not in a cooldown."""
+        return await self.backend.get(self._key(endpoint)) is None
@@ -0,0 +1,382 @@
+"""
+Pluggable shared-state backends.
+
+Caches, rate-limit buckets, endpoint health and usage counters are stored through a
+small key/value interface so that several app processes can share them. Three
+backends are provided:
+
+- `InMemoryStateBackend`: process-local state, the default for a single worker
+- `SqliteStateBackend`: a sqlite file shared by the workers of one host
+- `RedisStateBackend`: any server speaking the Redis protocol (Redis, Valkey, KeyDB,
+  a local stand-in...), shared across hosts
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import unquote, urlparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("shared_state")
+
+
+class SharedStateBackend(ABC):
+    """
+    Minimal key/value interface shared by all backends.
+
+    Values are strings; callers serialize structured data themselves. A `ttl` in
+    seconds makes a key expire, `None` keeps it until it is deleted.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        """Return the value of a key, or None if it does not exist or has expired."""
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """Set the value of a key, replacing any previous value and expiry."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Delete a key if it exists."""
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """
+        Atomically increment an integer counter.
+
+        Args:
+            key: The counter key
+            amount: The increment
+            ttl: Expiry applied when the counter is created by this call
+
+        Returns:
+            The value of the counter after the increment
+        """
+
+    async def close(self) -> None:
+        """Release the resources held by the backend."""
+
+
+class InMemoryStateBackend(SharedStateBackend):
+    """Process-local backend; state is not shared with other workers."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    def _live_entry(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._live_entry(key)
+        return entry[0] if entry else None
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        entry = self._live_entry(key)
+        if entry is None:
+            value, expires_at = amount, (time.time() + ttl if ttl else None)
+        else:
+            value, expires_at = int(entry[0]) + amount, entry[1]
+        self._data[key] = (str(value), expires_at)
+        return value
+
+
+class SqliteStateBackend(SharedStateBackend):
+    """
+    Backend storing state in a sqlite file, shared by all processes of one host.
+
+    The database runs in WAL mode and every operation executes in a worker thread
+    so that disk I/O never blocks the event loop.
+    """
+
+    def __init__(self, path: str, purge_interval: float = 300.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._path = path
+        self._lock = threading.Lock()
+        self._purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+
+    def _execute(self, func, *args):
+        with self._lock:
+            now = time.time()
+            if now - self._last_purge > self._purge_interval:
+                self._conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+                self._last_purge = now
+            return func(now, *args)
+
+    def _get(self, now: float, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, now: float, key: str, value: str, ttl: Optional[float]) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, now + ttl if ttl else None),
+        )
+
+    def _delete(self, now: float, key: str) -> None:
+        self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def _incr(self, now: float, key: str, amount: int, ttl: Optional[float]) -> int:
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent workers serialize here
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                value, expires_at = amount, (now + ttl if ttl else None)
+            else:
+                value, expires_at = int(row[0]) + amount, row[1]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, str(value), expires_at),
+            )
+            self._conn.execute("COMMIT")
+            return value
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._execute, self._get, key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await asyncio.to_thread(self._execute, self._set, key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._execute, self._delete, key)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return await asyncio.to_thread(self._execute, self._incr, key, amount, ttl)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisProtocolError(Exception):
+    """Raised when the server returns an error reply."""
+
+
+class RedisStateBackend(SharedStateBackend):
+    """
+    Backend for any server speaking the Redis serialization protocol (RESP).
+
+    A single connection is used and commands are serialized over it; the connection
+    is re-established transparently after a network error.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", connect_timeout: float = 5.0):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", "rediss"):
+            raise ValueError(f"Unsupported shared state URL scheme: {parsed.scheme}")
+        self._host = parsed.hostname or "localhost"
+        self._port = parsed.port or 6379
+        self._ssl = parsed.scheme == "rediss"
+        self._username = unquote(parsed.username) if parsed.username else None
+        self._password = unquote(parsed.password) if parsed.password else None
+        self._db = int(parsed.path.lstrip("/") or 0)
+        self._connect_timeout = connect_timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self._host, self._port, ssl=self._ssl or None),
+            timeout=self._connect_timeout,
+        )
+        if self._password:
+            if self._username:
+                await self._send("AUTH", self._username, self._password)
+            else:
+                await self._send("AUTH", self._password)
+        if self._db:
+            await self._send("SELECT", str(self._db))
+
+    def _abort(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _disconnect(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+        self._reader = self._writer = None
+
+    @staticmethod
+    def _encode(args: Tuple[Any, ...]) -> bytes:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        return b"".join(parts)
+
+    async def _read_reply(self) -> Any:
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the shared state server")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode("utf-8")
+        if prefix == b"-":
+            raise RedisProtocolError(payload.decode("utf-8"))
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode("utf-8")
+        if prefix == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RedisProtocolError(f"Unexpected reply from the shared state server: {line!r}")
+
+    async def _send(self, *args: Any) -> Any:
+        self._writer.write(self._encode(args))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _send_pipeline(self, commands: Sequence[Tuple[Any, ...]]) -> List[Any]:
+        self._writer.write(b"".join(self._encode(args) for args in commands))
+        await self._writer.drain()
+        return [await self._read_reply() for _ in commands]
+
+    async def _call(self, send, *args: Any) -> Any:
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    return await send(*args)
+                except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                    await self._disconnect()
+                    if attempt:
+                        raise
+                except BaseException:
+                    # The reply may still be on the socket, e.g. when the task was cancelled
+                    # while waiting for it; the next command must not read it as its own
+                    self._abort()
+                    raise
+
+    async def execute(self, *args: Any) -> Any:
+        """
+        Execute a single command, reconnecting once if the connection was lost.
+
+        Args:
+            args: The command and its arguments
+
+        Returns:
+            The decoded reply
+        """
+        return await self._call(self._send, *args)
+
+    async def transaction(self, *commands: Tuple[Any, ...]) -> List[Any]:
+        """
+        Execute commands atomically in a MULTI/EXEC block, sent in a single round trip.
+
+        Args:
+            commands: The commands, each a tuple of the command and its arguments
+
+        Returns:
+            The decoded replies of the commands
+        """
+        replies = await self._call(self._send_pipeline, [("MULTI",), *commands, ("EXEC",)])
+        return replies[-1]
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.execute("GET", key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        if ttl:
+            await self.execute("SET", key, value, "PX", max(1, int(ttl * 1000)))
+        else:
+            await self.execute("SET", key, value)
+
+    async def delete(self, key: str) -> None:
+        await self.execute("DEL", key)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        if not ttl:
+            return await self.execute("INCRBY", key, amount)
+        # Creating the counter with its expiry in the same transaction as the increment
+        # means a crashed worker can never leave a bucket behind that does not expire
+        _, value = await self.transaction(
+            ("SET", key, "0", "PX", max(1, int(ttl * 1000)), "NX"),
+            ("INCRBY", key, amount),
+        )
+        return value
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._disconnect()
+
+
+def create_shared_state_backend(backend: Optional[str] = None) -> SharedStateBackend:
+    """
+    Create a shared state backend from environment variables.
+
+    Args:
+        backend: Backend name ('memory', 'sqlite' or 'redis'); defaults to SHARED_STATE_BACKEND
+
+    Returns:
+        The backend
+    """
+    backend = (backend or os.environ.get("SHARED_STATE_BACKEND", "memory")).lower()
+    if backend == "memory":
+        return InMemoryStateBackend()
+    if backend == "sqlite":
+        return SqliteStateBackend(os.environ.get("SHARED_STATE_SQLITE_PATH", ".cache/shared_state.sqlite"))
+    if backend == "redis":
+        return RedisStateBackend(os.environ.get("SHARED_STATE_REDIS_URL", "redis://localhost:6379/0"))
+    raise ValueError(f"Invalid SHARED_STATE_BACKEND value: {backend}. Must be one of: memory, sqlite, redis")
+
+
+_shared_state: Optional[SharedStateBackend] = None
+
+
+def get_shared_state() -> SharedStateBackend:
+    """Return the process-wide shared state backend, creating it on first use."""
+    global _shared_state
+    if _shared_state is None:
+        _shared_state = create_shared_state_backend()
+        logger.info(f"Using {type(_shared_state).__name__} for shared state")
+    return _shared_state
@@ -0,0 +1,40 @@
+"""
+Team run execution infrastructure.
+
+This package provides an in-process job scheduler that runs agent teams in the
+background with global admission control, so that chainlit sessions only render
+the progress of their runs, and a per-run performance timeline.
+"""
+
+from .runTimeline import (
+    RunTimeline,
+    current_timeline,
+    timed_tool,
+)
+
+from .teamRunScheduler import (
+    FINISHED_JOB_STATUSES,
+    JOB_STATUS_CANCELLED,
+    JOB_STATUS_COMPLETED,
+    JOB_STATUS_FAILED,
+    JOB_STATUS_QUEUED,
+    JOB_STATUS_RUNNING,
+    TeamRunJob,
+    TeamRunScheduler,
+    team_run_scheduler,
+)
+
+__all__ = [
+    "FINISHED_JOB_STATUSES",
+    "JOB_STATUS_CANCELLED",
+    "JOB_STATUS_COMPLETED",
+    "JOB_STATUS_FAILED",
+    "JOB_STATUS_QUEUED",
+    "JOB_STATUS_RUNNING",
+    "RunTimeline",
+    "TeamRunJob",
+    "TeamRunScheduler",
+    "current_timeline",
+    "team_run_scheduler",
+    "timed_tool",
+]
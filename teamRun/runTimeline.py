@@ -0,0 +1,289 @@
+"""
+Per-run performance timeline for team executions.
+
+The timeline observes the events emitted by `team.run_stream` to time every agent
+turn (speaker selection latency, time to first token, stream duration, token usage)
+and collects the duration of every tool call through the `timed_tool` decorator.
+When the run ends the timeline is written as JSONL and can be summarized as markdown.
+"""
+
+import functools
+import json
+import logging
+import os
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from autogen_agentchat.messages import (
+    BaseChatMessage,
+    ModelClientStreamingChunkEvent,
+    ToolCallExecutionEvent,
+    ToolCallRequestEvent,
+)
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("run_timeline")
+
+TIMELINE_DIR = os.environ.get("TEAM_RUN_TIMELINE_DIR", "logs/timelines")
+
+# The timeline of the team run executing in the current context. It is set by the
+# scheduler before the run starts, so tools called by the team's agents inherit it.
+current_timeline: ContextVar[Optional["RunTimeline"]] = ContextVar("current_timeline", default=None)
+
+
+class RunTimeline:
+    """
+    Structured timeline of a single team run.
+
+    Times are measured with a monotonic clock and stored in seconds relative to the
+    start of the run.
+    """
+
+    def __init__(self, run_id: str, team_name: str):
+        self.run_id = run_id
+        self.team_name = team_name
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at = self.created_at
+        self.status: Optional[str] = None
+        self.duration: Optional[float] = None
+        self.turns: List[Dict[str, Any]] = []
+        self.tool_calls: List[Dict[str, Any]] = []
+        self._start = time.perf_counter()
+        self._turn: Optional[Dict[str, Any]] = None
+        self._turn_boundary = 0.0
+        self._tool_batches: Dict[str, float] = {}
+
+    def start(self) -> None:
+        """Mark the start of the run, after it has left the scheduler queue."""
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+
+    def _now(self) -> float:
+        return round(time.perf_counter() - self._start, 3)
+
+    def _open_turn(self, speaker: str, selection_latency: Optional[float], started_at: Optional[float] = None) -> Dict[str, Any]:
+        self._close_turn()
+        self._turn = {
+            "speaker": speaker,
+            "started_at": self._now() if started_at is None else started_at,
+            "selection_latency": selection_latency,
+            "ttft": None,
+            "stream_duration": None,
+            "duration": None,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "model_calls": 0,
+            "tool_batch_duration": 0.0,
+            "_first_token_at": None,
+            "_last_token_at": None,
+        }
+        return self._turn
+
+    def _close_turn(self) -> None:
+        turn = self._turn
+        if turn is None:
+            return
+        now = self._now()
+        first_token_at = turn.pop("_first_token_at")
+        last_token_at = turn.pop("_last_token_at")
+        if first_token_at is not None:
+            turn["ttft"] = round(first_token_at - turn["started_at"], 3)
+            turn["stream_duration"] = round(last_token_at - first_token_at, 3)
+        turn["duration"] = round(now - turn["started_at"], 3)
+        turn["tool_batch_duration"] = round(turn["tool_batch_duration"], 3)
+        self.turns.append(turn)
+        self._turn = None
+        self._turn_boundary = now
+
+    def observe(self, event: Any) -> None:
+        """
+        Update the timeline with an event emitted by `team.run_stream`.
+
+        Args:
+            event: The event or message produced by the team
+        """
+        source = getattr(event, "source", None)
+        now = self._now()
+
+        if type(event).__name__ == "SelectSpeakerEvent":
+            # Emitted by the group chat manager once the next speaker has been chosen
+            speakers = getattr(event, "content", None) or ["unknown"]
+            self._close_turn()
+            self._open_turn(str(speakers[0]), round(now - self._turn_boundary, 3))
+            return
+
+        if source in (None, "user"):
+            return
+
+        turn = self._turn
+        if turn is None or turn["speaker"] != source:
+            # Team events are not emitted: the selection time is folded into the TTFT
+            self._close_turn()
+            turn = self._open_turn(source, None, started_at=self._turn_boundary)
+
+        usage = getattr(event, "models_usage", None)
+        if usage is not None:
+            turn["model_calls"] += 1
+            turn["prompt_tokens"] += usage.prompt_tokens
+            turn["completion_tokens"] += usage.completion_tokens
+
+        if isinstance(event, ModelClientStreamingChunkEvent):
+            if turn["_first_token_at"] is None:
+                turn["_first_token_at"] = now
+            turn["_last_token_at"] = now
+        elif isinstance(event, ToolCallRequestEvent):
+            for call in event.content:
+                self._tool_batches.setdefault(call.id, now)
+        elif isinstance(event, ToolCallExecutionEvent):
+            started = [self._tool_batches.pop(result.call_id, None) for result in event.content]
+            started = [value for value in started if value is not None]
+            if started:
+                turn["tool_batch_duration"] += now - min(started)
+        elif isinstance(event, BaseChatMessage):
+            self._close_turn()
+
+    def record_tool_call(self, name: str, started_at: float, duration: float, error: Optional[str] = None) -> None:
+        """
+        Record a completed tool call.
+
+        Args:
+            name: Name of the tool
+            started_at: Start of the call, relative to the start of the run
+            duration: Duration of the call in seconds
+            error: Error message if the call failed
+        """
+        self.tool_calls.append({
+            "tool": name,
+            "speaker": self._turn["speaker"] if self._turn else None,
+            "started_at": round(started_at, 3),
+            "duration": round(duration, 3),
+            "error": error,
+        })
+
+    def finish(self, status: str) -> Optional[str]:
+        """
+        Close the timeline and write it as JSONL.
+
+        Args:
+            status: Final status of the run
+
+        Returns:
+            The path of the JSONL file, or None if it could not be written
+        """
+        self._close_turn()
+        self.status = status
+        self.duration = self._now()
+
+        try:
+            os.makedirs(TIMELINE_DIR, exist_ok=True)
+            timestamp = self.started_at.strftime("%Y%m%d_%H%M%S")
+            path = os.path.join(TIMELINE_DIR, f"run_{timestamp}_{self.run_id}.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({
+                    "type": "run",
+                    "run_id": self.run_id,
+                    "team": self.team_name,
+                    "started_at": self.started_at.isoformat(),
+                    "queued_for": round((self.started_at - self.created_at).total_seconds(), 3),
+                    "status": self.status,
+                    "duration": self.duration,
+                }, ensure_ascii=False) + "\n")
+                for turn in self.turns:
+                    f.write(json.dumps({"type": "turn", **turn}, ensure_ascii=False) + "\n")
+                for call in self.tool_calls:
+                    f.write(json.dumps({"type": "tool_call", **call}, ensure_ascii=False) + "\n")
+            return path
+        except Exception as e:
+            logger.warning(f"Could not write timeline of run {self.run_id}: {str(e)}")
+            return None
+
+    def summary_markdown(self) -> str:
+        """Summarize the timeline per agent and per tool as markdown tables."""
+        duration = self.duration if self.duration is not None else self._now()
+        lines = [f"**总耗时**: {duration:.1f}s，共 {len(self.turns)} 轮发言，{len(self.tool_calls)} 次工具调用", ""]
+
+        agents: Dict[str, Dict[str, float]] = {}
+        for turn in self.turns:
+            stats = agents.setdefault(turn["speaker"], {
+                "turns": 0, "selection": 0.0, "ttft": 0.0, "ttft_count": 0,
+                "stream": 0.0, "tools": 0.0, "total": 0.0, "tokens": 0,
+            })
+            stats["turns"] += 1
+            stats["selection"] += turn["selection_latency"] or 0.0
+            if turn["ttft"] is not None:
+                stats["ttft"] += turn["ttft"]
+                stats["ttft_count"] += 1
+            stats["stream"] += turn["stream_duration"] or 0.0
+            stats["tools"] += turn["tool_batch_duration"]
+            stats["total"] += turn["duration"]
+            stats["tokens"] += turn["prompt_tokens"] + turn["completion_tokens"]
+
+        if agents:
+            lines += [
+                "| Agent | 轮次 | 选择发言人 (s) | 平均 TTFT (s) | 流式输出 (s) | 工具 (s) | 总计 (s) | Tokens |",
+                "|---|---|---|---|---|---|---|---|",
+            ]
+            for speaker, stats in sorted(agents.items(), key=lambda item: -item[1]["total"]):
+                avg_ttft = stats["ttft"] / stats["ttft_count"] if stats["ttft_count"] else 0.0
+                lines.append(
+                    f"| {speaker} | {stats['turns']} | {stats['selection']:.1f} | {avg_ttft:.2f} | "
+                    f"{stats['stream']:.1f} | {stats['tools']:.1f} | {stats['total']:.1f} | {stats['tokens']} |"
+                )
+            lines.append("")
+
+        tools: Dict[str, List[float]] = {}
+        errors: Dict[str, int] = {}
+        for call in self.tool_calls:
+            tools.setdefault(call["tool"], []).append(call["duration"])
+            if call["error"]:
+                errors[call["tool"]] = errors.get(call["tool"], 0) + 1
+
+        if tools:
+            lines += [
+                "| 工具 | 调用次数 | 总耗时 (s) | 平均 (s) | 最长 (s) | 失败 |",
+                "|---|---|---|---|---|---|",
+            ]
+            for name, durations in sorted(tools.items(), key=lambda item: -sum(item[1])):
+                lines.append(
+                    f"| {name} | {len(durations)} | {sum(durations):.1f} | "
+                    f"{sum(durations) / len(durations):.2f} | {max(durations):.2f} | {errors.get(name, 0)} |"
+                )
+
+        return "\n".join(lines)
+
+
+def timed_tool(name: str) -> Callable:
+    """
+    Decorator recording the duration of an async tool call on the current run's timeline.
+
+    Args:
+        name: Name of the tool as it appears in the timeline
+
+    Returns:
+        The decorator
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            timeline = current_timeline.get()
+            if timeline is None:
+                return await func(*args, **kwargs)
+
+            started_at = timeline._now()
+            start = time.perf_counter()
+            error = None
+            try:
+                return await func(*args, **kwargs)
+            except BaseException as e:
+                error = type(e).__name__ if not str(e) else f"{type(e).__name__}: {str(e)}"
+                raise
+            finally:
+                timeline.record_tool_call(name, started_at, time.perf_counter() - start, error=error)
+
+        return wrapper
+
+    return decorator
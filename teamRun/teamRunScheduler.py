@@ -0,0 +1,411 @@
+"""
+In-process job scheduler for agent team runs.
+
+Team runs are submitted as jobs instead of being executed inline in the websocket
+handler. A global admission limit caps how many group chats run at the same time,
+queued jobs report their queue position, and every event produced by a run is kept
+on the job so that a reconnecting browser can re-attach and replay the run instead
+of starting a new one.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, AsyncGenerator, Awaitable, Callable, Deque, Dict, List, Optional, Sequence
+
+from autogen_agentchat.messages import BaseChatMessage
+from autogen_agentchat.teams import BaseGroupChat
+from autogen_core import CancellationToken
+from dotenv import load_dotenv
+
+from .runTimeline import RunTimeline, current_timeline
+
+load_dotenv()
+
+logger = logging.getLogger("team_run_scheduler")
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_COMPLETED = "completed"
+JOB_STATUS_FAILED = "failed"
+JOB_STATUS_CANCELLED = "cancelled"
+
+FINISHED_JOB_STATUSES = (JOB_STATUS_COMPLETED, JOB_STATUS_FAILED, JOB_STATUS_CANCELLED)
+
+
+class TeamRunJob:
+    """
+    A single team run submitted to the scheduler.
+
+    The job owns the team, the task and the cancellation token of the run, and it
+    records every event emitted by `team.run_stream` so that any number of
+    renderers can consume the run, including ones that attach after it started.
+    """
+
+    def __init__(
+        self,
+        owner: str,
+        team: BaseGroupChat,
+        task: Sequence[Any],
+        team_name: str,
+        user: Optional[str] = None,
+        max_messages: Optional[int] = None,
+        draft: Optional[Any] = None,
+        finalize: Optional[Callable[["TeamRunJob"], Awaitable[Any]]] = None,
+    ):
+        self.job_id = uuid.uuid4().hex
+        self.owner = owner
+        self.user = user
+        self.team = team
+        self.task = task
+        self.team_name = team_name
+        self.max_messages = max_messages
+        self.draft = draft
+        self.finalize = finalize
+        self.result: Any = None
+        self.finalize_error: Optional[str] = None
+        self.reattach_count = 0
+        self.timeline = RunTimeline(self.job_id, team_name)
+        self.timeline_path: Optional[str] = None
+        self.status = JOB_STATUS_QUEUED
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.events: List[Any] = []
+        self.chat_message_count = 0
+        self.model_call_count = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cancellation_token = CancellationToken()
+        self._changed = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        """Return whether the job has finished, successfully or not."""
+        return self.status in FINISHED_JOB_STATUSES
+
+    @property
+    def total_tokens(self) -> int:
+        """Return the prompt and completion tokens reported by the agents so far."""
+        return self.prompt_tokens + self.completion_tokens
+
+    def estimate_saved_tokens(self) -> int:
+        """
+        Estimate the tokens saved by stopping the run before its message limit.
+
+        The estimate assumes every remaining message up to `max_messages` would have
+        cost as much as the average model call so far. Since the context only grows
+        during a group chat, the real saving is usually higher.
+
+        Returns:
+            The estimated number of tokens, or 0 if there is no basis for an estimate
+        """
+        if not self.max_messages or not self.model_call_count:
+            return 0
+        remaining_messages = max(0, self.max_messages - self.chat_message_count)
+        return int(remaining_messages * self.total_tokens / self.model_call_count)
+
+    async def _append_event(self, event: Any) -> None:
+        usage = getattr(event, "models_usage", None)
+        if usage is not None:
+            self.model_call_count += 1
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+        if isinstance(event, BaseChatMessage):
+            self.chat_message_count += 1
+        self.timeline.observe(event)
+        if self.draft is not None:
+            try:
+                self.draft.observe(event)
+            except Exception as e:
+                logger.warning(f"Could not write the draft of run {self.job_id}: {str(e)}")
+
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def _set_status(self, status: str, error: Optional[str] = None) -> None:
+        async with self._changed:
+            self.status = status
+            if error is not None:
+                self.error = error
+            if status == JOB_STATUS_RUNNING:
+                self.started_at = time.time()
+            elif status in FINISHED_JOB_STATUSES:
+                self.finished_at = time.time()
+                self.timeline_path = self.timeline.finish(status)
+                if self.draft is not None:
+                    try:
+                        self.draft.close()
+                    except Exception as e:
+                        logger.warning(f"Could not close the draft of run {self.job_id}: {str(e)}")
+            self._changed.notify_all()
+
+    async def stream_events(self, start: int = 0) -> AsyncGenerator[Any, None]:
+        """
+        Replay the recorded events of the run and follow it until it finishes.
+
+        Args:
+            start: Index of the first event to yield
+
+        Yields:
+            The events produced by `team.run_stream`, in order
+        """
+        index = start
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.events) or self.done)
+                batch = self.events[index:]
+                finished = self.done
+            index += len(batch)
+            for event in batch:
+                yield event
+            if finished and index >= len(self.events):
+                return
+
+    async def wait(self) -> None:
+        """Wait until the job has finished."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.done)
+
+
+class TeamRunScheduler:
+    """
+    Admission-controlled scheduler for team runs.
+
+    At most `max_concurrent_runs` jobs execute at the same time; the rest wait in a
+    FIFO queue. Jobs are indexed by owner (the chainlit thread of the conversation)
+    so that a reconnecting client finds and re-attaches to its active job.
+    """
+
+    def __init__(self, max_concurrent_runs: int = 4, finished_job_retention: float = 600.0):
+        if max_concurrent_runs < 1:
+            raise ValueError("max_concurrent_runs must be at least 1")
+        self._max_concurrent_runs = max_concurrent_runs
+        self._finished_job_retention = finished_job_retention
+        self._queue: Deque[TeamRunJob] = deque()
+        self._running: Dict[str, TeamRunJob] = {}
+        self._jobs_by_owner: Dict[str, TeamRunJob] = {}
+        self._state_changed = asyncio.Condition()
+
+    @property
+    def max_concurrent_runs(self) -> int:
+        """Return the maximum number of team runs executing at the same time."""
+        return self._max_concurrent_runs
+
+    @property
+    def running_count(self) -> int:
+        """Return the number of team runs currently executing."""
+        return len(self._running)
+
+    @property
+    def queued_count(self) -> int:
+        """Return the number of team runs waiting for a free slot."""
+        return len(self._queue)
+
+    async def submit(
+        self,
+        owner: str,
+        team: BaseGroupChat,
+        task: Sequence[Any],
+        team_name: str,
+        user: Optional[str] = None,
+        max_messages: Optional[int] = None,
+        draft: Optional[Any] = None,
+        finalize: Optional[Callable[[TeamRunJob], Awaitable[Any]]] = None,
+    ) -> TeamRunJob:
+        """
+        Submit a team run, or return the owner's job if one is still active.
+
+        Args:
+            owner: Key identifying the conversation that owns the run
+            team: The team to run
+            task: The task messages passed to `team.run_stream`
+            team_name: Display name of the team
+            user: Optional identifier of the authenticated user
+            max_messages: Message limit of the team, used to estimate saved tokens on cancellation
+            draft: Optional writer observing the events of the run to persist the lesson as it streams
+            finalize: Optional coroutine function called once with the job when the team finishes,
+                before the job is marked completed; its return value is stored as `job.result`
+
+        Returns:
+            The submitted (or already active) job
+        """
+        async with self._state_changed:
+            self._prune_finished_jobs()
+            active = self._jobs_by_owner.get(owner)
+            if active is not None and not active.done:
+                return active
+
+            job = TeamRunJob(
+                owner, team, task, team_name,
+                user=user, max_messages=max_messages, draft=draft, finalize=finalize,
+            )
+            self._jobs_by_owner[owner] = job
+            self._queue.append(job)
+            logger.info(f"Queued team run {job.job_id} for {owner} ({len(self._queue)} waiting)")
+            self._dispatch()
+            self._state_changed.notify_all()
+            return job
+
+    def find_job(self, owner: Optional[str] = None, user: Optional[str] = None) -> Optional[TeamRunJob]:
+        """
+        Find the most recent job of an owner, falling back to the user's latest job.
+
+        Args:
+            owner: Key identifying the conversation that owns the run
+            user: Optional identifier of the authenticated user
+
+        Returns:
+            The job, or None if there is none
+        """
+        self._prune_finished_jobs()
+        if owner and owner in self._jobs_by_owner:
+            return self._jobs_by_owner[owner]
+        if user:
+            candidates = [job for job in self._jobs_by_owner.values() if job.user == user]
+            if candidates:
+                return max(candidates, key=lambda job: job.created_at)
+        return None
+
+    def queue_position(self, job: TeamRunJob) -> int:
+        """Return the 1-based queue position of a job, or 0 if it is not queued."""
+        try:
+            return self._queue.index(job) + 1
+        except ValueError:
+            return 0
+
+    async def queue_positions(self, job: TeamRunJob) -> AsyncGenerator[int, None]:
+        """
+        Yield the job's queue position every time it changes, until the job leaves the queue.
+
+        Args:
+            job: The queued job
+
+        Yields:
+            The current 1-based queue position
+        """
+        last_position = None
+        while job.status == JOB_STATUS_QUEUED:
+            position = self.queue_position(job)
+            if not position:
+                # Dispatched: the run task sets the job running once it gets scheduled
+                return
+            if position != last_position:
+                last_position = position
+                yield position
+            async with self._state_changed:
+                await self._state_changed.wait_for(
+                    lambda: job.status != JOB_STATUS_QUEUED or self.queue_position(job) != last_position
+                )
+
+    async def cancel(self, job: TeamRunJob, grace_period: float = 5.0) -> bool:
+        """
+        Cancel a queued or running job.
+
+        A running job is cancelled through its CancellationToken, which aborts the
+        in-flight model streams and tool calls of the team. If the run has not
+        stopped within the grace period, its task is cancelled as well.
+
+        Args:
+            job: The job to cancel
+            grace_period: Seconds to wait for the run to honour the cancellation token
+
+        Returns:
+            True if the job was still active and has been cancelled
+        """
+        async with self._state_changed:
+            if job.done:
+                return False
+            if job in self._queue:
+                self._queue.remove(job)
+                await job._set_status(JOB_STATUS_CANCELLED)
+                self._state_changed.notify_all()
+                return True
+
+        job.cancellation_token.cancel()
+        if job._task is not None and not job._task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(job._task), timeout=grace_period)
+            except asyncio.TimeoutError:
+                job._task.cancel()
+            except Exception:
+                pass
+        logger.info(
+            f"Cancelled team run {job.job_id} after {job.chat_message_count} messages "
+            f"({job.total_tokens} tokens used, ~{job.estimate_saved_tokens()} tokens saved)"
+        )
+        return True
+
+    def _dispatch(self) -> None:
+        while self._queue and len(self._running) < self._max_concurrent_runs:
+            job = self._queue.popleft()
+            self._running[job.job_id] = job
+            job._task = asyncio.create_task(self._run(job))
+            job._task.add_done_callback(lambda _, job=job: asyncio.ensure_future(self._release(job)))
+
+    async def _run(self, job: TeamRunJob) -> None:
+        await job._set_status(JOB_STATUS_RUNNING)
+        logger.info(f"Started team run {job.job_id} ({len(self._running)}/{self._max_concurrent_runs} running)")
+        # Tasks spawned by the team inherit this context, so tool calls land on the job's timeline
+        job.timeline.start()
+        current_timeline.set(job.timeline)
+        try:
+            async for event in job.team.run_stream(task=job.task, cancellation_token=job.cancellation_token):
+                await job._append_event(event)
+            if job.finalize is not None:
+                # Runs once per job, however many renderers are attached to it
+                try:
+                    job.result = await job.finalize(job)
+                except Exception as e:
+                    logger.exception(f"Could not finalize team run {job.job_id}")
+                    job.finalize_error = str(e)
+            await job._set_status(JOB_STATUS_COMPLETED)
+        except asyncio.CancelledError:
+            await self._reset_cancelled_team(job)
+            await job._set_status(JOB_STATUS_CANCELLED)
+        except Exception as e:
+            if job.cancellation_token.is_cancelled():
+                await self._reset_cancelled_team(job)
+                await job._set_status(JOB_STATUS_CANCELLED)
+                return
+            logger.exception(f"Team run {job.job_id} failed")
+            await job._set_status(JOB_STATUS_FAILED, error=str(e))
+
+    async def _reset_cancelled_team(self, job: TeamRunJob) -> None:
+        # Drop the half-finished conversation so the team starts clean on the next run
+        try:
+            await job.team.reset()
+        except Exception as e:
+            logger.warning(f"Could not reset team after cancelling run {job.job_id}: {str(e)}")
+
+    async def _release(self, job: TeamRunJob) -> None:
+        # Runs from the task's done callback so that the slot is also freed when the
+        # task was cancelled before it got the chance to start.
+        if not job.done:
+            await job._set_status(JOB_STATUS_CANCELLED)
+        async with self._state_changed:
+            self._running.pop(job.job_id, None)
+            self._dispatch()
+            self._state_changed.notify_all()
+        logger.info(f"Team run {job.job_id} finished with status {job.status}")
+
+    def _prune_finished_jobs(self) -> None:
+        now = time.time()
+        expired = [
+            owner for owner, job in self._jobs_by_owner.items()
+            if job.done and job.finished_at is not None and now - job.finished_at > self._finished_job_retention
+        ]
+        for owner in expired:
+            del self._jobs_by_owner[owner]
+
+
+# Create a singleton instance of the scheduler shared by all chainlit sessions
+team_run_scheduler = TeamRunScheduler(
+    max_concurrent_runs=int(os.environ.get("MAX_CONCURRENT_TEAM_RUNS", "4")),
+)
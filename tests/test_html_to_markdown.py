@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+pytest.importorskip("lxml")
+
+from agents.tools.html_to_markdown import fast_html_to_markdown
+
+PAGES = os.path.join(os.path.dirname(__file__), "pages")
+
+
+def convert(name, base_url):
+    with open(os.path.join(PAGES, name), "rb") as f:
+        return fast_html_to_markdown(f.read().decode("utf-8"), base_url)
+
+
+def test_sidebar_layout_wrapper_keeps_the_article():
+    markdown = convert("wordpress_with_sidebar.html", "https://jiaoyan.example.com/2023/09/jingyesi/")
+    assert "《静夜思》是唐代诗人李白的五言绝句" in markdown
+    assert "教学过程：" in markdown
+    assert "![静夜思插图](https://jiaoyan.example.com/wp-content/uploads/2023/09/jingyesi.jpg)" in markdown
+    # Page chrome: share bar, recent posts widget, navigation and footer
+    assert "微博" not in markdown
+    assert "近期文章" not in markdown
+    assert "首页" not in markdown
+    assert "版权所有" not in markdown
+
+
+def test_side_layout_id_keeps_the_article():
+    markdown = convert("news_main_side_layout.html", "https://news.example.com/culture/libai.html")
+    assert "李白为何爱写月亮" in markdown
+    assert "举杯邀明月，对影成三人" in markdown
+    assert "热门推荐" not in markdown
+    assert "登录" not in markdown
+    assert "All Rights Reserved" not in markdown
+    assert "QQ空间" not in markdown
+    assert "广告" not in markdown
+
+
+def test_chrome_named_wrapper_of_the_whole_body_is_kept():
+    html = (
+        '<html><body><div class="page with-sidebar"><div id="main-side-layout">'
+        "<p>床前明月光，疑是地上霜。举头望明月，低头思故乡。这首诗语言清新朴素，韵味含蓄无穷。</p>"
+        "</div></div></body></html>"
+    )
+    assert fast_html_to_markdown(html, main_content=False).startswith("床前明月光")
+    assert fast_html_to_markdown(html).startswith("床前明月光")
@@ -0,0 +1,62 @@
+import asyncio
+
+from agents.tools.image_generation_cache import ImageGenerationCache
+
+
+def make_generate(calls, started=None, release=None):
+    async def generate():
+        calls.append(1)
+        if started is not None:
+            started.set()
+        if release is not None:
+            await release.wait()
+        return {"url": f"https://blob/{len(calls)}.png", "sha256": str(len(calls))}
+    return generate
+
+
+def test_waiter_takes_over_when_the_generating_caller_is_cancelled(tmp_path):
+    async def scenario():
+        cache = ImageGenerationCache(path=str(tmp_path / "images.sqlite"))
+        calls = []
+        started = asyncio.Event()
+        owner = asyncio.create_task(cache.get_or_generate(
+            "李白望月", "gpt-image-1", "1024x1024", "low", make_generate(calls, started, asyncio.Event()),
+        ))
+        await started.wait()
+        waiter = asyncio.create_task(cache.get_or_generate(
+            "李白望月", "gpt-image-1", "1024x1024", "low", make_generate(calls),
+        ))
+        await asyncio.sleep(0)
+        owner.cancel()
+        entry = await waiter
+        return owner, entry, calls
+
+    owner, entry, calls = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert owner.cancelled()
+    assert entry["url"] == "https://blob/2.png"
+    assert len(calls) == 2
+
+
+def test_cancelled_waiter_does_not_cancel_the_generation(tmp_path):
+    async def scenario():
+        cache = ImageGenerationCache(path=str(tmp_path / "images.sqlite"))
+        calls = []
+        started = asyncio.Event()
+        release = asyncio.Event()
+        owner = asyncio.create_task(cache.get_or_generate(
+            "春夜细雨", "gpt-image-1", "1024x1024", "low", make_generate(calls, started, release),
+        ))
+        await started.wait()
+        waiter = asyncio.create_task(cache.get_or_generate(
+            "春夜细雨", "gpt-image-1", "1024x1024", "low", make_generate(calls),
+        ))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        entry = await owner
+        return waiter, entry, calls
+
+    waiter, entry, calls = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert waiter.cancelled()
+    assert entry["url"] == "https://blob/1.png"
+    assert len(calls) == 1
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from lessonOutput import extract_links, format_lesson_markdown, mediaValidation, validate_media_links
+
+THUMB = "https://a.blob/x_thumb.webp"
+FULL = "https://a.blob/x.webp"
+THUMBNAIL_LINK = f"[![李白]({THUMB})]({FULL})"
+
+
+class DeadUrls(set):
+    """URLs the fake checker reports as dead, and the URLs it was asked about."""
+
+    def __init__(self):
+        super().__init__()
+        self.checked = []
+
+
+@pytest.fixture
+def dead_urls(monkeypatch):
+    dead = DeadUrls()
+
+    async def check_url(url):
+        dead.checked.append(url)
+        return {"url": url, "accessible": url not in dead, "status": 404 if url in dead else 200}
+
+    monkeypatch.setattr(mediaValidation, "check_url", check_url)
+    return dead
+
+
+def validate(markdown):
+    return asyncio.run(validate_media_links(markdown, mode="remove"))
+
+
+def test_extract_links_reads_both_urls_of_a_thumbnail_link():
+    assert extract_links(f"# 李白\n{THUMBNAIL_LINK}\n") == [THUMB, FULL]
+
+
+def test_thumbnail_link_is_kept_when_both_urls_are_alive(dead_urls):
+    report = validate(f"# 李白\n{THUMBNAIL_LINK}")
+    assert report.content == f"# 李白\n{THUMBNAIL_LINK}"
+    assert sorted(report.verdicts) == [FULL, THUMB]
+
+
+def test_dead_thumbnail_shows_the_full_image(dead_urls):
+    dead_urls.add(THUMB)
+    report = validate(f"# 李白\n{THUMBNAIL_LINK}")
+    assert report.content == f"# 李白\n![李白]({FULL})"
+    assert report.dead == [THUMB]
+
+
+def test_dead_full_image_keeps_the_thumbnail(dead_urls):
+    dead_urls.add(FULL)
+    report = validate(f"# 李白\n{THUMBNAIL_LINK}")
+    assert report.content == f"# 李白\n![李白]({THUMB})"
+
+
+def test_thumbnail_link_to_a_dead_video_keeps_its_text(dead_urls):
+    video = "https://www.youtube.com/watch?v=AAA"
+    dead_urls.add(video)
+    report = validate(f"[![视频：静夜思]({THUMB})]({video}) 观看")
+    assert report.content == "视频：静夜思 观看"
+
+
+def test_repeated_thumbnail_target_is_removed(dead_urls):
+    report = validate(f"{THUMBNAIL_LINK}\n![李白]({FULL})\n{THUMBNAIL_LINK}")
+    assert report.content == THUMBNAIL_LINK
+    assert report.duplicates == [FULL]
+
+
+def test_videos_are_told_apart_by_their_query(dead_urls):
+    markdown = "[视频：A](https://www.youtube.com/watch?v=AAA)\n[视频：B](https://www.youtube.com/watch?v=BBB)"
+    assert validate(markdown).content == markdown
+
+
+def test_urls_with_parentheses_are_checked_whole(dead_urls):
+    markdown = "[wiki](https://zh.wikipedia.org/wiki/Foo_(bar)) 结束"
+    assert validate(markdown).content == markdown
+    assert dead_urls.checked == ["https://zh.wikipedia.org/wiki/Foo_(bar)"]
+
+
+def test_formatter_keeps_the_thumbnail_of_a_video_as_an_image():
+    markdown = f"# 李白\n[![视频：静夜思]({THUMB}?sig=1)](https://www.youtube.com/watch?v=AAA&t=3)"
+    assert format_lesson_markdown(markdown) == f"# 李白\n[![视频：静夜思]({THUMB})](https://www.youtube.com/watch?v=AAA)"
@@ -0,0 +1,197 @@
+import asyncio
+import time
+
+import pytest
+
+from sharedState import InMemoryStateBackend, RedisStateBackend, SqliteStateBackend
+
+
+class StandInRedisServer:
+    """Minimal in-process server speaking the subset of RESP used by RedisStateBackend."""
+
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+        self.drop_on = set()
+        self._server = None
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"redis://127.0.0.1:{port}/0"
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    def pttl(self, key):
+        entry = self._live(key)
+        if entry is None:
+            return -2
+        return -1 if entry[1] is None else int((entry[1] - time.time()) * 1000)
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry
+
+    async def _read_command(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2].decode("utf-8"))
+        return args
+
+    async def _serve(self, reader, writer):
+        queued = None
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    return
+                name = args[0].upper()
+                self.commands.append(name)
+                if name in self.drop_on:
+                    # Simulates a worker or server crash before the command is applied
+                    self.drop_on.discard(name)
+                    return
+                if name == "MULTI":
+                    queued = []
+                    writer.write(b"+OK\r\n")
+                elif name == "EXEC":
+                    replies = [self._apply(*command) for command in queued]
+                    queued = None
+                    writer.write(f"*{len(replies)}\r\n".encode() + b"".join(replies))
+                elif queued is not None:
+                    queued.append(args)
+                    writer.write(b"+QUEUED\r\n")
+                else:
+                    writer.write(self._apply(*args))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def _apply(self, name, *args):
+        name = name.upper()
+        if name == "GET":
+            entry = self._live(args[0])
+            if entry is None:
+                return b"$-1\r\n"
+            data = entry[0].encode("utf-8")
+            return f"${len(data)}\r\n".encode() + data + b"\r\n"
+        if name == "SET":
+            key, value, options = args[0], args[1], [option.upper() for option in args[2:]]
+            if "NX" in options and self._live(key) is not None:
+                return b"$-1\r\n"
+            expires_at = None
+            if "PX" in options:
+                expires_at = time.time() + int(args[2 + options.index("PX") + 1]) / 1000
+            self.data[key] = (value, expires_at)
+            return b"+OK\r\n"
+        if name == "DEL":
+            return f":{int(self.data.pop(args[0], None) is not None)}\r\n".encode()
+        if name == "INCRBY":
+            entry = self._live(args[0])
+            value = (int(entry[0]) if entry else 0) + int(args[1])
+            self.data[args[0]] = (str(value), entry[1] if entry else None)
+            return f":{value}\r\n".encode()
+        if name == "PEXPIRE":
+            entry = self._live(args[0])
+            if entry is None:
+                return b":0\r\n"
+            self.data[args[0]] = (entry[0], time.time() + int(args[1]) / 1000)
+            return b":1\r\n"
+        return f"-ERR unknown command '{name}'\r\n".encode()
+
+
+@pytest.fixture
+def redis_server():
+    return StandInRedisServer()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def run_with_backend(request, tmp_path, redis_server):
+    def run(scenario):
+        async def main():
+            if request.param == "memory":
+                backend = InMemoryStateBackend()
+            elif request.param == "sqlite":
+                backend = SqliteStateBackend(str(tmp_path / "state.sqlite"))
+            else:
+                backend = RedisStateBackend(await redis_server.start())
+            try:
+                return await scenario(backend)
+            finally:
+                await backend.close()
+                if request.param == "redis":
+                    await redis_server.stop()
+
+        return asyncio.run(asyncio.wait_for(main(), timeout=5))
+
+    return run
+
+
+def test_get_set_delete(run_with_backend):
+    async def scenario(backend):
+        await backend.set("key", "value")
+        first = await backend.get("key")
+        await backend.delete("key")
+        return first, await backend.get("key")
+
+    assert run_with_backend(scenario) == ("value", None)
+
+
+def test_set_with_ttl_expires(run_with_backend):
+    async def scenario(backend):
+        await backend.set("key", "value", ttl=0.05)
+        first = await backend.get("key")
+        await asyncio.sleep(0.1)
+        return first, await backend.get("key")
+
+    assert run_with_backend(scenario) == ("value", None)
+
+
+def test_incr_keeps_the_expiry_of_the_first_increment(run_with_backend):
+    async def scenario(backend):
+        values = [await backend.incr("bucket", 2, ttl=0.2)]
+        await asyncio.sleep(0.12)
+        # A later increment must not push the window further out
+        values.append(await backend.incr("bucket", 1, ttl=0.2))
+        await asyncio.sleep(0.12)
+        values.append(await backend.incr("bucket", 1, ttl=0.2))
+        return values
+
+    assert run_with_backend(scenario) == [2, 3, 1]
+
+
+def test_incr_without_ttl_does_not_expire(run_with_backend):
+    async def scenario(backend):
+        await backend.incr("counter")
+        await asyncio.sleep(0.05)
+        return await backend.incr("counter", 4)
+
+    assert run_with_backend(scenario) == 5
+
+
+def test_redis_incr_never_leaves_a_counter_without_expiry(redis_server):
+    async def scenario():
+        backend = RedisStateBackend(await redis_server.start())
+        try:
+            # The connection drops before the transaction commits, so nothing is applied
+            # and the backend retries the whole transaction on a new connection
+            redis_server.drop_on.add("EXEC")
+            value = await backend.incr("bucket", 3, ttl=60)
+            return value, redis_server.pttl("bucket")
+        finally:
+            await backend.close()
+            await redis_server.stop()
+
+    value, pttl = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert value == 3
+    assert 0 < pttl <= 60000
+    assert redis_server.commands.count("EXEC") == 2
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from teamRun import JOB_STATUS_COMPLETED, TeamRunScheduler, runTimeline
+
+
+class FakeTeam:
+    def __init__(self, events=("hello",), gate=None):
+        self._events = events
+        self._gate = gate
+
+    async def run_stream(self, task, cancellation_token=None):
+        if self._gate is not None:
+            await self._gate.wait()
+        for event in self._events:
+            yield event
+
+    async def reset(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def timeline_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(runTimeline, "TIMELINE_DIR", str(tmp_path))
+
+
+def test_queue_positions_returns_for_a_dispatched_job():
+    async def scenario():
+        scheduler = TeamRunScheduler(max_concurrent_runs=1)
+        job = await scheduler.submit("owner", FakeTeam(), [], "team")
+        positions = [position async for position in scheduler.queue_positions(job)]
+        await job.wait()
+        return positions, job.status, [event async for event in job.stream_events()]
+
+    positions, status, events = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert positions == []
+    assert status == JOB_STATUS_COMPLETED
+    assert events == ["hello"]
+
+
+def test_queue_positions_follows_a_queued_job_until_it_is_dispatched():
+    async def scenario():
+        scheduler = TeamRunScheduler(max_concurrent_runs=1)
+        gate = asyncio.Event()
+        first = await scheduler.submit("first", FakeTeam(gate=gate), [], "team")
+        second = await scheduler.submit("second", FakeTeam(), [], "team")
+        positions = []
+        async for position in scheduler.queue_positions(second):
+            positions.append(position)
+            gate.set()
+        await asyncio.gather(first.wait(), second.wait())
+        return positions, second.status
+
+    positions, status = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert positions == [1]
+    assert status == JOB_STATUS_COMPLETED
+
+
+def test_finalize_runs_once_before_the_job_completes():
+    calls = []
+
+    async def finalize(job):
+        calls.append((job.status, list(job.events)))
+        return "saved"
+
+    async def scenario():
+        scheduler = TeamRunScheduler(max_concurrent_runs=1)
+        job = await scheduler.submit("owner", FakeTeam(), [], "team", finalize=finalize)
+        # Two renderers following the same run must not finalize it twice
+        await asyncio.gather(job.wait(), job.wait())
+        return job
+
+    job = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert calls == [("running", ["hello"])]
+    assert job.status == JOB_STATUS_COMPLETED
+    assert job.result == "saved"
+
+
+def test_finalize_error_is_recorded_on_the_completed_job():
+    async def finalize(job):
+        raise OSError("disk full")
+
+    async def scenario():
+        scheduler = TeamRunScheduler(max_concurrent_runs=1)
+        job = await scheduler.submit("owner", FakeTeam(), [], "team", finalize=finalize)
+        await job.wait()
+        return job
+
+    job = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+    assert job.status == JOB_STATUS_COMPLETED
+    assert job.result is None
+    assert job.finalize_error == "disk full"